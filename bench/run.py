@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from time import strftime, perf_counter
+from statistics import median
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import numpy as np
+
+from usgs_stub import StubServer, catalog_start, catalog_days
+
+# reproducible pipeline benchmark: every run queries a local stub of the USGS service in a fresh process (offline, headless), with an empty catalog cache
+# > python bench/run.py --sizes 1000,10000,100000 --formats geojson,csv --modes core,gui --repeat 3
+
+params = {'minmagnitude': "0.0", 'maxmagnitude': "10.0"}
+catalog_end = catalog_start + (catalog_days + 1) * 86400000
+
+def peak_rss(): return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # MB (Linux reports kB)
+
+
+# |----- runs (child processes) -----|
+
+def run_core(url, format): # Query -> EventStore -> filter and sort, like the query command
+    from threading import Lock
+    from quakexplore import EventStore, EventFilter, Query, providers
+    providers['usgs'].url = url
+    store, lock = EventStore(), Lock()
+    job = Query(params, catalog_start, catalog_end, formats={'usgs': format})
+    first = []
+    def batch(records):
+        with lock, job.timings.span('insert', len(records)):
+            if not first: first.append(job.timings.wall())
+            store.extend(records)
+    job.on_batch = batch
+    job.run()
+    if job.error: raise RuntimeError(job.error)
+    with job.timings.span('filter'): rows = np.flatnonzero(EventFilter(store).mask())
+    with job.timings.span('sort'): rows = rows[np.argsort(-store['time'][rows], kind='stable')]
+    return job.timings.record('core', events=len(rows), received=job.received, first=first[0] if first else None)
+
+def run_gui(url, format): # the main window, offscreen: from the query button to the last batch listed, then one repaint
+    os.environ.setdefault('QT_QPA_PLATFORM', "offscreen")
+    os.chdir(root) # icons
+    from PySide6.QtCore import QDate, QObject, Slot
+    from PySide6.QtWidgets import QApplication
+    from quakexplore import providers
+    import earthquakes
+    providers['usgs'].url = url
+    app = QApplication([])
+    window = earthquakes.MainWindow()
+    window.show()
+    window.start_date.setDate(QDate(2024, 1, 1))
+    window.end_date.setDate(QDate(2024, 1, 1).addDays(catalog_days + 1))
+    window.min_magnitude_spinbox.setValue(0.0)
+    window.max_magnitude_spinbox.setValue(10.0)
+    window.format_box.setCurrentText(format)
+    app.processEvents()
+    first, result = [], {}
+    window.model.rowsInserted.connect(lambda: first or first.append(window.timings.wall()))
+    class Finish(QObject): # lives on the GUI thread: the done signal is queued after query_done
+        @Slot(bool)
+        def done(self, cancelled):
+            query = window.query_worker.query
+            result['record'] = window.timings.record('gui', events=len(window.store), listed=window.proxy.rowCount(), received=query.received, first=first[0] if first else None)
+            result['error'] = query.error
+            app.quit()
+    finish = Finish()
+    window.query_action()
+    window.query_worker.done.connect(finish.done)
+    app.exec()
+    if result.get('error'): raise RuntimeError(result['error'])
+    started = perf_counter()
+    window.grab() # the window rendered with every quake listed
+    result['record']['paint'] = perf_counter() - started
+    return result['record']
+
+modes = {'core': run_core, 'gui': run_gui}
+
+def child(args):
+    record = modes[args.child](args.url, args.format)
+    record['rss'] = peak_rss()
+    print("BENCH " + json.dumps(record), flush=True)
+
+
+# |----- runner -----|
+
+def spawn(mode, url, format, cache): # one run in a fresh process -> result record
+    env = {**os.environ, 'XDG_CACHE_HOME': cache, 'QT_QPA_PLATFORM': "offscreen", 'PYTHONPATH': root}
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, '--url', url, '--format', format], env=env, capture_output=True, text=True)
+    lines = [line[6:] for line in process.stdout.splitlines() if line.startswith("BENCH ")]
+    if process.returncode or not lines: raise RuntimeError(f"{mode}/{format} run failed:\n{process.stderr.strip()[-2000:]}")
+    return json.loads(lines[-1])
+
+def report(mode, format, size, runs): # median of the runs
+    value = lambda key: median(run[key] for run in runs)
+    stages = {stage: median(run['stages'].get(stage, {}).get('seconds', 0) for run in runs) for stage in runs[0]['stages']}
+    latency = value('wall')
+    line = (f"{mode:<5} {format:<8} {size:>8} {value('events'):>8.0f} {value('received') / 1048576:>8.1f} {value('first') or 0:>8.3f} {latency:>9.3f} {value('events') / latency if latency else 0:>10.0f} "
+            f"{value('rss'):>8.0f}" + (f" {value('paint'):>7.3f}" if 'paint' in runs[0] else ""))
+    return line + "\n      " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in stages.items())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline benchmark against a local USGS stub server (offline, headless).")
+    parser.add_argument('--sizes', default="1000,10000,100000", help="catalog sizes (default: %(default)s, up to 1000000)")
+    parser.add_argument('--formats', default="geojson,csv", help="response formats (default: %(default)s)")
+    parser.add_argument('--modes', default="core,gui", help="core (quakexplore only) and/or gui (main window, offscreen) (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case, the median is reported (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="catalog seed (default: %(default)s)")
+    parser.add_argument('--out', default=os.path.join(root, "bench_output.txt"), help="report file (default: bench_output.txt)")
+    parser.add_argument('--child', choices=list(modes), help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    parser.add_argument('--format', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child: return child(args)
+
+    lines = [f"quakexplore pipeline benchmark, {strftime('%Y-%m-%d %H:%M:%S')} - Python {platform.python_version()}, numpy {np.__version__}, {platform.platform()}, {os.cpu_count()} CPU(s)",
+             "latency: query start to the last batch listed (s), first: first batch listed (s), rss: peak resident memory of the run (MB), paint: one window render (s)",
+             f"{'mode':<5} {'format':<8} {'catalog':>8} {'events':>8} {'wire MB':>8} {'first':>8} {'latency':>9} {'events/s':>10} {'rss MB':>8} {'paint':>7}"]
+    print("\n".join(lines), flush=True)
+    for size in (int(size) for size in args.sizes.split(',')):
+        stub = StubServer(size, args.seed).start()
+        try:
+            for format in args.formats.split(','):
+                with tempfile.TemporaryDirectory() as cache: spawn('core', stub.url, format, cache) # warm-up: the stub renders and caches its responses
+                for mode in args.modes.split(','):
+                    runs = []
+                    for n in range(args.repeat):
+                        with tempfile.TemporaryDirectory() as cache: runs.append(spawn(mode, stub.url, format, cache))
+                    lines.append(report(mode, format, size, runs))
+                    print(lines[-1], flush=True)
+        finally: stub.stop()
+    with open(args.out, 'w') as file: file.write("\n".join(lines) + "\n")
+    print(f"Report written to {args.out}")
+
+if __name__ == "__main__":
+    sys.exit(main())
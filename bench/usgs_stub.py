@@ -0,0 +1,130 @@
+import gzip
+import json
+from threading import Thread, Lock
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from quakexplore.fdsn import day_ms
+from quakexplore.formats import parse_time
+
+# local stand-in for the USGS FDSN event service: seeded synthetic catalogs served from memory, no network needed
+catalog_start = day_ms(2024, 1, 1)
+catalog_days = 30
+max_allowed = 20000 # events per query, like the service
+places = ["Anchorage, Alaska", "Ridgecrest, CA", "Hilo, Hawaii", "Tokyo, Japan", "Santiago, Chile", "Lima, Peru", "Suva, Fiji", "Reykjavik, Iceland", "Athens, Greece", "Jakarta, Indonesia", "Kermadec Islands region", "Mid-Atlantic Ridge"]
+nets = ["us", "ak", "ci", "nc", "hv", "uw"]
+directions = ["N", "NE", "E", "SE", "S", "SW", "W", "NW"]
+
+feature = ('{"type":"Feature","properties":{"mag":%.1f,"place":"%s","time":%d,"updated":%d,"tz":null,'
+           '"url":"https://earthquake.usgs.gov/earthquakes/eventpage/%s","detail":"https://earthquake.usgs.gov/fdsnws/event/1/query?eventid=%s&format=geojson",'
+           '"felt":null,"cdi":null,"mmi":null,"alert":null,"status":"reviewed","tsunami":0,"sig":%d,"net":"%s","code":"%s","ids":",%s,","sources":",%s,",'
+           '"types":",origin,phase-data,","nst":%d,"dmin":%.3f,"rms":%.2f,"gap":%d,"magType":"ml","type":"earthquake","title":"M %.1f - %s"},'
+           '"geometry":{"type":"Point","coordinates":[%.4f,%.4f,%.2f]},"id":"%s"}')
+csv_header = "time,latitude,longitude,depth,mag,magType,nst,gap,dmin,rms,net,id,updated,place,type,horizontalError,depthError,magError,magNst,status,locationSource,magSource"
+
+class Catalog: # seeded events over catalog_days: Gutenberg-Richter magnitudes (b = 1), epicentres around a few hotspots, exponential depths
+    def __init__(self, size, seed=0):
+        rng = np.random.default_rng(seed)
+        self.size = size
+        self.time = np.sort(catalog_start + rng.integers(0, catalog_days * 86400000, size)) # ascending, responses are reversed
+        self.updated = self.time + rng.integers(60000, 3600000, size)
+        self.mag = np.round(1.0 + rng.exponential(1 / np.log(10), size), 1)
+        hotspots = rng.uniform((-60, -180), (60, 180), (40, 2))
+        spot = rng.integers(0, len(hotspots), size)
+        self.lat = np.clip(hotspots[spot, 0] + rng.normal(0, 1.5, size), -89.9, 89.9)
+        self.lon = (hotspots[spot, 1] + rng.normal(0, 1.5, size) + 180) % 360 - 180
+        self.depth = np.round(rng.exponential(30, size), 2)
+        self.sig = np.clip(self.mag * 100 * (self.mag + 6.6) / 10, 0, 2910).astype(np.int64) # ~ the USGS magnitude part
+        self.net = rng.integers(0, len(nets), size)
+        self.place = rng.integers(0, len(places), size)
+        self.km = rng.integers(1, 120, size)
+        self.direction = rng.integers(0, len(directions), size)
+        self.nst = rng.integers(5, 80, size)
+        self.gap = rng.integers(20, 300, size)
+        self.dmin = rng.uniform(0, 2, size)
+        self.rms = rng.uniform(0.05, 1.2, size)
+
+    def ids(self, rows): return [f"{nets[n]}{i:08d}" for n, i in zip(self.net[rows].tolist(), rows.tolist())]
+
+    def rows(self, params): # rows of a query, latest first
+        start = parse_time(params['starttime']) if 'starttime' in params else catalog_start
+        end = parse_time(params['endtime']) if 'endtime' in params else catalog_start + catalog_days * 86400000
+        rows = np.arange(np.searchsorted(self.time, start, 'left'), np.searchsorted(self.time, end, 'right'))[::-1]
+        keep = (self.mag[rows] >= float(params.get('minmagnitude', -10))) & (self.mag[rows] <= float(params.get('maxmagnitude', 10)))
+        if 'updatedafter' in params: keep &= self.updated[rows] > parse_time(params['updatedafter'])
+        rows = rows[keep]
+        if 'offset' in params: rows = rows[int(params['offset']) - 1:int(params['offset']) - 1 + int(params.get('limit', max_allowed))]
+        return rows
+
+    def place_names(self, rows): return [f"{km} km {directions[d]} of {places[p]}" for km, d, p in zip(self.km[rows].tolist(), self.direction[rows].tolist(), self.place[rows].tolist())]
+
+    def geojson(self, rows):
+        ids, names = self.ids(rows), self.place_names(rows)
+        columns = zip(self.mag[rows].tolist(), names, self.time[rows].tolist(), self.updated[rows].tolist(), ids, self.sig[rows].tolist(), self.net[rows].tolist(),
+                      self.nst[rows].tolist(), self.dmin[rows].tolist(), self.rms[rows].tolist(), self.gap[rows].tolist(), self.lon[rows].tolist(), self.lat[rows].tolist(), self.depth[rows].tolist())
+        features = ",".join(feature % (mag, place, t, updated, id, id, sig, nets[net], id[2:], id, nets[net], nst, dmin, rms, gap, mag, place, lon, lat, depth, id)
+                            for mag, place, t, updated, id, sig, net, nst, dmin, rms, gap, lon, lat, depth in columns)
+        return f'{{"type":"FeatureCollection","metadata":{{"generated":{catalog_start},"status":200,"count":{len(rows)}}},"features":[{features}]}}'.encode()
+
+    def csv(self, rows):
+        iso = lambda values: np.char.add(np.datetime_as_string(values.astype('datetime64[ms]')), 'Z').tolist()
+        columns = zip(iso(self.time[rows]), self.lat[rows].tolist(), self.lon[rows].tolist(), self.depth[rows].tolist(), self.mag[rows].tolist(), self.nst[rows].tolist(), self.gap[rows].tolist(),
+                      self.dmin[rows].tolist(), self.rms[rows].tolist(), self.net[rows].tolist(), self.ids(rows), iso(self.updated[rows]), self.place_names(rows))
+        lines = (f'{t},{lat:.4f},{lon:.4f},{depth:.2f},{mag:.1f},ml,{nst},{gap},{dmin:.3f},{rms:.2f},{nets[net]},{id},{updated},"{place}",earthquake,,,,,reviewed,{nets[net]},{nets[net]}'
+                 for t, lat, lon, depth, mag, nst, gap, dmin, rms, net, id, updated, place in columns)
+        return "\n".join([csv_header, *lines, ""]).encode()
+
+class StubServer: # serves one catalog on 127.0.0.1: version, count and query (geojson, csv), gzip-compressed like the service; bodies are cached per request
+    def __init__(self, size, seed=0, port=0):
+        self.catalog = Catalog(size, seed)
+        self.bodies, self.lock = {}, Lock()
+        self.requests = 0
+        stub = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, like the service
+            def log_message(self, *args): pass
+            def do_GET(self): stub.handle(self)
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/fdsnws/event/1/"
+
+    def start(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def body(self, endpoint, params, compress): # -> (status, content type, body, gzip-compressed)
+        if endpoint == 'version': return 200, "text/plain", b"1.14.1", False
+        if endpoint not in ('count', 'query'): return 404, "text/plain", b"Not found", False
+        rows = self.catalog.rows(params)
+        if endpoint == 'count': return 200, "application/json", json.dumps({'count': len(rows), 'maxAllowed': max_allowed}).encode(), False
+        if len(rows) > max_allowed: return 400, "text/plain", f"Error 400: Bad Request\n\n{len(rows)} matching events exceeds search limit of {max_allowed}.".encode(), False
+        if not len(rows): return 204, "text/plain", b"", False
+        format = params.get('format', 'geojson')
+        if format not in ('geojson', 'csv'): return 400, "text/plain", f"Error 400: Bad Request\n\nunsupported format {format}.".encode(), False
+        body = self.catalog.geojson(rows) if format == 'geojson' else self.catalog.csv(rows)
+        return 200, "application/json" if format == 'geojson' else "text/csv", gzip.compress(body, 6) if compress else body, compress
+
+    def handle(self, request):
+        url = urlparse(request.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+        key = (url.path, tuple(sorted(params.items())), compress)
+        with self.lock:
+            self.requests += 1
+            cached = self.bodies.get(key)
+        if cached is None:
+            cached = self.body(url.path.rstrip('/').rsplit('/', 1)[-1], params, compress)
+            with self.lock: self.bodies[key] = cached
+        status, content_type, body, compressed = cached
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        if compressed: request.send_header("Content-Encoding", "gzip")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        if status != 204: request.wfile.write(body)
@@ -1,16 +1,31 @@
+import os
 import sys
+import logging
+from collections import OrderedDict
+from threading import Lock, Thread
+from concurrent.futures import ThreadPoolExecutor
+from time import strftime, gmtime, monotonic
 
-from requests import get
-from time import strftime, gmtime
+import numpy as np
 
-from PySide6.QtCore import Qt, QSize, QDate, Signal, Slot
-from PySide6.QtGui import QAction, QIcon, QBrush, QColor, QDesktopServices
+from PySide6.QtCore import Qt, QSize, QDate, QPointF, QRectF, QObject, QThread, QTimer, QAbstractTableModel, QAbstractProxyModel, QModelIndex, Signal, Slot
+from PySide6.QtGui import QAction, QActionGroup, QIcon, QColor, QDesktopServices, QPainter, QPen, QPolygonF, QImage
 from PySide6.QtWidgets import (
     QApplication, QWidget, QMainWindow, QSizePolicy,
     QVBoxLayout, QHBoxLayout, QGridLayout, QAbstractItemView,
-    QStatusBar, QToolBar, QLabel, QDoubleSpinBox, QDateEdit, QTableWidget, QTableWidgetItem, QSpacerItem, QPushButton)
+    QStatusBar, QToolBar, QLabel, QLineEdit, QComboBox, QCheckBox, QDoubleSpinBox, QDateEdit, QTableView, QTreeWidget, QTreeWidgetItem, QSpacerItem, QPushButton, QFileDialog,
+    QDialog, QDialogButtonBox, QFormLayout, QSpinBox, QInputDialog, QSystemTrayIcon)
 
-api_url = "https://earthquake.usgs.gov/fdsnws/event/1/"
+from quakexplore import EventStore, EventFilter, StoreSnapshot, Region, Query, providers, api_url, api_session, day_ms, time_param, feed, FeedPoller
+from quakexplore.files import write, read_columns, read_batches, columnar
+from quakexplore.stats import EventStats, mag_centres, mag_step, depth_step, hour_ms
+from quakexplore.render import MapView
+from quakexplore.cluster import Sequences, haversine
+from quakexplore.timing import Timings
+from quakexplore.rules import alert_levels, describe, RuleBook, SavedQuery, WatchRule, Watcher
+
+feed_periods = {"past hour": "hour", "past day": "day", "past week": "week", "past month": "month"}
+file_filters = {"CSV (*.csv)": ".csv", "GeoJSON (*.geojson)": ".geojson", "Parquet (*.parquet)": ".parquet", "Arrow (*.arrow)": ".arrow"}
 
 sources = {
     'ak': "Alaska Earthquake Center", 'at': "National Tsunami Warning Center", 'atlas': "ShakeMap Atlas",
@@ -53,10 +68,116 @@ class MainWindow(QMainWindow):
         self.addToolBar(self.toolbar)
 
         # QUERY
-        query_action = QAction(QIcon('res/go-down-skip.svg'), "Start query", self)
-        #query_action.setStatusTip("Start query...")
-        query_action.triggered.connect(self.query_action)
-        self.toolbar.addAction(query_action)
+        self.start_query_action = QAction(QIcon('res/go-down-skip.svg'), "Start query", self)
+        #self.start_query_action.setStatusTip("Start query...")
+        self.start_query_action.triggered.connect(self.query_action)
+        self.toolbar.addAction(self.start_query_action)
+
+        # CANCEL QUERY
+        self.cancel_query_action = QAction(QIcon.fromTheme("process-stop", QIcon('res/window-close.svg')), "Cancel query", self)
+        self.cancel_query_action.triggered.connect(self.cancel_query)
+        self.toolbar.addAction(self.cancel_query_action)
+        self.cancel_query_action.setVisible(False)
+
+        # LIVE FEED
+        self.live_action = QAction(QIcon.fromTheme("media-playback-start", QIcon('res/dialog-messages.svg')), "Live feed", self)
+        self.live_action.setCheckable(True)
+        self.live_action.toggled.connect(self.live_toggled)
+        self.toolbar.addAction(self.live_action)
+        self.feed_box = QComboBox()
+        self.feed_box.addItems(feed_periods)
+        self.feed_box.setCurrentText("past day")
+        self.feed_box.setToolTip("Live feed period (the feed level follows min magnitude)")
+        self.toolbar.addWidget(self.feed_box)
+        self.feed_thread = None
+        self.feed_worker = None
+        self.feed_timer = QTimer(self)
+        self.feed_timer.setInterval(60000) # summary feeds are regenerated every minute
+        self.stopping = set() # stopped feed threads still returning from a poll
+
+        # PROVIDERS
+        self.provider_boxes = {}
+        for key, provider in providers.items():
+            provider_box = QCheckBox(provider.name)
+            provider_box.setChecked(key == 'usgs')
+            self.toolbar.addWidget(provider_box)
+            self.provider_boxes[key] = provider_box
+        self.format_box = QComboBox() # USGS response format: csv and text are smaller, but carry no felt reports, intensities, alerts or significance
+        self.format_box.addItems(providers['usgs'].formats)
+        self.format_box.setToolTip("USGS response format")
+        self.toolbar.addWidget(self.format_box)
+
+        # EXPORT / IMPORT
+        self.export_action = QAction(QIcon.fromTheme("document-save"), "Export listed quakes", self)
+        self.export_action.triggered.connect(self.export_quakes)
+        self.toolbar.addAction(self.export_action)
+        self.import_action = QAction(QIcon.fromTheme("document-open"), "Import quakes", self)
+        self.import_action.triggered.connect(self.import_quakes)
+        self.toolbar.addAction(self.import_action)
+        self.file_worker = None
+
+        # SAVED QUERIES
+        try: self.rule_book = RuleBook().load()
+        except (ValueError, OSError) as err:
+            print(f"Rules error: {err}")
+            self.status_bar.showMessage(f"Rules error: {err}")
+            self.rule_book = None # a malformed file is left as is: nothing is saved over it
+        self.saved_box = QComboBox()
+        self.saved_box.setMinimumWidth(120)
+        self.saved_box.setToolTip("Saved queries: select one to fill in its filters")
+        self.saved_box.activated.connect(self.apply_saved_query)
+        self.toolbar.addWidget(self.saved_box)
+        self.save_query_action = QAction(QIcon.fromTheme("bookmark-new"), "Save query", self)
+        self.save_query_action.triggered.connect(self.save_query)
+        self.toolbar.addAction(self.save_query_action)
+        self.delete_query_action = QAction(QIcon.fromTheme("edit-delete"), "Delete saved query", self)
+        self.delete_query_action.triggered.connect(self.delete_saved_query)
+        self.toolbar.addAction(self.delete_query_action)
+
+        # WATCH RULES
+        self.watch_action = QAction(QIcon.fromTheme("appointment-soon", QIcon('res/dialog-messages.svg')), "Watch rules", self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.toggled.connect(self.watch_toggled)
+        self.toolbar.addAction(self.watch_action)
+        self.add_rule_action = QAction(QIcon.fromTheme("list-add"), "Add watch rule", self)
+        self.add_rule_action.triggered.connect(self.add_rule)
+        self.toolbar.addAction(self.add_rule_action)
+        self.remove_rule_action = QAction(QIcon.fromTheme("list-remove"), "Remove watch rule", self)
+        self.remove_rule_action.triggered.connect(self.remove_rule)
+        self.toolbar.addAction(self.remove_rule_action)
+        self.watcher = Watcher() # rules compiled when watching starts, matches reported once per rule and quake
+        self.watch_thread = None
+        self.watch_worker = None
+        self.watch_seeded = False
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(60000)
+        self.tray = QSystemTrayIcon(QIcon('res/dialog-messages.svg'), self) # desktop notifications, shown while watching
+        self.tray.setToolTip("quakexplore: watching")
+        self.refresh_saved()
+
+        # SEQUENCES
+        self.sequences_action = QAction(QIcon.fromTheme("view-list-tree"), "Group sequences", self)
+        self.sequences_action.setCheckable(True)
+        self.sequences_action.toggled.connect(self.sequences_toggled)
+        self.toolbar.addAction(self.sequences_action)
+        self.cluster_worker = None
+        self.recluster = False # the store changed while clustering
+
+        # STATISTICS
+        self.stats_action = QAction(QIcon.fromTheme("x-office-spreadsheet"), "Statistics", self)
+        self.stats_action.setCheckable(True)
+        self.stats_action.toggled.connect(self.panel_toggled)
+        self.toolbar.addAction(self.stats_action)
+
+        # MAP
+        self.map_action = QAction(QIcon.fromTheme("applications-internet"), "Map", self)
+        self.map_action.setCheckable(True)
+        self.map_action.toggled.connect(self.panel_toggled)
+        self.toolbar.addAction(self.map_action)
+        self.panel_group = QActionGroup(self) # statistics or map in place of the details, or neither
+        self.panel_group.setExclusionPolicy(QActionGroup.ExclusionPolicy.ExclusiveOptional)
+        self.panel_group.addAction(self.stats_action)
+        self.panel_group.addAction(self.map_action)
 
         # DETAILS
         self.event_page_action = QAction(QIcon('res/usgs-logo-circle-transparent.png'), "Open USGS event page", self)
@@ -128,6 +249,57 @@ class MainWindow(QMainWindow):
         filters_layout.addWidget(self.end_date, 1, 2)
         filters_layout.addWidget(self.end_date_label, 1, 3)
 
+        # LOCATION SEARCH (filters loaded quakes, no new query)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("search location...")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.setFixedWidth(180)
+        self.search_edit.textChanged.connect(self.search_changed)
+        filters_layout.addWidget(self.search_edit, 0, 4, 1, 2)
+
+        # DEPTH SPINBOXES (filters loaded quakes)
+        self.min_depth_spinbox = QDoubleSpinBox()
+        self.min_depth_spinbox.setRange(-10, 800)
+        self.min_depth_spinbox.setSingleStep(10)
+        self.min_depth_spinbox.setFixedWidth(85)
+        self.min_depth_spinbox.setPrefix("\u2265 ")
+        self.min_depth_spinbox.setSuffix(" km")
+        self.min_depth_spinbox.setValue(-10)
+        self.min_depth_spinbox.valueChanged.connect(self.depth_spinbox_value_changed)
+        self.max_depth_spinbox = QDoubleSpinBox()
+        self.max_depth_spinbox.setRange(-10, 800)
+        self.max_depth_spinbox.setSingleStep(10)
+        self.max_depth_spinbox.setFixedWidth(85)
+        self.max_depth_spinbox.setPrefix("\u2264 ")
+        self.max_depth_spinbox.setSuffix(" km")
+        self.max_depth_spinbox.setValue(800)
+        self.max_depth_spinbox.valueChanged.connect(self.depth_spinbox_value_changed)
+        filters_layout.addWidget(self.min_depth_spinbox, 1, 4)
+        filters_layout.addWidget(self.max_depth_spinbox, 1, 5)
+
+        # FACETS: net, status, alert (filters loaded quakes)
+        self.facet_boxes = {}
+        for column, (name, label) in enumerate((('net', "any network"), ('status', "any status"), ('alert', "any alert"), ('source', "any provider"))):
+            facet_box = QComboBox()
+            facet_box.setFixedWidth(110)
+            facet_box.addItem(label)
+            facet_box.currentIndexChanged.connect(lambda index, name=name: self.facet_changed(name))
+            filters_layout.addWidget(facet_box, column % 2, 6 + column // 2)
+            self.facet_boxes[name] = facet_box
+
+        # REGION (query parameters and filter of loaded quakes)
+        self.region = None
+        self.region_box = QComboBox()
+        self.region_box.setFixedWidth(100)
+        self.region_box.addItems(["anywhere", *Region.kinds])
+        self.region_box.currentIndexChanged.connect(self.region_kind_changed)
+        self.region_edit = QLineEdit()
+        self.region_edit.setEnabled(False)
+        self.region_edit.setClearButtonEnabled(True)
+        self.region_edit.editingFinished.connect(self.region_changed)
+        filters_layout.addWidget(self.region_box, 2, 2)
+        filters_layout.addWidget(self.region_edit, 2, 3, 1, 5)
+
         layout.addLayout(filters_layout)
 
     # |------------------------------------|
@@ -145,8 +317,15 @@ class MainWindow(QMainWindow):
         output_layout.addWidget(self.data)
 
         # DATALIST
-        self.quakes = []
-        self.datalist = QTableWidget()
+        self.store = EventStore()
+        self.timings = Timings() # stages of the last query, import or live update: status bar and structured logs
+        self.model = QuakeModel(self.store, self.timings)
+        self.query_thread = None
+        self.query_worker = None
+        self.proxy = QuakeProxyModel(self.model)
+        self.proxy.set_filter('mag', (self.min_magnitude_spinbox.value(), self.max_magnitude_spinbox.value())) # the listed quakes always match the spinboxes
+        self.datalist = QTableView()
+        self.datalist.setModel(self.proxy)
         #self.datalist.setReadOnly(True)
         """ self.data.setOpenExternalLinks(True)
         self.data.setOpenLinks(False)
@@ -154,21 +333,26 @@ class MainWindow(QMainWindow):
         self.datalist.setFixedWidth(700)
         self.datalist.setShowGrid(False)
         self.datalist.setSelectionBehavior(QAbstractItemView.SelectRows)
-        self.datalist.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.datalist.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.datalist.setEditTriggers(QAbstractItemView.NoEditTriggers)
         #self.datalist.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.datalist.setColumnCount(6)
-        self.datalist.setColumnHidden(5, True) # id is disabled by default!
+        self.datalist.verticalHeader().setDefaultSectionSize(self.datalist.verticalHeader().minimumSectionSize()) # uniform rows, no per-row size hints
+        self.datalist.setColumnHidden(6, True) # id is disabled by default!
+        self.datalist.setColumnHidden(7, True) # sequence: shown while sequences are grouped
+        self.datalist.horizontalHeader().moveSection(7, 0)
+        self.datalist.setColumnWidth(7, 70)
         self.datalist.setColumnWidth(0, 110)
         self.datalist.setColumnWidth(1, 90)
         self.datalist.setColumnWidth(2, 70)
         self.datalist.setColumnWidth(3, 95)
-        self.datalist.setColumnWidth(4, 315)
+        self.datalist.setColumnWidth(4, 245)
+        self.datalist.setColumnWidth(5, 70)
         
+        self.datalist.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
         self.datalist.setSortingEnabled(True)
         self.datalist.verticalHeader().setVisible(False)
-        self.datalist.setHorizontalHeaderLabels(["datetime", "magnitude", "depth", "significance", "location", "id"]) # id is disabled by default!
-        self.datalist.horizontalHeader().sortIndicatorChanged.connect(self.sort_quakes)
-        self.datalist.currentItemChanged.connect(self.show_quake_details)
+        self.datalist.selectionModel().currentRowChanged.connect(self.show_quake_details)
+        self.datalist.clicked.connect(self.sequence_clicked)
 
         data_layout.addWidget(self.datalist)
 
@@ -198,6 +382,24 @@ class MainWindow(QMainWindow):
         self.detail_ids = QPushButton("Associated events")
         self.detail_ids.clicked.connect(self.show_ids)
         self.detail_ids.setVisible(False)
+        self.detail_sources = QLabel()
+        self.detail_sources.setWordWrap(True)
+        self.detail_sequence = QLabel()
+        self.detail_sequence.setWordWrap(True)
+        self.detail_sequence.setVisible(False)
+        self.detail_tree = QTreeWidget()
+        self.detail_tree.setHeaderHidden(True)
+        self.detail_tree.setVisible(False)
+
+        # event details are fetched in the background once the selection settles, with the neighbour rows prefetched
+        self.detail_id = None
+        self.detail_loader = DetailLoader()
+        self.detail_loader.loaded.connect(self.detail_loaded)
+        self.detail_loader.failed.connect(self.detail_failed)
+        self.detail_timer = QTimer(self)
+        self.detail_timer.setSingleShot(True)
+        self.detail_timer.setInterval(250)
+        self.detail_timer.timeout.connect(self.fetch_details)
 
         details_layout.addWidget(self.detail_summary)
         details_layout.addWidget(self.detail_summaryx)
@@ -209,23 +411,30 @@ class MainWindow(QMainWindow):
         details_layout.addWidget(self.detail_net)
         details_layout.addWidget(self.detail_nst)
         details_layout.addWidget(self.detail_accuracy)
+        details_layout.addWidget(self.detail_sequence)
+        details_layout.addWidget(self.detail_sources)
         details_layout.addWidget(self.detail_ids)
+        details_layout.addWidget(self.detail_tree)
         details_layout.addStretch()
         details_layout.addWidget(self.detail_status)
         details_layout.addWidget(self.detail_updated)
+
+    # STATISTICS AND MAP (in place of the details)
+        self.stats_panel = StatsPanel(self.proxy)
+        self.stats_panel.setFixedWidth(450)
+        self.stats_panel.setVisible(False)
+        output_layout.addWidget(self.stats_panel)
+        self.quake_map = QuakeMap(self.proxy)
+        self.quake_map.setFixedWidth(450)
+        self.quake_map.setVisible(False)
+        self.quake_map.picked.connect(self.map_picked)
+        self.quake_map.boxed.connect(self.map_boxed)
+        output_layout.addWidget(self.quake_map)
         
         layout.addLayout(output_layout)
 
     # |------------------------------------|
         
-    # test query: api version
-        """ try:
-            api_endpoint = "version"
-            version = get(api_url + api_endpoint).text
-            print("USGS API version:", version)
-            self.status_bar.showMessage("USGS API version: " + version)
-        except ConnectionError as err: print("Connection error:", err) """
-
     # CONTAINER
         container = QWidget()
         container.setLayout(layout)
@@ -238,109 +447,475 @@ class MainWindow(QMainWindow):
     @Slot() # reusable statusbar updater
     def update_statusbar(self, value, text): self.status_bar.showMessage(f"{value} {text}")
 
+    @Slot() # service version, checked in the background at startup
+    def check_version(self):
+        self.version_check = VersionCheck(self)
+        self.version_check.checked.connect(self.version_checked)
+        self.version_check.failed.connect(self.version_failed)
+        self.version_check.start()
+
+    @Slot()
+    def version_checked(self, version):
+        print(f"USGS API version: {version}")
+        self.status_bar.showMessage(f"USGS API version: {version}")
+
+    @Slot()
+    def version_failed(self, error):
+        print(error)
+        self.status_bar.showMessage(error)
+
     @Slot() # exit
-    def exit_action(self): sys.exit('Goodbye!')
+    def exit_action(self):
+        self.shutdown()
+        sys.exit('Goodbye!')
+
+    def closeEvent(self, event):
+        self.shutdown()
+        super(MainWindow, self).closeEvent(event)
+
+    def shutdown(self): # background work that must not outlive the window
+        self.detail_loader.close()
+        self.live_action.setChecked(False)
+        self.watch_action.setChecked(False)
+        for thread in list(self.stopping): thread.wait(3000) # aborted polls return quickly, a running thread can't be destroyed
 
     @Slot() # about
     def about_action(self):
         print('About...')
 
-    @Slot() # sorting quakes when table is sorted
-    def sort_quakes(self, i, o):
-        keys = {0: 'datetime', 1: 'magnitude', 2: 'depth', 3: 'significance'}
-        index = keys[i]
-        order = 'asc.' if o == Qt.AscendingOrder else 'desc.'
-        print(f"Sorting quakes by {index} ({order})")
-
-        if index == 'datetime': self.quakes.sort(key=lambda s: s['datetime'], reverse=True if o == Qt.DescendingOrder else False)
-        elif index == 'magnitude': self.quakes.sort(key=lambda s: s['props']['mag'], reverse=True if o == Qt.DescendingOrder else False)
-        elif index == 'depth': self.quakes.sort(key=lambda s: s['geometry']['coordinates'][2], reverse=True if o == Qt.DescendingOrder else False)
-        else: self.quakes.sort(key=lambda s: s['props']['sig'], reverse=True if o == Qt.DescendingOrder else False)
-
-    @Slot() # start and list query
+    @Slot() # start query in the background, rows are listed as batches arrive
     def query_action(self):
+        if self.query_thread is not None or self.file_worker is not None: return
+        self.live_action.setChecked(False)
         min_mag = f"{self.min_magnitude_spinbox.value():.1f}"
         max_mag = f"{self.max_magnitude_spinbox.value():.1f}"
         start = f"{self.start_date.date().year()}-{self.start_date.date().month()}-{self.start_date.date().day()}"
         end = f"{self.end_date.date().year()}-{self.end_date.date().month()}-{self.end_date.date().day()}"
-        api_endpoint = f"query?format=geojson&orderby=time&starttime={start}&endtime={end}&minmagnitude={min_mag}&maxmagnitude={max_mag}"
+        params = {'minmagnitude': min_mag, 'maxmagnitude': max_mag, **(self.region.params() if self.region else {})}
         
-        print(f"Query: {api_url}{api_endpoint}\n  > Filters - min: {min_mag} max: {max_mag} start: {start} end: {end}")
+        selected = [key for key, provider_box in self.provider_boxes.items() if provider_box.isChecked()] or ['usgs']
+        print(f"Query: {', '.join(providers[key].name for key in selected)}\n  > Filters - min: {min_mag} max: {max_mag} start: {start} end: {end}{f' region: {self.region}' if self.region else ''}")
         self.details.setVisible(False)
         self.event_page_action.setVisible(False)
-                
-        data = get(api_url + api_endpoint).json()
-        row = 0
-        self.quakes = []
-        self.datalist.clearContents()
-        self.datalist.setFocus()
-        self.datalist.setRowCount(data['metadata']['count'])
-        self.datalist.sortItems(0, Qt.DescendingOrder)
-        
-        for quake in data['features']:
-            props = quake['properties']
-
-            datetime = strftime("%y-%m-%d %H:%M:%S", gmtime(int(props['time']/1000)))
-            datetime_item = QTableWidgetItem(datetime)
-            datetime_item.setTextAlignment(Qt.AlignCenter)
-
-            mag = f"{props['mag']:.1f}"
-            mag_item = QTableWidgetItem()
-            mag_item.setTextAlignment(Qt.AlignCenter)
-            mag_item.setData(Qt.DisplayRole, float(f"{props['mag']:.1f}"))
-            
-            depth = f"{quake['geometry']['coordinates'][2]:.1f}"
-            depth_item = QTableWidgetItem()
-            depth_item.setTextAlignment(Qt.AlignCenter)
-            depth_item.setData(Qt.DisplayRole, float(f"{quake['geometry']['coordinates'][2]:.1f}"))
-
-            sig_item = QTableWidgetItem()
-            sig_item.setTextAlignment(Qt.AlignCenter)
-            sig_item.setData(Qt.DisplayRole, props['sig'])
-            
-            label = f"{datetime:<17}{mag:^11}{depth:^11}{props['place']}"
-            
-            self.datalist.setItem(row, 0, datetime_item)
-            self.datalist.setItem(row, 1, mag_item)
-            self.datalist.setItem(row, 2, depth_item)
-            self.datalist.setItem(row, 3, sig_item)
-            self.datalist.setItem(row, 4, QTableWidgetItem(f"{props['place']}"))
-            self.datalist.setItem(row, 5, QTableWidgetItem(f"{quake['id']}"))
-
-            row += 1
-            self.quakes.append({
-                'id': quake['id'],
-                'label': label,
-                'datetime': datetime,
-                'props': props,
-                'geometry': quake['geometry']
-            })
-
-        min_sig = min(q['props']['sig'] for q in self.quakes)
-        max_sig = max(q['props']['sig'] for q in self.quakes)
-        
-        # another option for choosing min/max:
-        #max_sig = max(self.quakes, key=lambda x:x['props']['sig'])
-        #min_sig = min(self.quakes, key=lambda x:x['props']['sig'])
-
-        for row in range(self.datalist.rowCount()):
-            alpha = int(255*((self.quakes[row]['props']['sig'] - min_sig) / ((max_sig - min_sig)*0.01))*0.01)
-            for column in range(self.datalist.columnCount()): self.datalist.item(row, column).setBackground(QBrush(QColor(255, 153, 51, alpha)))
 
-        self.quakes.sort(key=lambda s: s['datetime'], reverse=True)
-        self.quake_count.v = data['metadata']['count']
-        print(f"{data['metadata']['count']} quakes. Maximal/minimal significance: {max_sig}/{min_sig} - Done.")
+        self.model.clear()
+        self.timings.reset()
+        self.datalist.setFocus()
+        self.status_bar.showMessage("Querying...")
+
+        self.query_thread = QThread(self)
+        self.query_worker = QueryWorker(params, day_ms(*self.start_date.date().getDate()), day_ms(*self.end_date.date().getDate()), selected, self.region, formats={'usgs': self.format_box.currentText()}, timings=self.timings)
+        self.query_worker.moveToThread(self.query_thread)
+        self.query_thread.started.connect(self.query_worker.run)
+        self.query_worker.batch.connect(self.list_quakes)
+        self.query_worker.retract.connect(self.model.remove)
+        self.query_worker.progress.connect(self.query_progress)
+        self.query_worker.planned.connect(self.query_planned)
+        self.query_worker.cached.connect(self.query_cached)
+        self.query_worker.failed.connect(self.query_failed)
+        self.query_worker.done.connect(self.query_done)
+        self.query_worker.done.connect(self.query_thread.quit)
+        self.query_thread.finished.connect(self.query_thread_finished)
+
+        self.start_query_action.setEnabled(False)
+        self.live_action.setEnabled(False)
+        self.import_action.setEnabled(False)
+        self.cancel_query_action.setVisible(True)
+        self.query_thread.start()
+
+    @Slot() # cancel running query
+    def cancel_query(self):
+        if self.query_worker is None: return
+        print("Cancelling query...")
+        self.query_worker.cancel()
+
+    @Slot() # query progress: bytes received, features parsed, expected feature count
+    def query_progress(self, received, parsed, expected):
+        total = f"/{expected}" if expected else ""
+        self.status_bar.showMessage(f"Downloading... {received/1048576:.1f} MB, {parsed}{total} quakes parsed.")
+
+    @Slot() # query plan: number of windows and expected quakes
+    def query_planned(self, windows, expected):
+        print(f"  > Query plan: {expected} quakes in {windows} window(s)")
+        self.status_bar.showMessage(f"Downloading {expected} quakes in {windows} window(s)...")
+
+    @Slot() # quakes listed from the local catalog
+    def query_cached(self, cached, gaps, synced):
+        print(f"  > Catalog: {cached} cached quakes, {gaps} missing window(s){f', last sync: {time_param(synced)}' if synced else ''}")
+
+    @Slot() # query error
+    def query_failed(self, error):
+        print(f"Query error: {error}")
+        self.status_bar.showMessage(f"Query error: {error}")
+
+    @Slot() # append a batch of parsed events to the table
+    def list_quakes(self, records):
+        self.model.extend(records)
+
+    @Slot() # query finished (or cancelled)
+    def query_done(self, cancelled):
+        self.refresh_facets()
+        self.quake_count.v = self.proxy.rowCount()
+        print(f"{self.proxy.rowCount()} quakes, {self.query_worker.query.received/1048576:.1f} MB received. Maximal/minimal significance: {self.store.max_sig}/{self.store.min_sig} - {'Cancelled' if cancelled else 'Done'}.")
+        self.timings.log('query', events=len(self.store), listed=self.proxy.rowCount(), received=self.query_worker.query.received, cancelled=cancelled)
+        print(f"  > Timings: {self.timings.summary()} ({self.timings.wall():.2f}s)")
+        if cancelled: self.status_bar.showMessage(f"Query cancelled, {len(self.store)} quakes listed.")
+        elif not self.query_worker.query.error: self.status_bar.showMessage(f"{self.proxy.rowCount()} quakes listed in {self.timings.wall():.1f}s ({self.timings.summary()}).")
+        if self.sequences_action.isChecked(): self.cluster()
+
+    @Slot() # query thread stopped
+    def query_thread_finished(self):
+        self.query_thread.deleteLater()
+        self.query_worker.deleteLater()
+        self.query_thread = None
+        self.query_worker = None
+        self.start_query_action.setEnabled(True)
+        self.live_action.setEnabled(True)
+        self.import_action.setEnabled(True)
+        self.cancel_query_action.setVisible(False)
+
+    def file_path(self, caption, save): # file dialog, the extension of the selected filter is appended when missing
+        dialog = QFileDialog.getSaveFileName if save else QFileDialog.getOpenFileName
+        path, selected = dialog(self, caption, "", ";;".join(file_filters) if save else f"Catalogs (*{' *'.join(file_filters.values())} *.json *.feather);;{';;'.join(file_filters)}")
+        if path and save and '.' not in path.rsplit('/', 1)[-1]: path += file_filters.get(selected, ".csv")
+        return path
+
+    def start_file_task(self, task, message):
+        self.file_worker = FileWorker(task, self)
+        self.file_worker.batch.connect(self.model.extend)
+        self.file_worker.columns.connect(self.model.load)
+        self.file_worker.done.connect(self.file_done)
+        for action in (self.start_query_action, self.live_action, self.export_action, self.import_action): action.setEnabled(False)
+        self.status_bar.showMessage(message)
+        self.file_worker.start()
+
+    @Slot() # write the listed quakes (filtered, in view order) to a file in the background
+    def export_quakes(self):
+        if self.query_thread is not None or self.file_worker is not None or not self.proxy.rowCount(): return
+        path = self.file_path("Export listed quakes", True)
+        if not path: return
+        self.live_action.setChecked(False) # the store must not change while it is written
+        rows = self.proxy.view.copy()
+        print(f"Exporting {len(rows)} quakes to {path}...")
+        def task(worker):
+            write(self.store, rows, path)
+            return f"{len(rows)} quakes exported to {path}."
+        self.start_file_task(task, f"Exporting {len(rows)} quakes...")
+
+    @Slot() # replace the listed quakes with a saved catalog, streamed (csv, GeoJSON) or memory-mapped (Parquet, Arrow)
+    def import_quakes(self):
+        if self.query_thread is not None or self.file_worker is not None: return
+        path = self.file_path("Import quakes", False)
+        if not path: return
+        print(f"Importing {path}...")
+        self.live_action.setChecked(False)
+        self.details.setVisible(False)
+        self.event_page_action.setVisible(False)
+        self.model.clear()
+        self.timings.reset()
+        def task(worker):
+            if columnar(path): worker.columns.emit(read_columns(path))
+            else:
+                for batch in read_batches(path): worker.batch.emit(batch)
+            return f"Imported {path}."
+        self.start_file_task(task, "Importing...")
+
+    @Slot() # export/import finished
+    def file_done(self, message):
+        self.file_worker.deleteLater()
+        self.file_worker = None
+        for action in (self.start_query_action, self.live_action, self.export_action, self.import_action): action.setEnabled(True)
+        self.refresh_facets()
+        self.quake_count.v = self.proxy.rowCount()
+        print(message)
+        self.status_bar.showMessage(f"{message} {self.proxy.rowCount()} quakes listed.")
+        if self.timings.stages: self.timings.log('import', events=len(self.store), listed=self.proxy.rowCount()) # exports list nothing
+        if self.sequences_action.isChecked(): self.cluster()
+
+    @Slot() # group the listed quakes into sequences (mainshock rows collapse their foreshocks and aftershocks)
+    def sequences_toggled(self, checked):
+        self.datalist.setColumnHidden(7, not checked)
+        self.datalist.setColumnWidth(4, 175 if checked else 245)
+        if checked: self.cluster()
+        else:
+            self.proxy.set_sequences(None)
+            self.quake_count.v = self.proxy.rowCount()
+        current = self.datalist.currentIndex()
+        if current.isValid(): self.show_sequence(int(self.proxy.view[current.row()]))
+
+    def cluster(self): # Gardner-Knopoff clustering of the loaded quakes in the background, rerun once if the store changed meanwhile
+        if self.cluster_worker is not None:
+            self.recluster = True
+            return
+        self.recluster = False
+        print(f"Clustering {len(self.store)} quakes...")
+        self.status_bar.showMessage("Clustering sequences...")
+        self.cluster_worker = ClusterWorker(StoreSnapshot(self.store, ('lat', 'lon', 'time', 'mag')), self) # the store may be cleared or extended while clustering
+        self.cluster_worker.done.connect(self.cluster_done)
+        self.cluster_worker.start()
+
+    @Slot()
+    def cluster_done(self, sequences, seconds):
+        self.cluster_worker.deleteLater()
+        self.cluster_worker = None
+        if not self.sequences_action.isChecked(): return
+        if sequences is None: # failed
+            self.status_bar.showMessage("Clustering failed.")
+            return self.cluster() if self.recluster else None
+        if sequences.state[1] != self.store.revision: return self.cluster() # cleared or updated meanwhile: row indexes may be stale
+        self.proxy.set_sequences(sequences)
+        self.quake_count.v = self.proxy.rowCount()
+        clustered = int(np.count_nonzero(sequences.mainshock != np.arange(len(sequences))))
+        print(f"  > {sequences.count()} sequences, {clustered} foreshocks and aftershocks ({seconds:.2f}s)")
+        self.status_bar.showMessage(f"{sequences.count()} sequences, {clustered} foreshocks and aftershocks grouped, {self.proxy.rowCount()} rows listed.")
+        current = self.datalist.currentIndex()
+        if current.isValid(): self.show_sequence(int(self.proxy.view[current.row()]))
+        if self.recluster: self.cluster()
+
+    @Slot() # a click on the sequence column expands or collapses the sequence
+    def sequence_clicked(self, index):
+        if index.column() != 7: return
+        row = self.proxy.toggle(index.row())
+        if row is None or row < 0: return
+        self.datalist.setCurrentIndex(self.proxy.index(row, 7))
+        self.datalist.scrollTo(self.proxy.index(row, 7))
+        self.quake_count.v = self.proxy.rowCount()
+
+    def show_sequence(self, row): # sequence of the selected quake on the details panel
+        sequences = self.proxy.sequences
+        self.detail_sequence.setVisible(sequences is not None)
+        if sequences is None: return
+        role, head, size, foreshocks, days, km = sequences.describe(self.store, row)
+        if role == 'isolated': return self.detail_sequence.setText("Sequence: isolated quake (no foreshocks or aftershocks).")
+        summary = f"{size} quakes ({foreshocks} foreshocks, {size - foreshocks - 1} aftershocks) over {days:.1f} days, within {km:.0f} km"
+        if role == 'mainshock': return self.detail_sequence.setText(f"Sequence: mainshock of {summary}.")
+        mainshock = self.store.quake(head)
+        distance = float(haversine(self.store['lat'][head], self.store['lon'][head], self.store['lat'][row], self.store['lon'][row]))
+        days = (int(self.store['time'][row]) - int(self.store['time'][head])) / 86400000
+        self.detail_sequence.setText(f"Sequence: {role} of the M{mainshock['props']['mag'] or 0:.1f} quake of {mainshock['datetime']} ({distance:.0f} km, {abs(days):.1f} days {'before' if days < 0 else 'after'}), {summary}.")
+
+    @Slot() # show the statistics or the map of the listed quakes in place of the details
+    def panel_toggled(self):
+        print(f"Panel: {self.panel_group.checkedAction().text() if self.panel_group.checkedAction() else 'details'}")
+        self.stats_panel.setVisible(self.stats_action.isChecked())
+        self.quake_map.setVisible(self.map_action.isChecked())
+        self.details.setVisible(self.panel_group.checkedAction() is None and self.datalist.currentIndex().isValid())
+
+    @Slot() # select the table row of a quake clicked on the map
+    def map_picked(self, row):
+        index = self.proxy.mapFromSource(self.model.index(row, 0))
+        if not index.isValid(): return
+        self.datalist.setCurrentIndex(index)
+        self.datalist.scrollTo(index, QAbstractItemView.PositionAtCenter)
+
+    @Slot() # box drawn on the map (shift + drag): region filter
+    def map_boxed(self, min_lat, max_lat, min_lon, max_lon):
+        self.region_box.setCurrentText("box")
+        self.region_edit.setText(f"{min_lat:.2f}, {max_lat:.2f}, {min_lon:.2f}, {max_lon:.2f}")
+        self.region_changed()
+
+    @Slot() # start/stop live feed polling
+    def live_toggled(self, checked):
+        if checked:
+            url = feed(self.min_magnitude_spinbox.value(), feed_periods[self.feed_box.currentText()])
+            print(f"Live feed: {url}")
+            self.model.clear()
+            self.details.setVisible(False)
+            self.event_page_action.setVisible(False)
+            self.feed_box.setEnabled(False)
+            self.status_bar.showMessage("Live feed: polling...")
+
+            self.feed_thread = QThread(self)
+            self.feed_worker = FeedWorker(url)
+            self.feed_worker.moveToThread(self.feed_thread)
+            self.feed_thread.started.connect(self.feed_worker.poll)
+            self.feed_timer.timeout.connect(self.feed_worker.poll)
+            self.feed_worker.delta.connect(self.live_delta)
+            self.feed_worker.polled.connect(self.live_polled)
+            self.feed_worker.failed.connect(self.query_failed)
+            self.feed_thread.finished.connect(self.feed_worker.deleteLater)
+            self.feed_thread.start()
+            self.feed_timer.start()
+        elif self.feed_thread is not None:
+            print("Live feed stopped.")
+            self.stop_feed(self.feed_thread, self.feed_worker, self.feed_timer)
+            self.feed_thread = None
+            self.feed_worker = None
+            self.feed_box.setEnabled(True)
+
+    def stop_feed(self, thread, worker, timer): # stops polling without waiting for a poll in flight: the thread is deleted when it finishes
+        timer.stop()
+        timer.timeout.disconnect(worker.poll)
+        worker.stop()
+        self.stopping.add(thread)
+        thread.finished.connect(self.feed_thread_finished)
+        thread.quit()
+
+    @Slot() # a stopped feed thread returned from its last poll
+    def feed_thread_finished(self):
+        thread = self.sender()
+        self.stopping.discard(thread)
+        thread.deleteLater()
+
+    @Slot() # apply live feed changes in place
+    def live_delta(self, records, removed):
+        self.timings.reset()
+        self.model.extend(records)
+        self.model.remove(removed)
+        self.timings.log('live', events=len(records), removed=len(removed), listed=self.proxy.rowCount())
+        self.refresh_facets()
+        self.quake_count.v = self.proxy.rowCount()
+        if self.sequences_action.isChecked(): self.cluster()
+
+    @Slot() # live feed poll result: changed and removed event counts
+    def live_polled(self, changed, removed):
+        if changed or removed: print(f"Live feed: {changed} new/updated, {removed} removed quakes.")
+        else: self.status_bar.showMessage(f"{self.quake_count.v} quakes listed, live feed up to date ({strftime('%H:%M:%S')}).")
+
+    def refresh_saved(self): # saved query names and the state of the rule actions
+        current = self.saved_box.currentText()
+        self.saved_box.clear()
+        self.saved_box.addItem("saved queries")
+        if self.rule_book: self.saved_box.addItems(list(self.rule_book.queries))
+        self.saved_box.setCurrentIndex(max(self.saved_box.findText(current), 0))
+        for action in (self.save_query_action, self.delete_query_action, self.watch_action, self.add_rule_action, self.remove_rule_action): action.setEnabled(self.rule_book is not None)
+        if self.rule_book: self.watch_action.setToolTip("Watch rules:\n" + "\n".join(str(rule) for rule in self.rule_book.rules.values()) if self.rule_book.rules else "Watch rules (none yet)")
+
+    def save_rules(self, change): # reloads the file (the command line may have changed it), applies change(book) and saves -> False (status bar error) on failure
+        try:
+            self.rule_book.load()
+            change(self.rule_book)
+            self.rule_book.save()
+        except (ValueError, OSError) as err:
+            print(f"Rules error: {err}")
+            self.status_bar.showMessage(f"Rules error: {err}")
+            return False
+        self.refresh_saved()
+        return True
+
+    @Slot() # fill in the filters of a saved query
+    def apply_saved_query(self, index):
+        if index < 1: return
+        query = self.rule_book.queries[self.saved_box.currentText()]
+        print(f"Saved query: {query.name}")
+        self.min_magnitude_spinbox.setValue(query.min_mag)
+        self.max_magnitude_spinbox.setValue(query.max_mag)
+        if query.start: self.start_date.setDate(QDate.fromString(query.start, "yyyy-MM-dd"))
+        if query.end: self.end_date.setDate(QDate.fromString(query.end, "yyyy-MM-dd"))
+        self.region_edit.setText(query.region.text() if query.region else "")
+        self.region_box.setCurrentText(query.region.kind if query.region else "anywhere")
+        self.region_changed()
+        for key, provider_box in self.provider_boxes.items(): provider_box.setChecked(key in query.providers)
+        if query.format: self.format_box.setCurrentText(query.format)
+        self.status_bar.showMessage(f"Saved query '{query.name}' applied: start the query to run it.")
+
+    @Slot() # save the current filters under a name
+    def save_query(self):
+        current = self.saved_box.currentText() if self.saved_box.currentIndex() > 0 else ""
+        name, ok = QInputDialog.getText(self, "Save query", "Name:", text=current)
+        if not ok or not name.strip(): return
+        name = name.strip()
+        selected = [key for key, provider_box in self.provider_boxes.items() if provider_box.isChecked()] or ['usgs']
+        query = SavedQuery(name, self.min_magnitude_spinbox.value(), self.max_magnitude_spinbox.value(), self.start_date.date().toString("yyyy-MM-dd"),
+                           self.end_date.date().toString("yyyy-MM-dd"), self.region, selected, self.format_box.currentText())
+        if not self.save_rules(lambda book: book.queries.update({name: query})): return
+        print(f"Query saved: {name}")
+        self.saved_box.setCurrentText(name)
+
+    @Slot() # delete the selected saved query
+    def delete_saved_query(self):
+        if self.saved_box.currentIndex() < 1: return self.status_bar.showMessage("Select a saved query to delete.")
+        name = self.saved_box.currentText()
+        if self.save_rules(lambda book: book.queries.pop(name, None)): print(f"Saved query deleted: {name}")
+
+    @Slot() # new watch rule over the current region
+    def add_rule(self):
+        dialog = RuleDialog(self.region, self.min_magnitude_spinbox.value(), self)
+        if not dialog.exec(): return
+        rule = dialog.rule()
+        if not self.save_rules(lambda book: book.rules.update({rule.name: rule})): return
+        print(f"Watch rule added: {rule}")
+        self.status_bar.showMessage(f"Watch rule added: {rule}")
+        if self.watch_thread is not None: # recompiled, the feed level may change
+            self.watch_toggled(False)
+            self.watch_toggled(True)
+
+    @Slot() # remove a watch rule
+    def remove_rule(self):
+        if not self.rule_book.rules: return self.status_bar.showMessage("No watch rules.")
+        name, ok = QInputDialog.getItem(self, "Remove watch rule", "Rule:", list(self.rule_book.rules), 0, False)
+        if not ok: return
+        if not self.save_rules(lambda book: book.rules.pop(name, None)): return
+        print(f"Watch rule removed: {name}")
+        if self.watch_thread is not None:
+            self.watch_toggled(False)
+            if self.rule_book.rules: self.watch_toggled(True)
+            else: self.watch_action.setChecked(False)
+
+    @Slot() # start/stop evaluating the watch rules against the real-time feed, independently of the listed quakes
+    def watch_toggled(self, checked):
+        if checked:
+            if self.watch_thread is not None: return
+            try: self.rule_book.load() # rules added from the command line meanwhile
+            except (ValueError, OSError) as err:
+                print(f"Rules error: {err}")
+                self.status_bar.showMessage(f"Rules error: {err}")
+                return self.watch_action.setChecked(False)
+            self.refresh_saved()
+            if not self.rule_book.rules:
+                self.status_bar.showMessage("No watch rules: add one first.")
+                return self.watch_action.setChecked(False)
+            self.watcher.compile(self.rule_book.rules.values())
+            url = feed(self.watcher.min_magnitude(), "hour") # polled every minute, the past hour is enough
+            print(f"Watching {len(self.watcher.rules)} rule(s): {url}")
+            self.status_bar.showMessage(f"Watching {len(self.watcher.rules)} rule(s)...")
+
+            self.watch_thread = QThread(self)
+            self.watch_worker = FeedWorker(url)
+            self.watch_worker.moveToThread(self.watch_thread)
+            self.watch_thread.started.connect(self.watch_worker.poll)
+            self.watch_timer.timeout.connect(self.watch_worker.poll)
+            self.watch_worker.delta.connect(self.watch_delta)
+            self.watch_worker.polled.connect(self.watch_polled)
+            self.watch_seeded = False # the first snapshot of the feed is not notified
+            self.watch_worker.failed.connect(self.query_failed)
+            self.watch_thread.finished.connect(self.watch_worker.deleteLater)
+            self.watch_thread.start()
+            self.watch_timer.start()
+            if QSystemTrayIcon.isSystemTrayAvailable(): self.tray.show()
+        elif self.watch_thread is not None:
+            print("Watching stopped.")
+            self.stop_feed(self.watch_thread, self.watch_worker, self.watch_timer)
+            self.watch_thread = None
+            self.watch_worker = None
+            self.tray.hide()
+
+    @Slot() # new or updated feed quakes: every rule evaluated in one pass, new matches notified
+    def watch_delta(self, records, removed):
+        self.watcher.forget(removed)
+        found = self.watcher.check(records, seed=not self.watch_seeded)
+        if not found: return
+        lines = [f"{rule.name}: {describe(record)}" for rule, record in found]
+        for line in lines: print(f"Watch: {line}")
+        self.status_bar.showMessage(f"Watch: {lines[-1]}" + (f" (+{len(lines) - 1} more)" if len(lines) > 1 else ""))
+        if self.tray.isVisible(): self.tray.showMessage(f"{len(lines)} watched quake{'s' if len(lines) > 1 else ''}", "\n".join(lines[:5]) + (f"\n... and {len(lines) - 5} more" if len(lines) > 5 else ""), QSystemTrayIcon.MessageIcon.Information, 10000)
+
+    @Slot() # the feed was read: later matches are new
+    def watch_polled(self, changed, removed):
+        if not self.watch_seeded: self.status_bar.showMessage(f"Watching {len(self.watcher.rules)} rule(s): quakes matching from now on are notified.")
+        self.watch_seeded = True
 
     @Slot() # show quake details
-    def show_quake_details(self, quake):
-        if self.datalist.currentRow() == -1: pass
+    def show_quake_details(self, current):
+        if not current.isValid(): pass
         else:
             self.datalist.setFocus()
-            self.details.setVisible(True)
+            self.details.setVisible(self.panel_group.checkedAction() is None)
+            self.quake_map.select(int(self.proxy.view[current.row()]))
             self.event_page_action.setVisible(True)
             self.detail_intensity.setVisible(True)
             self.detail_alert.setVisible(True)
-            quake = self.quakes[quake.row()]
+            quake = self.proxy.quake(current.row())
             print(f"Show quake details: {quake['id']}, significance: {quake['props']['sig']}\n  > {quake['label']}\n  > Associated events ({quake['props']['ids'].count(',') - 1}): {quake['props']['ids'].strip(',').split(',')}")
 
             # summary TODO: colorize magError, depthError, add magNst
@@ -361,30 +936,72 @@ class MainWindow(QMainWindow):
             else: self.detail_intensity.setVisible(False)
 
             self.detail_alert.setText(f"<a href='https://earthquake.usgs.gov/data/pager/'>PAGER</a> alert level: <font color='{quake['props']['alert']}'>{quake['props']['alert']}</font>") if quake['props']['alert'] else self.detail_alert.setVisible(False)
-            self.detail_net.setText(f"Preferred source: <a href='https://earthquake.usgs.gov/data/comcat/catalog/{quake['props']['net']}/'>{sources[quake['props']['net']]}</a>")
+            if quake['props']['net'] in sources: self.detail_net.setText(f"Preferred source: <a href='https://earthquake.usgs.gov/data/comcat/catalog/{quake['props']['net']}/'>{sources[quake['props']['net']]}</a> ({quake['props']['source']})")
+            else: self.detail_net.setText(f"Preferred source: {quake['props']['net'] or 'unknown'} ({quake['props']['source']})")
             self.detail_ids.setVisible(False) if (quake['props']['ids'].count(",") == 2 and quake['props']['ids'].strip(",") == quake['id']) or (quake['props']['ids'].count(",") == 3 and "usauto" in quake['props']['ids']) else self.detail_ids.setVisible(True)
 
             # accuracy TODO: colorize
             self.detail_nst.setText(f"Seismic stations that reported P- and S-arrival times: {quake['props']['nst']}")
             self.detail_accuracy.setText(f"dmin: {quake['props']['dmin']}, rms: {quake['props']['rms']}, gap: {quake['props']['gap']}{degree_sign}")
 
-            # ...
-            
-            # sources TODO: locationSource, magSource, sources
+            self.show_sequence(int(self.proxy.view[current.row()]))
 
-            self.detail_status.setText(f"<font color='{'green' if quake['props']['status'] == 'reviewed' else 'yellow'}'>{quake['props']['status'].upper()}</font>")
+            # sources: from the event detail, fetched lazily
+            self.detail_id = quake['id']
+            detail = self.detail_loader.cache.get(quake['id']) if quake['props']['source'].startswith('usgs') else None
+            if detail is not None: self.show_detail(quake['id'], detail)
+            else:
+                self.detail_sources.setText("Loading sources..." if quake['props']['source'].startswith('usgs') else f"Sources: {quake['props']['source']}")
+                self.detail_tree.clear()
+                self.detail_timer.start() # restarted on every row change: holding an arrow key fetches nothing until it settles
+
+            self.detail_status.setText(f"<font color='{'green' if quake['props']['status'] == 'reviewed' else 'yellow'}'>{(quake['props']['status'] or 'unknown').upper()}</font>")
             self.detail_updated.setText(f"(last update: {strftime('%y-%m-%d %H:%M:%S', gmtime(int(quake['props']['updated']/1000)))})")
 
+    @Slot() # fetch details of the selected quake and prefetch its neighbours
+    def fetch_details(self):
+        row = self.datalist.currentIndex().row()
+        if row < 0: return
+        rows = [row] + [r for offset in (1, -1, 2, -2) if 0 <= (r := row + offset) < self.proxy.rowCount()]
+        index = [int(self.proxy.view[r]) for r in rows]
+        self.detail_loader.request([self.store.ids[i] for i in index if (self.store.text('source', i) or 'usgs').startswith('usgs')])
+
+    @Slot() # event details arrived (selected or prefetched quake)
+    def detail_loaded(self, quake_id, detail):
+        if quake_id == self.detail_id: self.show_detail(quake_id, detail)
+
+    @Slot() # event details failed to load: reported for the selected quake only, prefetches fail silently
+    def detail_failed(self, quake_id, error):
+        if quake_id != self.detail_id: return
+        print(f"Event details {quake_id} failed to load: {error}")
+        self.detail_sources.setText("Sources: the event details failed to load.")
+        self.status_bar.showMessage(f"Event details {quake_id} failed to load: {error}")
+
+    def show_detail(self, quake_id, detail): # contributing sources and associated events from the event detail
+        props = detail['properties']
+        products = props.get('products', {})
+        origin = (products.get('origin') or [{}])[0].get('properties', {})
+        contributing = props.get('sources', '').strip(',').split(',')
+        self.detail_sources.setText(f"Location source: {origin.get('origin-source', props.get('net'))}, magnitude source: {origin.get('magnitude-source', props.get('net'))}\nContributing sources: {', '.join(contributing)}")
+        self.detail_tree.clear()
+        ids = QTreeWidgetItem(self.detail_tree, [f"Associated events ({props.get('ids', '').count(',') - 1})"])
+        for id in props.get('ids', '').strip(',').split(','): QTreeWidgetItem(ids, [id + (" (preferred)" if id == quake_id else "")])
+        types = QTreeWidgetItem(self.detail_tree, [f"Products ({len(products)})"])
+        for name, versions in sorted(products.items()): QTreeWidgetItem(types, [f"{name}: {', '.join(sorted({version.get('source', '?') for version in versions}))}"])
+        ids.setExpanded(True)
+
     @Slot() # show associated events
     def show_ids(self):
         self.datalist.setFocus()
-        quake = self.quakes[self.datalist.currentRow()]
+        quake = self.proxy.quake(self.datalist.currentIndex().row())
         print(f"{quake['id']} - associated events ({quake['props']['ids'].count(',') - 1}): {quake['props']['ids'].strip(',').split(',')}")
+        self.detail_tree.setVisible(not self.detail_tree.isVisible())
+        if self.detail_tree.topLevelItemCount() == 0: self.fetch_details()
 
     @Slot() # open quake details
     def open_event_page(self):
         self.datalist.setFocus()
-        quake = self.quakes[self.datalist.currentRow()]
+        quake = self.proxy.quake(self.datalist.currentIndex().row())
         print(f"Open quake details: {quake['label']} - id: {quake['id']}\n  > url: {quake['props']['url']}")
         QDesktopServices.openUrl(quake['props']['url'])
 
@@ -392,11 +1009,59 @@ class MainWindow(QMainWindow):
     def min_magnitude_spinbox_value_changed(self, value):
         print(f"Minimal magnitude: {value:.1f}")
         self.min_magnitude_label.setText(f"min magnitude: {value:.1f}")
+        self.filter_quakes('mag', (value, self.max_magnitude_spinbox.value()))
 
     @Slot() # maximum magnitude
     def max_magnitude_spinbox_value_changed(self, value):
         print(f"Maximal magnitude: {value:.1f}")
         self.max_magnitude_label.setText(f"max magnitude: {value:.1f}")
+        self.filter_quakes('mag', (self.min_magnitude_spinbox.value(), value))
+
+    @Slot() # depth range
+    def depth_spinbox_value_changed(self):
+        depth = (self.min_depth_spinbox.value(), self.max_depth_spinbox.value())
+        self.filter_quakes('depth', None if depth == (-10, 800) else depth)
+
+    @Slot() # location search
+    def search_changed(self, text):
+        self.filter_quakes('text', text.strip())
+
+    @Slot() # net, status or alert facet
+    def facet_changed(self, name):
+        facet_box = self.facet_boxes[name]
+        self.filter_quakes(name, facet_box.currentText() if facet_box.currentIndex() > 0 else None)
+
+    @Slot() # region kind
+    def region_kind_changed(self, index):
+        kind = self.region_box.currentText()
+        self.region_edit.setEnabled(index > 0)
+        self.region_edit.setPlaceholderText(Region.kinds.get(kind, ""))
+        self.region_changed()
+
+    @Slot() # region coordinates
+    def region_changed(self):
+        region = None
+        if self.region_box.currentIndex() > 0 and self.region_edit.text().strip():
+            try: region = Region.parse(self.region_box.currentText(), self.region_edit.text())
+            except ValueError as err: return self.status_bar.showMessage(f"Region: {err}")
+        if str(region) == str(self.region): return
+        print(f"Region: {region or 'anywhere'}")
+        self.region = region
+        self.filter_quakes('region', region)
+
+    def filter_quakes(self, name, value): # filters are applied to the loaded quakes instantly
+        self.proxy.set_filter(name, value)
+        if self.query_thread is None: self.quake_count.v = self.proxy.rowCount()
+
+    def refresh_facets(self): # fill facet boxes with the values present in the loaded quakes
+        for name, facet_box in self.facet_boxes.items():
+            current = facet_box.currentText() if facet_box.currentIndex() > 0 else None
+            facet_box.blockSignals(True)
+            while facet_box.count() > 1: facet_box.removeItem(1)
+            facet_box.addItems(self.proxy.facets(name))
+            if current: facet_box.setCurrentIndex(max(facet_box.findText(current), 0))
+            facet_box.blockSignals(False)
+            if current and facet_box.currentIndex() == 0: self.facet_changed(name)
 
     @Slot() # start date
     def start_date_changed(self):
@@ -427,17 +1092,700 @@ class dValue(QWidget): # for dynamic variables that emit a signal when its value
         self.changed.emit(value)
 
 
-app = QApplication(sys.argv)
-
-# test query: api version
-try:
+# |------------------------------------|
+# |----- TABLE MODEL ------------------|
+# |------------------------------------|
+
+class QuakeModel(QAbstractTableModel): # table model over an EventStore (row == store index): display text and colors are computed in data()
+    headers = ["datetime", "magnitude", "depth", "significance", "location", "source", "id", "sequence"] # id is disabled by default! sequence is shown by the proxy
+    colors = [QColor(255, 153, 51, alpha) for alpha in range(256)]
+
+    def __init__(self, store, timings=None, parent=None):
+        super(QuakeModel, self).__init__(parent)
+        self.store = store
+        self.timings = timings or Timings()
+
+    def rowCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal: return self.headers[section]
+
+    def data(self, index, role=Qt.DisplayRole):
+        return self.cell(index.row(), index.column(), role) if index.isValid() else None
+
+    def cell(self, i, column, role):
+        store = self.store
+        if role == Qt.DisplayRole:
+            if column == 0: return strftime("%y-%m-%d %H:%M:%S", gmtime(int(store.arrays['time'][i]/1000)))
+            elif column == 1: return "" if np.isnan(store.arrays['mag'][i]) else f"{store.arrays['mag'][i]:.1f}"
+            elif column == 2: return f"{store.arrays['depth'][i]:.1f}"
+            elif column == 3: return str(store.arrays['sig'][i])
+            elif column == 4: return store.text('place', i)
+            elif column == 5: return store.text('source', i) or 'usgs'
+            elif column == 6: return store.ids[i]
+            else: return ""
+        elif role == Qt.TextAlignmentRole and column < 4: return Qt.AlignCenter
+        elif role == Qt.BackgroundRole:
+            span = store.max_sig - store.min_sig
+            return self.colors[int(255*(store.arrays['sig'][i] - store.min_sig)/span) if span else 0]
+        return None
+
+    def clear(self):
+        self.beginResetModel()
+        self.store.clear()
+        self.endResetModel()
+
+    def load(self, columns): # whole columns (ids, arrays, codes, pools) of a saved catalog
+        with self.timings.span('insert', len(columns[0])):
+            self.beginResetModel()
+            self.store.load_columns(*columns)
+            self.endResetModel()
+
+    def remove(self, ids):
+        if len(self.store.remove(ids)): self.dataChanged.emit(self.index(0, 0), self.index(len(self.store) - 1, len(self.headers) - 1))
+
+    def extend(self, records):
+        with self.timings.span('insert', len(records)): # filtering, sorting and statistics of the proxy are timed in their own stages
+            scale = (self.store.min_sig, self.store.max_sig)
+            start, revision = len(self.store), self.store.revision
+            self.store.extend(records)
+            if len(self.store) > start:
+                self.beginInsertRows(QModelIndex(), start, len(self.store) - 1)
+                self.endInsertRows() # rows are already in the store, views only have to be notified
+            if start and (revision != self.store.revision or scale != (self.store.min_sig, self.store.max_sig)): # repaint rows already listed
+                with self.timings.span('colour scale'): self.dataChanged.emit(self.index(0, 0), self.index(len(self.store) - 1, len(self.headers) - 1))
+
+class QuakeProxyModel(QAbstractProxyModel): # the single sort/filter index layer between the store and the views
+    sort_keys = {0: 'time', 1: 'mag', 2: 'depth', 3: 'sig', 4: 'place', 5: 'source', 6: 'id', 7: 'sequence'}
+
+    def __init__(self, model, parent=None):
+        super(QuakeProxyModel, self).__init__(parent)
+        self.store = model.store
+        self.timings = model.timings
+        self.filter = EventFilter(self.store)
+        self.stats = EventStats(self.store) # statistics of the rows passing the filters
+        self.perms = {} # sort key -> (ascending permutation, rows covered, store revision)
+        self.sort_key, self.sort_order = 'time', Qt.DescendingOrder
+        self.mask = np.ones(0, bool)
+        self.revision = self.store.revision # store revision the mask was computed for
+        self.view = np.empty(0, np.int64) # proxy row -> store index
+        self.position = None # store index -> proxy row (-1: filtered out), built on demand
+        self.sequences = None # Sequences of the store: mainshocks listed with their members collapsed
+        self.expanded = set() # mainshock rows listed with their members
+        self.setSourceModel(model)
+        model.modelReset.connect(self.source_reset)
+        model.rowsInserted.connect(self.source_rows_inserted)
+        model.dataChanged.connect(self.source_data_changed)
+
+    # |----- QAbstractProxyModel -----|
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.view) and 0 <= column < self.columnCount()): return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()): return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()): return 0 if parent.isValid() else len(self.view)
+
+    def columnCount(self, parent=QModelIndex()): return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole): return self.sourceModel().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        if index.column() == 7 and role == Qt.DisplayRole: return self.sequence_text(int(self.view[index.row()]))
+        return self.sourceModel().cell(self.view[index.row()], index.column(), role)
+
+    def mapToSource(self, index):
+        return self.sourceModel().index(int(self.view[index.row()]), index.column()) if index.isValid() else QModelIndex()
+
+    def mapFromSource(self, index):
+        if not index.isValid(): return QModelIndex()
+        if self.position is None:
+            self.position = np.full(len(self.store), -1, np.int64)
+            self.position[self.view] = np.arange(len(self.view))
+        row = int(self.position[index.row()])
+        return self.index(row, index.column()) if row != -1 else QModelIndex()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        print(f"Sorting quakes by {self.sourceModel().headers[column]} ({'asc.' if order == Qt.AscendingOrder else 'desc.'})")
+        self.sort_key, self.sort_order = self.sort_keys[column], order
+        self.relayout()
+
+    # |----- filters -----|
+
+    def set_filter(self, name, value): # mag/depth: (min, max), text: str, net/status/alert: str; None removes the filter
+        self.filter.set(name, value)
+        self.refilter()
+
+    def refilter(self):
+        with self.timings.span('filter'): self.mask = self.filter.mask(0, len(self.store))
+        self.revision = self.store.revision
+        self.restat()
+        self.relayout()
+
+    def restat(self):
+        with self.timings.span('stats'):
+            self.stats.reset()
+            self.stats.add(np.flatnonzero(self.mask))
+
+    # |----- sort permutations -----|
+
+    def values(self, key): # sortable column (strings via their order in the pool)
+        if key == 'id': return np.array(self.store.ids, dtype=object)
+        if key == 'sequence': return self.sequence_sizes()
+        if key in self.store.codes:
+            pool = self.store.pools[key]
+            rank = np.empty(len(pool), np.int64)
+            rank[sorted(range(len(pool)), key=lambda code: pool[code] or "")] = np.arange(len(pool))
+            return rank[self.store[key]]
+        return self.store[key]
+
+    def permutation(self, key): # cached ascending permutation, extended by merging when rows were only appended
+        size, revision = len(self.store), self.store.revision
+        perm, covered, perm_revision = self.perms.get(key, (None, 0, None))
+        if perm is None or perm_revision != revision or (covered != size and key in self.store.codes) or key == 'sequence': # string ranks shift with new pool entries, sequences with every clustering
+            perm = np.argsort(self.values(key), kind='stable')
+        elif covered < size:
+            values = self.values(key)
+            fresh = np.arange(covered, size)[np.argsort(values[covered:size], kind='stable')]
+            perm = np.insert(perm, np.searchsorted(values[perm], values[fresh], side='right'), fresh)
+        self.perms[key] = (perm, size, revision)
+        return perm
+
+    def relayout(self): # recompute the view from the cached permutation and the filter mask, keeping persistent indexes
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        rows = [int(self.view[index.row()]) for index in persistent]
+        self.layout()
+        self.changePersistentIndexList(persistent, [self.mapFromSource(self.sourceModel().index(i, index.column())) for i, index in zip(rows, persistent)])
+        self.layoutChanged.emit()
+
+    def layout(self):
+        with self.timings.span('sort'):
+            perm = self.permutation(self.sort_key)
+            view = perm[self.mask[perm]]
+            self.view = view[::-1].copy() if self.sort_order == Qt.DescendingOrder else view
+            if self.sequences is not None: self.view = self.group(self.view)
+            self.position = None
+
+    # |----- sequences -----|
+
+    def set_sequences(self, sequences): # None lists every quake flat
+        self.sequences = sequences
+        self.expanded = {head for head in self.expanded if sequences is not None and head < len(sequences) and sequences.size[head] > 1}
+        self.perms.pop('sequence', None)
+        self.relayout()
+
+    def sequence_sizes(self): # size of the sequence of every row (rows clustered later count as isolated)
+        sizes = np.ones(len(self.store), np.int64)
+        if self.sequences is not None:
+            clustered = min(len(self.sequences), len(sizes))
+            sizes[:clustered] = self.sequences.size[self.sequences.mainshock[:clustered]]
+        return sizes
+
+    def group(self, view): # mainshocks and isolated quakes in sort order, the listed members of expanded sequences (by time) after their mainshock
+        sequences, clustered = self.sequences, len(self.sequences)
+        heads = view.copy()
+        heads[view < clustered] = sequences.mainshock[view[view < clustered]]
+        top = view[(heads == view) | ~self.mask[heads]] # members of a filtered out mainshock are listed on their own
+        positions, members = [], []
+        for head in self.expanded:
+            row = np.flatnonzero(top == head)
+            if not len(row): continue
+            rows = sequences.members(head)
+            rows = rows[(rows != head) & self.mask[rows]]
+            rows = rows[np.argsort(self.store['time'][rows], kind='stable')]
+            positions.append(np.full(len(rows), row[0] + 1))
+            members.append(rows)
+        return np.insert(top, np.concatenate(positions), np.concatenate(members)) if members else top
+
+    def sequence_text(self, row):
+        if self.sequences is None: return ""
+        head = self.sequences.head(row)
+        if head != row: return "\u2514 fore" if self.store['time'][row] < self.store['time'][head] else "\u2514 after"
+        size = self.sequences.size[row] if row < len(self.sequences) else 1
+        return ("\u25be " if row in self.expanded else "\u25b8 ") + str(size) if size > 1 else ""
+
+    def toggle(self, row): # expand or collapse the sequence of a proxy row, returns the proxy row of its mainshock
+        if self.sequences is None: return None
+        head = self.sequences.head(int(self.view[row]))
+        if head >= len(self.sequences) or self.sequences.size[head] < 2: return None
+        self.expanded ^= {head}
+        self.relayout()
+        return self.mapFromSource(self.sourceModel().index(head, 0)).row()
+
+    @Slot()
+    def source_reset(self): # cleared, or replaced by loaded columns
+        self.beginResetModel()
+        self.perms = {}
+        self.sequences, self.expanded = None, set()
+        self.filter.reset()
+        with self.timings.span('filter'): self.mask = self.filter.mask(0, len(self.store))
+        self.revision = self.store.revision
+        self.restat()
+        self.layout()
+        self.endResetModel()
+
+    @Slot()
+    def source_rows_inserted(self, parent, first, last):
+        if self.revision != self.store.revision: return self.refilter()
+        with self.timings.span('filter'): fresh = self.filter.mask(len(self.mask), len(self.store))
+        with self.timings.span('stats'): self.stats.add(len(self.mask) + np.flatnonzero(fresh)) # new rows only
+        self.mask = np.concatenate((self.mask, fresh))
+        self.relayout()
+
+    @Slot()
+    def source_data_changed(self, top_left, bottom_right, roles=[]):
+        if self.revision != self.store.revision: self.refilter()
+        if len(self.view): self.dataChanged.emit(self.index(0, 0), self.index(len(self.view) - 1, self.columnCount() - 1))
+
+    def quake(self, row): return self.store.quake(int(self.view[row]))
+
+    def facets(self, name): # values of a categorical column present in the store
+        codes = np.unique(self.store[name][~self.store.removed[:len(self.store)]])
+        return sorted(value for value in (self.store.pools[name][code] for code in codes) if value)
+
+
+
+# |------------------------------------|
+# |----- STATISTICS -------------------|
+# |------------------------------------|
+
+class StatsPanel(QWidget): # statistics of the listed quakes (proxy.stats), repainted a few times per second at most while batches arrive
+    def __init__(self, proxy, parent=None):
+        super(StatsPanel, self).__init__(parent)
+        self.stats = proxy.stats
+        layout = QVBoxLayout()
+        layout.setContentsMargins(4, 4, 4, 4)
+        self.summary = QLabel()
+        self.summary.setWordWrap(True)
+        layout.addWidget(self.summary)
+        self.plots = [StatsPlot(self.stats, kind) for kind in ('magnitudes', 'rates', 'moments', 'depths')]
+        for plot in self.plots: layout.addWidget(plot)
+        self.setLayout(layout)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(200)
+        self.timer.timeout.connect(self.refresh)
+        proxy.layoutChanged.connect(self.schedule)
+        proxy.modelReset.connect(self.schedule)
+
+    @Slot()
+    def schedule(self):
+        if self.isVisible() and not self.timer.isActive(): self.timer.start()
+
+    def showEvent(self, event):
+        self.refresh()
+        super(StatsPanel, self).showEvent(event)
+
+    @Slot()
+    def refresh(self):
+        for plot in self.plots: plot.update()
+        summary = self.stats.summary()
+        if not summary['count']: return self.summary.setText("No quakes listed.")
+        if np.isnan(summary['b']): gr = f"Mc {summary['mc']:.1f}, too few quakes above Mc for a b-value"
+        else: gr = f"Mc {summary['mc']:.1f} (max. curvature), b = {summary['b']:.2f} \u00b1 {summary['b_error']:.2f}, a = {summary['a']:.2f} ({summary['above_mc']} quakes \u2265 Mc)"
+        self.summary.setText(f"{summary['count']} quakes, {summary['per_day']:.1f} per day\n{gr}\nMoment release: {summary['moment']:.2e} N m (Mw {summary['mw']:.1f})")
+
+class StatsPlot(QWidget): # one chart of the statistics panel, painted from the bins
+    margins = (44, 16, 8, 14) # left, top, right, bottom
+    color = QColor(255, 153, 51)
+
+    def __init__(self, stats, kind, parent=None):
+        super(StatsPlot, self).__init__(parent)
+        self.stats = stats
+        self.kind = kind
+        self.setMinimumHeight(100)
+
+    def paintEvent(self, event):
+        left, top, right, bottom = self.margins
+        area = QRectF(left, top, self.width() - left - right, self.height() - top - bottom)
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(self.palette().text().color())
+        painter.drawRect(area)
+        if self.stats.count: getattr(self, self.kind)(painter, area)
+        painter.end()
+
+    def labels(self, painter, area, title, x_min, x_max, y_max, y_min="0"):
+        painter.setPen(self.palette().text().color())
+        painter.drawText(QRectF(area.left(), 0, area.width(), area.top()), Qt.AlignLeft | Qt.AlignVCenter, title)
+        painter.drawText(QRectF(area.left(), area.bottom(), area.width(), self.height() - area.bottom()), Qt.AlignLeft | Qt.AlignVCenter, x_min)
+        painter.drawText(QRectF(area.left(), area.bottom(), area.width(), self.height() - area.bottom()), Qt.AlignRight | Qt.AlignVCenter, x_max)
+        painter.drawText(QRectF(0, area.top() - 8, area.left() - 4, 16), Qt.AlignRight | Qt.AlignVCenter, y_max)
+        painter.drawText(QRectF(0, area.bottom() - 8, area.left() - 4, 16), Qt.AlignRight | Qt.AlignVCenter, y_min)
+
+    def bars(self, painter, area, heights): # heights in [0, 1], one bar per value
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.color)
+        width = area.width() / len(heights)
+        for n in np.flatnonzero(heights): painter.drawRect(QRectF(area.left() + n * width, area.bottom() - heights[n] * area.height(), max(width - 1, 1), heights[n] * area.height()))
+
+    def line(self, painter, area, xs, ys, pen): # xs, ys in [0, 1]
+        painter.setPen(pen)
+        painter.drawPolyline(QPolygonF([QPointF(area.left() + x * area.width(), area.bottom() - y * area.height()) for x, y in zip(xs, ys)]))
+
+    def time_bins(self, width): # hourly bins for short spans, otherwise days (or several days per bar), at most one bar per pixel
+        start, counts, moments = self.stats.time.series(1)
+        if len(counts) <= 24 * 7: return start, counts, moments, 1, "hour"
+        days = max(int(np.ceil(len(counts) / 24 / width)), 1)
+        start, counts, moments = self.stats.time.series(24 * days)
+        return start, counts, moments, 24 * days, "day" if days == 1 else f"{days} days"
+
+    def magnitudes(self, painter, area): # frequency-magnitude distribution: counts per bin (bars) and cumulative counts (line), log scale, Gutenberg-Richter fit above Mc
+        counts, summary = self.stats.mags, self.stats.summary()
+        used = np.flatnonzero(counts)
+        if not len(used): return
+        first, last = used[0], used[-1] + 1
+        cumulative = counts[first:last][::-1].cumsum()[::-1]
+        top = np.ceil(np.log10(cumulative[0])) or 1
+        scale = lambda values: np.log10(np.maximum(values, 1)) / top
+        self.bars(painter, area, np.where(counts[first:last] > 0, np.maximum(scale(counts[first:last]), 0.01), 0))
+        xs = (np.arange(last - first) + 0.5) / (last - first)
+        self.line(painter, area, xs, scale(cumulative), QPen(self.palette().text().color(), 1.5))
+        mc = summary['mc']
+        if not np.isnan(summary['b']):
+            fit = mag_centres[first:last] >= mc - mag_step / 2
+            self.line(painter, area, xs[fit], np.clip((summary['a'] - summary['b'] * mag_centres[first:last][fit]) / top, 0, 1), QPen(Qt.red, 1, Qt.DashLine))
+        if mag_centres[first] <= mc < mag_centres[last - 1] + mag_step:
+            x = area.left() + (mc - mag_centres[first]) / ((last - first) * mag_step) * area.width() # left edge of the Mc bin
+            painter.setPen(QPen(Qt.red, 1, Qt.DotLine))
+            painter.drawLine(QPointF(x, area.top()), QPointF(x, area.bottom()))
+        self.labels(painter, area, f"Frequency-magnitude (log N), Mc {mc:.1f}", f"M {mag_centres[first]:.1f}", f"M {mag_centres[last - 1]:.1f}", f"10^{top:.0f}", "1")
+
+    def rates(self, painter, area):
+        start, counts, moments, hours, unit = self.time_bins(area.width())
+        peak = counts.max()
+        self.bars(painter, area, counts / peak)
+        end = start + len(counts) * hours * hour_ms
+        self.labels(painter, area, f"Quakes per {unit}", strftime("%y-%m-%d", gmtime(start / 1000)), strftime("%y-%m-%d", gmtime(end / 1000 - 1)), str(peak))
+
+    def moments(self, painter, area):
+        start, counts, moments, hours, unit = self.time_bins(area.width())
+        cumulative = np.concatenate(([0.0], moments.cumsum()))
+        if not cumulative[-1]: return
+        self.line(painter, area, np.arange(len(cumulative)) / (len(cumulative) - 1), cumulative / cumulative[-1], QPen(self.color, 1.5))
+        end = start + len(counts) * hours * hour_ms
+        self.labels(painter, area, "Cumulative moment release (N m)", strftime("%y-%m-%d", gmtime(start / 1000)), strftime("%y-%m-%d", gmtime(end / 1000 - 1)), f"{cumulative[-1]:.1e}")
+
+    def depths(self, painter, area):
+        counts = self.stats.depths
+        used = np.flatnonzero(counts)
+        if not len(used): return
+        counts = counts[:used[-1] + 1]
+        self.bars(painter, area, counts / counts.max())
+        self.labels(painter, area, f"Depth ({depth_step} km bins)", "0 km", f"{len(counts) * depth_step} km", str(counts.max()))
+
+# |------------------------------------|
+# |----- MAP --------------------------|
+# |------------------------------------|
+
+class QuakeMap(QWidget): # epicentre map of the listed quakes, rendered by numpy into an image: drag to pan, wheel to zoom, click to select, shift + drag for a region box
+    picked = Signal(int) # store row
+    boxed = Signal(float, float, float, float) # min lat, max lat, min lon, max lon
+
+    def __init__(self, proxy, parent=None):
+        super(QuakeMap, self).__init__(parent)
+        self.proxy = proxy
+        self.store = proxy.store
+        self.index = proxy.filter.geo_index # shared with the region filter
+        self.view = MapView()
+        self.selected = None # store row of the selected quake
+        self.press = self.last = self.box = None
+        self.frame = 0.0 # ms of the last render
+        self.setMinimumSize(200, 200)
+        self.setCursor(Qt.OpenHandCursor)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(200)
+        self.timer.timeout.connect(self.update)
+        proxy.layoutChanged.connect(self.schedule)
+        proxy.modelReset.connect(self.schedule)
+
+    @Slot()
+    def schedule(self):
+        if self.isVisible() and not self.timer.isActive(): self.timer.start()
+
+    def select(self, row):
+        self.selected = row
+        if self.isVisible(): self.update()
+
+    def resizeEvent(self, event):
+        self.view.resize(self.width(), self.height())
+        super(QuakeMap, self).resizeEvent(event)
+
+    def paintEvent(self, event):
+        started = monotonic()
+        pixels, visible, aggregated = self.view.render(self.store, self.index, self.proxy.mask)
+        image = QImage(pixels.data, self.view.width, self.view.height, self.view.width * 4, QImage.Format_ARGB32)
+        painter = QPainter(self)
+        painter.drawImage(0, 0, image)
+        if self.selected is not None and self.selected < len(self.store):
+            x, y = self.view.project(self.store.arrays['lat'][self.selected], self.store.arrays['lon'][self.selected])
+            painter.setPen(QPen(Qt.white, 2))
+            painter.drawEllipse(QPointF(x, y), 9, 9)
+        if self.box is not None:
+            painter.setPen(QPen(Qt.white, 1, Qt.DashLine))
+            painter.drawRect(QRectF(self.press, self.box).normalized())
+        painter.setPen(Qt.white)
+        painter.drawText(QRectF(6, 4, self.width() - 12, 16), Qt.AlignLeft | Qt.AlignVCenter, f"{visible} quakes{' (aggregated)' if aggregated else ''}")
+        painter.drawText(QRectF(6, 4, self.width() - 12, 16), Qt.AlignRight | Qt.AlignVCenter, f"{self.frame:.0f} ms")
+        painter.end()
+        self.frame = (monotonic() - started) * 1000
+
+    def mousePressEvent(self, event):
+        self.press = self.last = event.position()
+        if event.modifiers() & Qt.ShiftModifier: self.box = self.press
+        else: self.setCursor(Qt.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self.last is None: return
+        if self.box is not None: self.box = event.position()
+        else:
+            self.view.pan(event.position().x() - self.last.x(), event.position().y() - self.last.y())
+            self.last = event.position()
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        if self.press is None: return
+        moved = (event.position() - self.press).manhattanLength() >= 4
+        if self.box is not None and moved:
+            (lat1, lon1), (lat2, lon2) = self.view.unproject(self.press.x(), self.press.y()), self.view.unproject(event.position().x(), event.position().y())
+            self.boxed.emit(max(min(lat1, lat2), -90), min(max(lat1, lat2), 90), lon1 if self.press.x() < event.position().x() else lon2, lon2 if self.press.x() < event.position().x() else lon1)
+        elif not moved:
+            row = self.view.pick(self.store, self.index, self.proxy.mask, event.position().x(), event.position().y())
+            if row is not None: self.picked.emit(row)
+        self.press = self.last = self.box = None
+        self.setCursor(Qt.OpenHandCursor)
+        self.update()
+
+    def wheelEvent(self, event):
+        self.view.zoom(2 ** (event.angleDelta().y() / 240), event.position().x(), event.position().y())
+        self.update()
+
+# |------------------------------------|
+# |----- WATCH RULES ------------------|
+# |------------------------------------|
+
+class RuleDialog(QDialog): # a new watch rule over the region of the filters: magnitude threshold, and PAGER alert level or significance
+    def __init__(self, region, min_mag, parent=None):
+        super(RuleDialog, self).__init__(parent)
+        self.setWindowTitle("Add watch rule")
+        self.region = region
+        layout = QFormLayout(self)
+        self.name_edit = QLineEdit()
+        self.name_edit.setPlaceholderText("a new name, or an existing one to replace it")
+        layout.addRow("name:", self.name_edit)
+        layout.addRow("region:", QLabel(str(region) if region else "anywhere (set a region in the filters)"))
+        self.mag_spinbox = QDoubleSpinBox()
+        self.mag_spinbox.setRange(0, 10)
+        self.mag_spinbox.setSingleStep(0.1)
+        self.mag_spinbox.setValue(min_mag)
+        layout.addRow("min magnitude:", self.mag_spinbox)
+        self.alert_box = QComboBox()
+        self.alert_box.addItems(["none", *alert_levels])
+        layout.addRow("min alert:", self.alert_box)
+        self.sig_spinbox = QSpinBox()
+        self.sig_spinbox.setRange(0, 3000)
+        self.sig_spinbox.setSingleStep(50)
+        self.sig_spinbox.setSpecialValueText("none")
+        layout.addRow("or min significance:", self.sig_spinbox)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def accept(self):
+        if not self.name_edit.text().strip(): return self.name_edit.setFocus()
+        super(RuleDialog, self).accept()
+
+    def rule(self): return WatchRule(self.name_edit.text().strip(), self.region, self.mag_spinbox.value(), self.alert_box.currentText() if self.alert_box.currentIndex() > 0 else None, self.sig_spinbox.value() or None)
+
+
+# |------------------------------------|
+# |----- QUERY WORKER -----------------|
+# |------------------------------------|
+
+class QueryWorker(QObject): # runs a Query in the background and forwards its callbacks as signals
+    batch = Signal(list)
+    retract = Signal(list)
+    progress = Signal(int, int, int)
+    planned = Signal(int, int)
+    cached = Signal(int, int, object) # synced: epoch ms or None
+    failed = Signal(str)
+    done = Signal(bool)
+
+    def __init__(self, params, start, end, providers=('usgs',), region=None, catalog_path=None, workers=4, batch_size=500, formats=None, timings=None, parent=None):
+        super(QueryWorker, self).__init__(parent)
+        self.query = Query(params, start, end, providers, region, catalog_path, workers=workers, batch_size=batch_size, formats=formats, timings=timings)
+        self.query.on_batch = self.batch.emit
+        self.query.on_retract = self.retract.emit
+        self.query.on_progress = self.progress.emit
+        self.query.on_planned = self.planned.emit
+        self.query.on_cached = self.cached.emit
+        self.query.on_failed = self.failed.emit
+        self.query.on_done = self.done.emit
+
+    def cancel(self): self.query.cancel() # called from the GUI thread
+
+    @Slot()
+    def run(self): self.query.run()
+
+
+
+class FeedWorker(QObject): # polls a real-time summary feed with conditional requests and emits only the changes
+    delta = Signal(list, list)
+    polled = Signal(int, int)
+    failed = Signal(str)
+
+    def __init__(self, url, parent=None):
+        super(FeedWorker, self).__init__(parent)
+        self.feed = FeedPoller(url)
+
+    def stop(self): self.feed.stop() # called from the GUI thread: a poll in flight is aborted, nothing is emitted afterwards
+
+    @Slot()
+    def poll(self):
+        if self.feed.stopped: return
+        try: changed, removed = self.feed.poll()
+        except Exception as err: return None if self.feed.stopped else self.failed.emit(f"Live feed: {err}")
+        if self.feed.stopped: return self.feed.close()
+        if changed or removed: self.delta.emit(changed, removed)
+        self.polled.emit(len(changed), len(removed))
+
+# |------------------------------------|
+# |----- EVENT DETAILS ----------------|
+# |------------------------------------|
+
+class DetailCache: # LRU of event detail documents, bounded by count, size and age
+    def __init__(self, entries=200, size=32 << 20, age=600):
+        self.entries, self.size, self.age = entries, size, age
+        self.items = OrderedDict() # id -> (detail, bytes, stored at)
+        self.bytes = 0
+        self.lock = Lock()
+
+    def get(self, id):
+        with self.lock:
+            item = self.items.get(id)
+            if item is None: return None
+            if monotonic() - item[2] > self.age: # stale: drop and refetch
+                del self.items[id]
+                self.bytes -= item[1]
+                return None
+            self.items.move_to_end(id)
+            return item[0]
+
+    def put(self, id, detail, size):
+        with self.lock:
+            if id in self.items: self.bytes -= self.items.pop(id)[1]
+            self.items[id] = (detail, size, monotonic())
+            self.bytes += size
+            while len(self.items) > self.entries or (self.bytes > self.size and len(self.items) > 1):
+                self.bytes -= self.items.popitem(last=False)[1][1]
+
+class DetailLoader(QObject): # fetches event details on a small thread pool: cached, deduplicated, stale prefetches skipped
+    loaded = Signal(str, object)
+    failed = Signal(str, str) # id, error
+
+    def __init__(self, provider='usgs', workers=2, cache=None, parent=None):
+        super(DetailLoader, self).__init__(parent)
+        self.provider = providers[provider]
+        self.cache = cache or DetailCache()
+        self.pool = ThreadPoolExecutor(workers)
+        self.session = api_session(workers)
+        self.lock = Lock()
+        self.pending = set() # ids in flight or queued
+        self.wanted = set() # ids of the latest request, older prefetches are dropped
+
+    def request(self, ids): # the first id is the selected event, the others are prefetched
+        with self.lock:
+            self.wanted = set(ids)
+            for id in ids:
+                if id in self.pending or self.cache.get(id) is not None: continue
+                self.pending.add(id)
+                self.pool.submit(self.fetch, id)
+
+    def fetch(self, id):
+        try:
+            if id not in self.wanted: return
+            response = self.session.get(self.provider.url + "query", params={'eventid': id, 'format': 'geojson'}, timeout=30)
+            response.raise_for_status()
+            detail = response.json()
+            self.cache.put(id, detail, len(response.content))
+            self.loaded.emit(id, detail)
+        except Exception as err: self.failed.emit(id, str(err))
+        finally:
+            with self.lock: self.pending.discard(id)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+# |------------------------------------|
+# |----- FILES ------------------------|
+# |------------------------------------|
+
+class FileWorker(QObject): # runs an export/import task off the GUI thread, imported rows are handed over as signals, done carries the status message
+    batch = Signal(list)
+    columns = Signal(object)
+    done = Signal(str)
+
+    def __init__(self, task, parent=None):
+        super(FileWorker, self).__init__(parent)
+        self.task = task
+
+    def start(self): Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        try: message = self.task(self)
+        except (OSError, ValueError, RuntimeError) as err: message = f"File error: {err}."
+        self.done.emit(message)
+
+
+# |------------------------------------|
+# |----- SEQUENCES --------------------|
+# |------------------------------------|
+
+class ClusterWorker(QObject): # clusters the store into sequences off the GUI thread
+    done = Signal(object, float) # Sequences (None on failure), seconds
+
+    def __init__(self, snapshot, parent=None):
+        super(ClusterWorker, self).__init__(parent)
+        self.snapshot = snapshot
+
+    def start(self): Thread(target=self.run, daemon=True).start()
+
+    def run(self): # done is always emitted, with None on failure
+        started, sequences = monotonic(), None
+        try: sequences = Sequences(self.snapshot)
+        except Exception as err: print(f"Clustering error: {err!r}")
+        finally: self.done.emit(sequences, monotonic() - started)
+
+
+class VersionCheck(QObject): # asks the service version off the GUI thread, so the window shows up immediately
+    checked = Signal(str)
+    failed = Signal(str)
+
+    def start(self): Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        try:
+            with api_session(1) as session:
+                response = session.get(api_url + "version", timeout=10)
+                response.raise_for_status()
+                self.checked.emit(response.text)
+        except Exception as err: self.failed.emit(f"Connection error: {err}")
+
+
+if __name__ == "__main__":
+    if os.environ.get('QUAKEXPLORE_LOG'): logging.basicConfig(filename=os.environ['QUAKEXPLORE_LOG'], format="%(message)s", level=logging.INFO) # stage timings as JSON lines
+    app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    api_endpoint = "version"
-    version = get(api_url + api_endpoint).text
-    print(f"USGS API version: {version}")
-    window.status_bar.showMessage(f"USGS API version: {version}")
+    QTimer.singleShot(0, window.check_version) # after the first paint
     app.exec()
-except ConnectionError as err: print(f"Connection error: {err}")
-
-print("Closing application...")
+    print("Closing application...")
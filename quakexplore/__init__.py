@@ -0,0 +1,15 @@
+# quakexplore core: FDSN queries, parsing, event store, filters and the local catalog (no Qt)
+
+from .geo import Region, GeoIndex, distance_km
+from .store import event_fields, feature_record, EventStore, EventFilter, StoreSnapshot
+from .formats import parse_time, stream_geojson, text_records, csv_records, readers, json_backends
+from .fdsn import api_url, api_session, day_ms, time_param, Provider, providers, QueryPlanner, RateLimiter, feed, FeedPoller
+from .catalog import EventCatalog, cache_dir
+from .associate import Associator
+from .query import Query
+from .files import write, read, read_columns, read_records
+from .stats import EventStats, b_value, max_curvature, moment
+from .render import MapView
+from .cluster import Sequences, SpaceTimeIndex, gardner_knopoff
+from .timing import Timings
+from .rules import RuleBook, SavedQuery, WatchRule, Watcher
@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from .geo import distance_km
+from .store import field_position
+from .fdsn import provider_rank
+
+
+class Associator: # merges solutions of the same event from different providers (origin time buckets + epicentral distance)
+    def __init__(self, window=16000, distance=100.0, magnitude=1.0):
+        self.window = window # ms
+        self.distance = distance # km
+        self.magnitude = magnitude
+        self.buckets = defaultdict(list) # origin time bucket -> canonical ids
+        self.events = {} # canonical id -> (preferred record, providers)
+        self.alias = {} # any known id (USGS ids, merged solutions) -> canonical id
+        self.moved = {} # canonical id -> id of the preferred solution that took over its row
+
+    def match(self, record, provider):
+        t, lat, lon, mag = record[1], record[field_position['lat']], record[field_position['lon']], record[field_position['mag']]
+        best, best_score = None, 2.0
+        bucket = t // self.window
+        for key in (bucket - 1, bucket, bucket + 1):
+            for id in self.buckets.get(key, ()):
+                other, other_providers = self.events[id]
+                if provider in other_providers: continue # never merge two events of one catalog
+                dt = abs(other[1] - t)
+                if dt > self.window: continue
+                if mag is not None and other[field_position['mag']] is not None and abs(other[field_position['mag']] - mag) > self.magnitude: continue
+                distance = distance_km(lat, lon, other[field_position['lat']], other[field_position['lon']])
+                if distance > self.distance: continue
+                score = dt / self.window + distance / self.distance
+                if score < best_score: best, best_score = id, score
+        return best
+
+    def resolve(self, id):
+        id = self.alias.get(id)
+        while id in self.moved: id = self.moved[id]
+        return id
+
+    def register(self, id, record, providers):
+        self.events[id] = (record, providers)
+        self.alias[id] = id
+        for alias in (record[field_position['ids']] or "").strip(',').split(','):
+            if alias: self.alias.setdefault(alias, id)
+
+    def merge(self, records): # -> (records to list, ids to retract)
+        listed, retracted = [], []
+        for record in records:
+            provider = (record[-1] or 'usgs').split('+')[0]
+            id = self.resolve(record[0]) or self.match(record, provider)
+            if id is None:
+                self.register(record[0], record, {provider})
+                self.buckets[record[1] // self.window].append(record[0])
+                listed.append(record)
+                continue
+            preferred, merged = self.events[id]
+            merged = merged | {provider}
+            if record[0] == id or provider_rank[provider] < provider_rank[(preferred[-1] or 'usgs').split('+')[0]]:
+                preferred = record
+                if record[0] != id: # a preferred solution takes over the listed row
+                    retracted.append(id)
+                    self.buckets[preferred[1] // self.window].append(record[0])
+                    self.buckets[self.events[id][0][1] // self.window].remove(id)
+                    del self.events[id]
+                    self.moved[id] = record[0]
+                    id = record[0]
+            preferred = (*preferred[:-1], '+'.join(sorted(merged, key=provider_rank.get)))
+            self.register(id, preferred, merged)
+            self.alias[record[0]] = id
+            listed.append(preferred)
+        return listed, retracted
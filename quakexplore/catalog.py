@@ -0,0 +1,79 @@
+import os
+import sqlite3
+from threading import Lock
+
+import numpy as np
+
+from .store import event_fields, field_position
+
+
+def cache_dir():
+    path = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser("~/.cache"), "quakexplore")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class EventCatalog: # on-disk event cache (SQLite) that remembers which (time, magnitude) windows it holds
+    fields = [name for name, dtype in event_fields]
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "catalog.sqlite")
+        self.lock = Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False) # writes from the fetch pool are serialized by the lock
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS events ({', '.join(f'{name} {self.column_type(dtype)}' for name, dtype in event_fields)}, cell INTEGER, PRIMARY KEY (id)) WITHOUT ROWID")
+        existing = {row[1] for row in self.db.execute("PRAGMA table_info(events)")}
+        for name, dtype in event_fields: # catalogs written by older versions
+            if name not in existing: self.db.execute(f"ALTER TABLE events ADD COLUMN {name} {self.column_type(dtype)}" + (" DEFAULT 'usgs'" if name == 'source' else ""))
+        for column in ('time', 'mag', 'cell'): self.db.execute(f"CREATE INDEX IF NOT EXISTS events_{column} ON events ({column})")
+        self.db.execute("CREATE TABLE IF NOT EXISTS windows (start INTEGER, end INTEGER, minmag REAL, maxmag REAL, synced INTEGER)")
+        self.db.commit()
+
+    @staticmethod
+    def column_type(dtype):
+        if dtype is str: return "TEXT"
+        return "REAL" if np.issubdtype(dtype, np.floating) else "INTEGER"
+
+    @staticmethod
+    def cell(lon, lat): # 1 degree grid cell
+        return (int(lat // 1) + 90) * 360 + int(lon // 1) + 180
+
+    def close(self): self.db.close()
+
+    def store(self, records, commit=True): # insert or refresh events; deleted events are dropped from the cache
+        lon, lat = field_position['lon'], field_position['lat']
+        with self.lock:
+            self.db.executemany(f"INSERT OR REPLACE INTO events ({', '.join(self.fields)}, cell) VALUES ({', '.join('?' * (len(self.fields) + 1))})", [(*record, self.cell(record[lon], record[lat])) for record in records if record[field_position['status']] != 'deleted'])
+            self.db.executemany("DELETE FROM events WHERE id = ?", [(record[0],) for record in records if record[field_position['status']] == 'deleted'])
+            if commit: self.db.commit()
+
+    def commit(self):
+        with self.lock: self.db.commit()
+
+    def load(self, start, end, min_mag, max_mag, region=None, batch_size=5000): # yields cached events of a window (and region) in batches
+        where, args = "time BETWEEN ? AND ? AND mag BETWEEN ? AND ?", [start, end, min_mag, max_mag]
+        if region is not None: # latitude band = contiguous grid cell range
+            min_lat, max_lat, ranges = region.bounds()
+            where += f" AND cell BETWEEN ? AND ? AND lat BETWEEN ? AND ? AND ({' OR '.join('lon BETWEEN ? AND ?' for lon_range in ranges)})" # the cells cover whole degrees, boxes are exact
+            args += [self.cell(-180, max(min_lat, -90)), self.cell(179.9, min(max_lat, 89.9)), min_lat, max_lat, *(lon for lon_range in ranges for lon in lon_range)]
+        cursor = self.db.execute(f"SELECT {', '.join(self.fields)} FROM events WHERE {where} ORDER BY time DESC", args)
+        lat, lon = field_position['lat'], field_position['lon']
+        while records := cursor.fetchmany(batch_size):
+            if region is not None and region.kind != 'box':
+                inside = region.contains(np.array([record[lat] for record in records]), np.array([record[lon] for record in records]))
+                records = [record for record, keep in zip(records, inside) if keep]
+            if records: yield records
+
+    def missing(self, start, end, min_mag, max_mag): # -> (time gaps not held for this magnitude range, oldest sync time of the held parts)
+        windows = self.db.execute("SELECT start, end, synced FROM windows WHERE minmag <= ? AND maxmag >= ? AND start <= ? AND end >= ? ORDER BY start", (min_mag, max_mag, end, start)).fetchall()
+        gaps, cursor = [], start
+        for s, e, synced in windows:
+            if s > cursor: gaps.append((cursor, s))
+            cursor = max(cursor, e)
+        if cursor < end: gaps.append((cursor, end))
+        return gaps, min((synced for s, e, synced in windows), default=None)
+
+    def mark(self, start, end, min_mag, max_mag, synced): # the window is now held, windows inside it are superseded
+        with self.lock:
+            self.db.execute("DELETE FROM windows WHERE start >= ? AND end <= ? AND minmag >= ? AND maxmag <= ?", (start, end, min_mag, max_mag))
+            self.db.execute("INSERT INTO windows VALUES (?, ?, ?, ?, ?)", (start, end, min_mag, max_mag, synced))
+            self.db.commit()
@@ -0,0 +1,226 @@
+import sys
+import logging
+import argparse
+from threading import Lock
+from time import time, perf_counter, sleep
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .fdsn import providers, day_ms, time_param, api_session, RateLimiter, QueryPlanner, feed, FeedPoller
+from .formats import parse_time, json_backends
+from .geo import Region
+from .store import EventStore, EventFilter
+from .query import Query
+from .files import writer, writers, read, columnar
+from .rules import alert_levels, describe, RuleBook, WatchRule, Watcher
+
+
+def parse_date(text): # YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS[.fff] (UTC) -> epoch milliseconds
+    try: return parse_time(text) if 'T' in text else day_ms(*(int(value) for value in text.split('-')))
+    except (TypeError, ValueError): raise argparse.ArgumentTypeError(f"invalid date: '{text}'") from None
+
+def parse_providers(text):
+    keys = [key.strip().lower() for key in text.split(',') if key.strip()]
+    unknown = [key for key in keys if key not in providers]
+    if unknown or not keys: raise argparse.ArgumentTypeError(f"unknown provider(s): {', '.join(unknown)} (use {', '.join(providers)})")
+    return keys
+
+def query(args):
+    try: write = writer(args.out)
+    except ValueError as err: return f"Export error: {err}"
+    region = None
+    for kind in Region.kinds:
+        if getattr(args, kind) is not None:
+            try: region = Region.parse(kind, getattr(args, kind))
+            except ValueError as err: return f"Invalid {kind}: {err}"
+    end = args.end if args.end is not None else int(time() * 1000)
+    params = {'minmagnitude': f"{args.minmag:.1f}", 'maxmagnitude': f"{args.maxmag:.1f}", **(region.params() if region else {})}
+    print(f"Query: {', '.join(providers[key].name for key in args.providers)}\n  > Filters - min: {args.minmag:.1f} max: {args.maxmag:.1f} start: {time_param(args.start)} end: {time_param(end)}{f' region: {region}' if region else ''}")
+
+    store, lock = EventStore(), Lock()
+    def batch(records):
+        with lock, job.timings.span('insert', len(records)): store.extend(records)
+    def retract(ids):
+        with lock: store.remove(ids)
+    job = Query(params, args.start, end, args.providers, region, cache=not args.no_cache, workers=args.workers, formats={'usgs': args.format}, backend=args.backend)
+    job.on_batch, job.on_retract = batch, retract
+    job.on_cached = lambda cached, gaps, synced: print(f"  > Catalog: {cached} cached quakes, {gaps} missing window(s){f', last sync: {time_param(synced)}' if synced else ''}")
+    job.on_planned = lambda windows, expected: print(f"  > Query plan: {expected} quakes in {windows} window(s)")
+    job.run()
+    if job.error: return f"Query error: {job.error}"
+
+    with job.timings.span('filter'):
+        filter = EventFilter(store) # exact region (polygons are queried by their bounding box), depth and location text
+        filter.set('region', region)
+        if args.mindepth is not None or args.maxdepth is not None: filter.set('depth', (-np.inf if args.mindepth is None else args.mindepth, np.inf if args.maxdepth is None else args.maxdepth))
+        filter.set('text', args.search)
+        rows = np.flatnonzero(filter.mask())
+    with job.timings.span('sort'): rows = rows[np.argsort(-store['time'][rows], kind='stable')] # latest first, like the GUI
+    try:
+        with job.timings.span('write', len(rows)): write(store, rows, args.out)
+    except (OSError, ValueError, RuntimeError) as err: return f"Export error: {err}"
+    job.timings.log('query', events=len(rows), received=job.received)
+    print(f"{len(rows)} quakes written to {args.out}\n  > Timings: {job.timings.summary()} ({job.timings.wall():.2f}s)")
+
+def formats(args): # bytes on the wire and parse throughput of every response format of a provider
+    provider = providers[args.provider]
+    end = args.end if args.end is not None else int(time() * 1000)
+    params = {'minmagnitude': f"{args.minmag:.1f}", 'maxmagnitude': f"{args.maxmag:.1f}"}
+    print(f"Formats: {provider.name}, min: {args.minmag:.1f} max: {args.maxmag:.1f} start: {time_param(args.start)} end: {time_param(end)}")
+    print(f"{'format':<8} {'backend':<8} {'events':>8} {'wire MB':>8} {'body MB':>8} {'download s':>10} {'parse s':>8} {'events/s':>10}")
+    failed = []
+    with api_session(args.workers) as session:
+        try:
+            if provider.counts:
+                with ThreadPoolExecutor(args.workers) as pool: windows = [window for window, count in QueryPlanner(session, RateLimiter(), provider.url).plan(params, args.start, end, pool)]
+            else: windows = [{**params, 'starttime': time_param(args.start), 'endtime': time_param(end)}]
+        except Exception as err: return f"Query error: {err}"
+        for format in provider.formats: # a failing format is reported on its line, the others are still compared
+            bodies, wire, started = [], 0, perf_counter()
+            try:
+                for window in windows: # whole responses are kept, so that parsing is timed without the network
+                    response = session.get(provider.url + "query", params=provider.query_params(window, format), stream=True, timeout=60)
+                    if response.status_code == 204: continue
+                    response.raise_for_status()
+                    bodies.append(list(response.iter_content(chunk_size=65536)))
+                    wire += response.raw.tell() or sum(len(chunk) for chunk in bodies[-1])
+            except Exception as err:
+                failed.append(format)
+                print(f"{format:<8} {'':<8} error: {err}")
+                continue
+            download, size = perf_counter() - started, sum(len(chunk) for body in bodies for chunk in body)
+            for backend in (json_backends if format == 'geojson' else ('',)):
+                store, started = EventStore(), perf_counter()
+                try:
+                    for body in bodies:
+                        records = []
+                        for record in provider.records(iter(body), format, backend or None):
+                            records.append(record)
+                            if len(records) >= 500:
+                                store.extend(records)
+                                records = []
+                        store.extend(records)
+                except Exception as err:
+                    failed.append(f"{format} ({backend})" if backend else format)
+                    print(f"{format:<8} {backend:<8} error: {err}")
+                    continue
+                parse = perf_counter() - started
+                print(f"{format:<8} {backend:<8} {len(store):>8} {wire / 1048576:>8.2f} {size / 1048576:>8.2f} {download:>10.2f} {parse:>8.2f} {len(store) / parse if parse else 0:>10.0f}")
+    if failed: return f"Query error: {', '.join(failed)} failed"
+
+def convert(args): # catalog file -> catalog file, any supported formats
+    try:
+        write = writer(args.out)
+        started = perf_counter()
+        store = read(args.source, EventStore())
+        loaded = perf_counter()
+        rows = np.flatnonzero(~store.removed[:len(store)])
+        write(store, rows, args.out)
+    except (OSError, ValueError, RuntimeError) as err: return f"Convert error: {err}"
+    print(f"{len(rows)} quakes converted: {args.source} ({loaded - started:.2f}s{', memory-mapped' if columnar(args.source) else ''}) -> {args.out} ({perf_counter() - loaded:.2f}s)")
+
+def rules(args): # list, add or remove watch rules
+    try: book = RuleBook().load()
+    except (ValueError, OSError) as err: return f"Rules error: {err}"
+    if args.action == 'add':
+        region = None
+        for kind in Region.kinds:
+            if getattr(args, kind) is not None:
+                try: region = Region.parse(kind, getattr(args, kind))
+                except ValueError as err: return f"Invalid {kind}: {err}"
+        book.rules[args.name] = WatchRule(args.name, region, args.minmag, args.alert, args.minsig)
+    elif args.action == 'remove':
+        if book.rules.pop(args.name, None) is None: return f"Rules error: no rule named '{args.name}'"
+    if args.action != 'list':
+        try: book.save()
+        except OSError as err: return f"Rules error: {err}"
+    for rule in book.rules.values(): print(rule)
+    if not book.rules: print(f"No watch rules in {book.path}")
+
+def watch(args): # polls a summary feed and prints the new events matching the watch rules
+    try: book = RuleBook().load()
+    except (ValueError, OSError) as err: return f"Rules error: {err}"
+    if not book.rules: return "No watch rules (add one with: python -m quakexplore rules add NAME ...)"
+    watcher = Watcher(book.rules.values())
+    poller = FeedPoller(feed(watcher.min_magnitude(), args.period))
+    print(f"Watching {len(watcher.rules)} rule(s): {poller.url} every {args.interval}s")
+    seed = not args.once # the quakes already in the feed are not reported, unless polling once
+    try:
+        while True:
+            try: changed, removed = poller.poll()
+            except Exception as err: print(f"Live feed: {err}", file=sys.stderr)
+            else:
+                watcher.forget(removed)
+                for rule, record in watcher.check(changed, seed): print(f"{rule.name}: {describe(record)}", flush=True)
+                seed = False
+            if args.once: break
+            sleep(args.interval)
+    except KeyboardInterrupt: pass
+    finally: poller.close()
+
+commands = {'query': query, 'formats': formats, 'convert': convert, 'rules': rules, 'watch': watch}
+
+def region_values(argv): # '--box -60,...' -> '--box=-60,...': argparse would take a value starting with '-' for an option
+    options, joined, args = {f'--{kind}' for kind in Region.kinds}, [], iter(argv)
+    for arg in args:
+        value = next(args, None) if arg in options else None
+        joined.append(arg if value is None else f"{arg}={value}")
+    return joined
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="quakexplore", description="Earthquake catalog queries without the GUI.")
+    parser.add_argument('--log', metavar="FILE", help="append the stage timings of every run to a file (JSON lines)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_query = subparsers.add_parser('query', help="query FDSN event services and write the events to a file")
+    parser_query.add_argument('--start', type=parse_date, required=True, help="start time, YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS (UTC)")
+    parser_query.add_argument('--end', type=parse_date, help="end time (default: now)")
+    parser_query.add_argument('--minmag', type=float, default=0.0, help="minimum magnitude (default: %(default)s)")
+    parser_query.add_argument('--maxmag', type=float, default=10.0, help="maximum magnitude (default: %(default)s)")
+    parser_query.add_argument('--mindepth', type=float, help="minimum depth in km")
+    parser_query.add_argument('--maxdepth', type=float, help="maximum depth in km")
+    parser_query.add_argument('--search', help="location text filter")
+    parser_query.add_argument('--providers', type=parse_providers, default=['usgs'], help=f"comma separated: {', '.join(providers)} (default: usgs)")
+    region = parser_query.add_mutually_exclusive_group()
+    for kind, syntax in Region.kinds.items(): region.add_argument(f'--{kind}', metavar="VALUES", help=f"region: '{syntax}', negative values included (e.g. --box -60,-10,160,-170)")
+    parser_query.add_argument('--workers', type=int, default=4, help="parallel requests (default: %(default)s)")
+    parser_query.add_argument('--no-cache', action='store_true', help="don't read or write the local event catalog")
+    parser_query.add_argument('--format', choices=providers['usgs'].formats, help="USGS response format (default: geojson)")
+    parser_query.add_argument('--backend', choices=json_backends, help=f"GeoJSON parser (default: {json_backends[0]})")
+    parser_query.add_argument('--out', required=True, help=f"output file ({', '.join(writers)})")
+
+    parser_formats = subparsers.add_parser('formats', help="compare the response formats of a provider: bytes on the wire and parse throughput")
+    parser_formats.add_argument('--start', type=parse_date, required=True, help="start time, YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS (UTC)")
+    parser_formats.add_argument('--end', type=parse_date, help="end time (default: now)")
+    parser_formats.add_argument('--minmag', type=float, default=0.0, help="minimum magnitude (default: %(default)s)")
+    parser_formats.add_argument('--maxmag', type=float, default=10.0, help="maximum magnitude (default: %(default)s)")
+    parser_formats.add_argument('--provider', choices=list(providers), default='usgs', help="(default: %(default)s)")
+    parser_formats.add_argument('--workers', type=int, default=4, help="parallel count requests (default: %(default)s)")
+
+    parser_convert = subparsers.add_parser('convert', help="convert a saved catalog to another file format")
+    parser_convert.add_argument('source', help=f"catalog file ({', '.join(writers)})")
+    parser_convert.add_argument('--out', required=True, help=f"output file ({', '.join(writers)})")
+
+    parser_rules = subparsers.add_parser('rules', help="list, add or remove watch rules")
+    parser_rules.add_argument('action', choices=('list', 'add', 'remove'))
+    parser_rules.add_argument('name', nargs='?', help="rule name (add, remove)")
+    region = parser_rules.add_mutually_exclusive_group()
+    for kind, syntax in Region.kinds.items(): region.add_argument(f'--{kind}', metavar="VALUES", help=f"region: '{syntax}', negative values included (default: anywhere)")
+    parser_rules.add_argument('--minmag', type=float, help="minimum magnitude")
+    parser_rules.add_argument('--alert', choices=alert_levels, help="minimum PAGER alert level")
+    parser_rules.add_argument('--minsig', type=int, help="minimum significance (with --alert: either one)")
+
+    parser_watch = subparsers.add_parser('watch', help="poll the USGS real-time feed and print the new quakes matching the watch rules")
+    parser_watch.add_argument('--period', choices=('hour', 'day', 'week', 'month'), default='hour', help="summary feed period (default: %(default)s)")
+    parser_watch.add_argument('--interval', type=float, default=60, help="seconds between polls (default: %(default)s)")
+    parser_watch.add_argument('--once', action='store_true', help="poll once, print the matching quakes of the feed and exit")
+
+    args = parser.parse_args(region_values(sys.argv[1:] if argv is None else argv))
+    if args.command == 'rules' and args.action != 'list' and not args.name: parser.error(f"rules {args.action}: a rule name is needed")
+    if args.log: logging.basicConfig(filename=args.log, format="%(message)s", level=logging.INFO)
+    error = commands[args.command](args)
+    if error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
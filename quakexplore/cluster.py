@@ -0,0 +1,109 @@
+import numpy as np
+
+from .geo import earth_radius
+
+day = 86400 # s
+cell_size = 0.25 # degrees of a space-time index cell
+
+def gk_distance(mag): return 10 ** (0.1238 * mag + 0.983) # km, Gardner & Knopoff (1974) windows
+
+def gk_time(mag): return np.where(mag >= 6.5, 10 ** (0.032 * mag + 2.7389), 10 ** (0.5409 * mag - 0.547)) * day # s
+
+def haversine(lat1, lon1, lat2, lon2): # km, vectorized
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * earth_radius * np.arcsin(np.sqrt(np.minimum(h, 1)))
+
+class SpaceTimeIndex: # events sorted by (grid cell, time): the events of a cell within a time range are one slice, found by binary search
+    def __init__(self, lat, lon, seconds):
+        self.rows, self.columns = int(180 / cell_size), int(360 / cell_size)
+        self.lat, self.lon, self.seconds = lat, lon, seconds
+        self.start, self.span = int(seconds.min()), int(seconds.max() - seconds.min()) + 1
+        self.cell_rows = np.clip(np.floor((lat + 90) / cell_size).astype(np.int64), 0, self.rows - 1)
+        self.cell_columns = np.clip(np.floor((lon + 180) / cell_size).astype(np.int64), 0, self.columns - 1)
+        keys = self.key(self.cell_rows * self.columns + self.cell_columns, seconds)
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+
+    def key(self, cells, seconds): return cells * self.span + np.clip(seconds - self.start, 0, self.span - 1)
+
+    def pairs(self, events, km, seconds): # (event, other) pairs: other within km and +-seconds of event, for each event of the array
+        owners, others = [], []
+        reach_rows = np.ceil(km / (earth_radius * np.radians(cell_size))).astype(np.int64)
+        reach_columns = np.minimum(np.ceil(reach_rows / np.maximum(np.cos(np.radians(np.minimum(np.abs(self.lat[events]) + reach_rows * cell_size, 89.9))), 1e-3)).astype(np.int64), self.columns // 2)
+        for rr, rc in set(zip(reach_rows.tolist(), reach_columns.tolist())): # events needing the same block of cells are searched together
+            group = (reach_rows == rr) & (reach_columns == rc)
+            ids, window = events[group], seconds[group]
+            dy, dx = (offsets.ravel() for offsets in np.meshgrid(np.arange(-rr, rr + 1), np.arange(-rc, rc + 1), indexing='ij'))
+            rows = self.cell_rows[ids][:, None] + dy
+            cells = rows * self.columns + (self.cell_columns[ids][:, None] + dx) % self.columns
+            valid = (rows >= 0) & (rows < self.rows)
+            starts = np.searchsorted(self.keys, self.key(cells, (self.seconds[ids] - window)[:, None]), 'left')
+            ends = np.searchsorted(self.keys, self.key(cells, (self.seconds[ids] + window)[:, None]), 'right')
+            counts = np.where(valid, ends - starts, 0).ravel()
+            owner = np.repeat(np.repeat(ids, len(dy)), counts)
+            first = np.repeat(starts.ravel() - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+            owners.append(owner)
+            others.append(self.order[first + np.arange(counts.sum())])
+        owner, other = np.concatenate(owners + [np.empty(0, np.int64)]), np.concatenate(others + [np.empty(0, np.int64)])
+        near = (owner != other) & (haversine(self.lat[owner], self.lon[owner], self.lat[other], self.lon[other]) <= km[np.searchsorted(events, owner)])
+        return owner[near], other[near]
+
+def gardner_knopoff(lat, lon, time, mag, chunk=20000): # mainshock index of every event (its own index when it is not in a larger event's window)
+    size = len(lat)
+    mainshock = np.arange(size)
+    if size < 2: return mainshock
+    mag = np.nan_to_num(np.asarray(mag, np.float64), nan=-10)
+    index = SpaceTimeIndex(np.asarray(lat, np.float64), np.asarray(lon, np.float64), np.asarray(time, np.int64) // 1000)
+    owners, others = [], []
+    for start in range(0, size, chunk): # foreshocks and aftershocks: +-window around every event, found through the index
+        events = np.arange(start, min(start + chunk, size))
+        owner, other = index.pairs(events, gk_distance(mag[events]), gk_time(mag[events]))
+        owners.append(owner)
+        others.append(other)
+    owner, other = np.concatenate(owners), np.concatenate(others)
+    rank = np.empty(size, np.int64)
+    rank[np.lexsort((time, -mag))] = np.arange(size) # largest magnitude first, earliest among equals
+    order = np.argsort(rank[owner], kind='stable')
+    owner, other = owner[order], other[order]
+    heads, starts = np.unique(rank[owner], return_index=True)
+    ends = np.append(starts[1:], len(owner))
+    clustered = np.zeros(size, bool)
+    for start, end in zip(starts.tolist(), ends.tolist()): # windows of larger events first: an event joins the first sequence reaching it
+        head = owner[start]
+        if clustered[head]: continue
+        members = other[start:end]
+        members = members[~clustered[members]]
+        if not len(members): continue
+        mainshock[members] = head
+        clustered[members] = clustered[head] = True
+    return mainshock
+
+class Sequences: # sequences of the store events (an EventStore, or a StoreSnapshot off the GUI thread): mainshock row of every row (its own row for mainshocks and isolated events)
+    def __init__(self, store):
+        self.state = (len(store), store.revision)
+        size = len(store)
+        rows = np.flatnonzero(~store.removed[:size])
+        self.mainshock = np.arange(size)
+        if len(rows): self.mainshock[rows] = rows[gardner_knopoff(store['lat'][rows], store['lon'][rows], store['time'][rows], store['mag'][rows])]
+        self.size = np.bincount(self.mainshock, minlength=size) # members of the sequence led by a row, the mainshock included
+        self.order = np.argsort(self.mainshock, kind='stable') # rows grouped by sequence, in row order
+        self.starts = np.concatenate(([0], np.cumsum(self.size)[:-1]))
+
+    def __len__(self): return len(self.mainshock)
+
+    def head(self, row): return int(self.mainshock[row]) if row < len(self.mainshock) else row # rows added after the clustering are isolated
+
+    def members(self, row): # rows of the sequence of a row, the mainshock included
+        head = self.head(row)
+        if head >= len(self.mainshock): return np.array([head])
+        return self.order[self.starts[head]:self.starts[head] + self.size[head]]
+
+    def count(self): return int(np.count_nonzero(self.size > 1))
+
+    def describe(self, store, row): # role of a row in its sequence: (role, mainshock row, members, foreshocks, days spanned, farthest km)
+        members, head = self.members(row), self.head(row)
+        times = store['time'][members]
+        km = haversine(store['lat'][head], store['lon'][head], store['lat'][members], store['lon'][members])
+        role = 'isolated' if len(members) == 1 else 'mainshock' if row == head else 'foreshock' if store['time'][row] < store['time'][head] else 'aftershock'
+        return role, head, len(members), int(np.count_nonzero(times < store['time'][head])), float(times.max() - times.min()) / 86400000, float(km.max())
@@ -0,0 +1,151 @@
+import calendar
+from math import ceil, degrees
+from threading import Lock
+from time import strftime, gmtime, monotonic, sleep
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .geo import earth_radius
+from .store import feature_record
+from .formats import readers
+
+api_url = "https://earthquake.usgs.gov/fdsnws/event/1/"
+feed_url = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/"
+feed_levels = ((4.5, "4.5"), (2.5, "2.5"), (1.0, "1.0"), (0.0, "all")) # summary feeds by minimum magnitude
+
+
+def day_ms(year, month, day): # calendar day -> epoch milliseconds (UTC midnight)
+    return calendar.timegm((year, month, day, 0, 0, 0)) * 1000
+
+def time_param(ms): # epoch milliseconds -> FDSN time parameter
+    return f"{strftime('%Y-%m-%dT%H:%M:%S', gmtime(ms // 1000))}.{ms % 1000:03d}"
+
+def api_session(workers=4): # shared session: pooled connections, retries with backoff (honors Retry-After)
+    retry = Retry(total=5, connect=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+    session = Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+class RateLimiter: # spaces out request starts across threads
+    def __init__(self, rate=5.0):
+        self.interval = 1 / rate
+        self.lock = Lock()
+        self.next = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = monotonic()
+            delay = self.next - now
+            self.next = max(now, self.next) + self.interval
+        if delay > 0: sleep(delay)
+
+class QueryPlanner: # splits a query into windows under the service limit using the count endpoint
+    def __init__(self, session, limiter, url, limit=20000):
+        self.session = session
+        self.limiter = limiter
+        self.url = url
+        self.limit = limit
+
+    def count(self, params, start, end):
+        self.limiter.wait()
+        response = self.session.get(self.url + "count", params={**params, 'format': 'geojson', 'starttime': time_param(start), 'endtime': time_param(end)}, timeout=30)
+        response.raise_for_status()
+        count = response.json()
+        self.limit = min(self.limit, int(count.get('maxAllowed', self.limit)))
+        return int(count['count'])
+
+    def plan(self, params, start, end, pool): # -> [(window params, expected count)], counted level by level in parallel
+        windows, plan = [(start, end)], []
+        while windows:
+            split = []
+            for (s, e), n in zip(windows, pool.map(lambda window: self.count(params, *window), windows)):
+                if not n: continue
+                window = {**params, 'starttime': time_param(s), 'endtime': time_param(e)}
+                if n <= self.limit: plan.append((window, n))
+                elif e - s > 1000: # even split sized for ~80% of the limit, so one level is usually enough
+                    parts = ceil(n / (self.limit * 0.8))
+                    split += [(s + (e - s) * k // parts, s + (e - s) * (k + 1) // parts) for k in range(parts)]
+                else: plan += [({**window, 'offset': offset, 'limit': self.limit}, min(self.limit, n - offset + 1)) for offset in range(1, n + 1, self.limit)]
+            windows = split
+        return plan
+
+def feed(min_mag, period): # summary feed of a period (hour, day, week, month) holding every event at or above min_mag
+    level = next(name for value, name in feed_levels if min_mag >= value)
+    return f"{feed_url}{level}_{period}.geojson"
+
+class FeedPoller: # polls a real-time summary feed with conditional requests and returns only the changes
+    def __init__(self, url):
+        self.url = url
+        self.session = None # created by the polling thread
+        self.response = None # in flight
+        self.stopped = False
+        self.etag = self.modified = None
+        self.known = {} # id -> updated of the last snapshot
+
+    def poll(self): # -> (new or updated records, removed ids); raises on network errors
+        if self.session is None: self.session = api_session(1)
+        headers = {}
+        if self.etag: headers['If-None-Match'] = self.etag
+        if self.modified: headers['If-Modified-Since'] = self.modified
+        self.response = response = self.session.get(self.url, headers=headers, timeout=30, stream=True)
+        try:
+            if response.status_code == 304 or self.stopped: return [], [] # feed unchanged, nothing was downloaded
+            response.raise_for_status()
+            records = [feature_record(feature) for feature in response.json()['features']]
+        finally:
+            self.response = None
+            response.close()
+        self.etag, self.modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        changed = [record for record in records if self.known.get(record[0]) != record[2]]
+        current = {record[0]: record[2] for record in records}
+        removed = [id for id in self.known if id not in current]
+        self.known = current
+        return changed, removed
+
+    def stop(self): # may be called from any thread: closes the response in flight
+        self.stopped = True
+        response = self.response
+        if response is not None:
+            try: response.close()
+            except Exception: pass
+
+    def close(self):
+        if self.session is not None: self.session.close()
+
+# |------------------------------------|
+# |----- PROVIDERS --------------------|
+# |------------------------------------|
+
+page_size = 20000 # events per request of the providers without a count endpoint, paged with offset
+
+class Provider: # FDSN event web service of an agency
+    def __init__(self, key, name, url, formats, event_page, counts=False):
+        self.key = key
+        self.name = name
+        self.url = url
+        self.formats = formats # response formats it serves, default first
+        self.event_page = event_page
+        self.counts = counts # supports the count endpoint (query planning)
+
+    def query_params(self, params, format=None):
+        params = {**params, 'format': format or self.formats[0], 'orderby': 'time', **({} if self.counts else {'limit': page_size})}
+        if 'maxradiuskm' in params and self.key != 'usgs': params['maxradius'] = degrees(params.pop('maxradiuskm') / earth_radius) # FDSN radius is in degrees
+        return params
+
+    def windows(self, params): # one request, or two for a box across the antimeridian (longitudes past 180 are a USGS extension)
+        if self.key == 'usgs' or float(params.get('maxlongitude', 0)) <= 180: return [params]
+        return [{**params, 'maxlongitude': 180.0}, {**params, 'minlongitude': -180.0, 'maxlongitude': float(params['maxlongitude']) - 360}]
+
+    def records(self, chunks, format=None, backend=None): # byte chunks of a query response -> event records
+        return readers[format or self.formats[0]](chunks, self.key, backend)
+
+providers = {
+    'usgs': Provider('usgs', "USGS", api_url, ('geojson', 'csv', 'text'), "https://earthquake.usgs.gov/earthquakes/eventpage/{}", counts=True),
+    'emsc': Provider('emsc', "EMSC", "https://www.seismicportal.eu/fdsnws/event/1/", ('text',), "https://www.seismicportal.eu/eventdetails.html?unid={}"),
+    'geofon': Provider('geofon', "GEOFON", "https://geofon.gfz-potsdam.de/fdsnws/event/1/", ('text',), "https://geofon.gfz-potsdam.de/eqinfo/event.php?id={}"),
+}
+provider_rank = {key: rank for rank, key in enumerate(providers)} # preferred solution of an associated event
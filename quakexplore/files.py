@@ -0,0 +1,181 @@
+import os
+import csv
+import json
+
+import numpy as np
+
+from .store import event_fields, numeric_fields, category_fields, event_page
+from .formats import parse_time, decode_chunks, stream_lines, csv_records, readers, orjson
+
+chunk_size = 50000 # rows per written chunk
+batch_rows = 1 << 20 # rows per Arrow record batch: catalogs up to a million events are one batch, read back without copies
+names = [name for name, dtype in event_fields]
+missing = {name: np.nan if np.issubdtype(dtype, np.floating) else -1 for name, dtype in numeric_fields} # store sentinels of None
+
+
+# |----- writing -----|
+
+def chunks(rows):
+    rows = np.asarray(rows, np.int64)
+    for start in range(0, len(rows), chunk_size): yield rows[start:start + chunk_size]
+
+def text_column(store, name, rows, pools): # column of a chunk as strings ('' for missing values)
+    if name == 'id': return [store.ids[i] for i in rows]
+    if name in store.codes: return pools[name][store.codes[name][rows]]
+    values = store.arrays[name][rows]
+    if name in ('time', 'updated'): return np.char.add(values.astype('datetime64[ms]').astype(str), 'Z')
+    text = values.astype(str) # shortest repr of the column type: 3.8, not 3.799999952316284
+    text[np.isnan(values) if np.issubdtype(values.dtype, np.floating) else values == -1 if name in ('felt', 'nst') else False] = ''
+    return text
+
+def value_column(store, name, rows, pools): # column of a chunk as Python values (None for missing values)
+    if name in store.codes: return pools[name][store.codes[name][rows]].tolist()
+    values = store.arrays[name][rows]
+    column = (values.astype(str).astype(np.float64) if values.dtype == np.float32 else values).astype(object)
+    column[np.isnan(values) if np.issubdtype(values.dtype, np.floating) else values == -1 if name in ('felt', 'nst') else False] = None
+    return column.tolist()
+
+def write_csv(store, rows, path): # one line per event, event_fields columns (times in ISO 8601 UTC)
+    pools = {name: np.array(['' if value is None else value for value in store.pools[name]], object) for name in category_fields}
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(names)
+        for chunk in chunks(rows): writer.writerows(zip(*(list(text_column(store, name, chunk, pools)) for name in names)))
+
+def write_geojson(store, rows, path): # FeatureCollection shaped like the USGS summary
+    pools = {name: np.array(store.pools[name], object) for name in category_fields}
+    properties = [name for name in names if name not in ('id', 'lon', 'lat', 'depth')]
+    dumps = orjson.dumps if orjson is not None else lambda value: json.dumps(value, separators=(',', ':')).encode()
+    with open(path, 'wb') as file:
+        file.write(b'{"type":"FeatureCollection","metadata":{"count":%d},"features":[' % len(rows))
+        separator = b''
+        for chunk in chunks(rows):
+            columns = {name: value_column(store, name, chunk, pools) for name in names if name != 'id'}
+            for n, i in enumerate(chunk):
+                props = {name: columns[name][n] for name in properties}
+                props['source'] = props['source'] or 'usgs'
+                props['url'] = event_page(props['source'].split('+')[0], store.ids[i])
+                props['ids'] = props['ids'] or f",{store.ids[i]},"
+                feature = {'type': 'Feature', 'properties': props, 'geometry': {'type': 'Point', 'coordinates': [columns['lon'][n], columns['lat'][n], columns['depth'][n]]}, 'id': store.ids[i]}
+                file.write(separator + dumps(feature))
+                separator = b','
+        file.write(b']}')
+
+def arrow(): # pyarrow is optional
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError: raise RuntimeError("Parquet and Arrow files need pyarrow (pip install pyarrow)") from None
+    return pa, pc, pq
+
+def record_batch(pa, store, rows, pools, nulls): # nulls: missing values as nulls (Parquet) or as the store sentinels (Arrow, read back without copies)
+    columns = [pa.array([store.ids[i] for i in rows], pa.string())]
+    for name, dtype in event_fields[1:]:
+        values = store[name][rows]
+        if dtype is str and nulls: # Parquet stores the dictionary of every row group: only the values used by the chunk
+            used, values = np.unique(values, return_inverse=True)
+            columns.append(pa.DictionaryArray.from_arrays(pa.array(values.astype(np.int32), mask=used[values] == 0), pools[name].take(used)))
+        elif dtype is str: columns.append(pa.DictionaryArray.from_arrays(pa.array(values), pools[name]))
+        elif name in ('time', 'updated'): columns.append(pa.array(values, pa.timestamp('ms', tz='UTC')))
+        elif not nulls: columns.append(pa.array(values))
+        elif np.issubdtype(dtype, np.floating): columns.append(pa.array(values, mask=np.isnan(values)))
+        else: columns.append(pa.array(values, mask=(values == -1) if name in ('felt', 'nst') else None))
+    return pa.RecordBatch.from_arrays(columns, names=names)
+
+def write_table(store, rows, path, parquet):
+    pa, pc, pq = arrow()
+    pools = {name: pa.array(["" if value is None else value for value in store.pools[name]], pa.string()) for name in category_fields} # code 0 (None) is masked or ""
+    rows, size = np.asarray(rows, np.int64), chunk_size if parquet else batch_rows
+    writer = None
+    try:
+        for start in range(0, max(len(rows), 1), size):
+            batch = record_batch(pa, store, rows[start:start + size], pools, nulls=parquet)
+            if not parquet: batch = batch.replace_schema_metadata({'quakexplore': 'events'}) # dictionaries are the store pools
+            if writer is None: writer = pq.ParquetWriter(path, batch.schema) if parquet else pa.ipc.new_file(path, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None: writer.close()
+
+def write_parquet(store, rows, path): write_table(store, rows, path, parquet=True)
+
+def write_arrow(store, rows, path): write_table(store, rows, path, parquet=False)
+
+writers = {'.csv': write_csv, '.geojson': write_geojson, '.json': write_geojson, '.parquet': write_parquet, '.arrow': write_arrow, '.feather': write_arrow}
+
+def writer(path): # format by file extension
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in writers: raise ValueError(f"unknown file format '{extension}' (use {', '.join(writers)})")
+    return writers[extension]
+
+def write(store, rows, path): writer(path)(store, rows, path)
+
+
+# |----- reading -----|
+
+def columnar(path): return os.path.splitext(path)[1].lower() in ('.parquet', '.arrow', '.feather')
+
+def file_chunks(path, size=1 << 20):
+    with open(path, 'rb') as file: yield from iter(lambda: file.read(size), b'')
+
+def table_records(lines): # CSV written by write_csv
+    rows = csv.reader(lines)
+    columns = {name: i for i, name in enumerate(next(rows, ()))}
+    converters = [(columns.get(name, -1), parse_time if name in ('time', 'updated') else str if dtype is str else float if np.issubdtype(dtype, np.floating) else int) for name, dtype in event_fields]
+    for values in rows:
+        if not values: continue
+        record = [convert(values[i]) if 0 <= i < len(values) and values[i] != '' else None for i, convert in converters]
+        record[2] = record[2] or record[1]
+        yield tuple(record)
+
+def read_records(path): # csv (written by write_csv or the USGS service) and GeoJSON files -> event records, streamed
+    if os.path.splitext(path)[1].lower() in ('.geojson', '.json'): return readers['geojson'](file_chunks(path), 'usgs')
+    lines = stream_lines(decode_chunks(file_chunks(path)))
+    header = next(lines, "")
+    lines = (line for part in ([header], lines) for line in part)
+    return csv_records(lines, 'usgs') if 'latitude' in header.split(',') else table_records(lines)
+
+def read_batches(path, size=5000):
+    batch = []
+    for record in read_records(path):
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch: yield batch
+
+def read_columns(path): # Parquet or Arrow file -> (ids, arrays, codes, pools) for EventStore.load_columns
+    pa, pc, pq = arrow()
+    if os.path.splitext(path)[1].lower() == '.parquet': table = pq.read_table(path, memory_map=True)
+    else: table = pa.ipc.open_file(pa.memory_map(path)).read_all() # memory-mapped: columns point into the file
+    own = (table.schema.metadata or {}).get(b'quakexplore') == b'events' # written by write_arrow: store layout, no nulls
+    table = table.unify_dictionaries()
+    single = lambda column: column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    ids = table.column('id').to_pylist()
+    arrays, codes, pools = {}, {}, {}
+    for name, dtype in numeric_fields:
+        if name not in table.column_names:
+            arrays[name] = np.full(len(ids), missing[name], dtype)
+            continue
+        column = table.column(name)
+        if pa.types.is_timestamp(column.type): column = column.cast(pa.timestamp('ms')).cast(pa.int64())
+        if column.null_count: column = column.fill_null(missing[name])
+        arrays[name] = single(column).to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+    for name in category_fields:
+        if name not in table.column_names:
+            codes[name], pools[name] = np.zeros(len(ids), np.int32), [None]
+            continue
+        column = table.column(name)
+        column = single(column if pa.types.is_dictionary(column.type) else column.dictionary_encode())
+        dictionary = column.dictionary.to_pylist()
+        if own: pools[name], indices = [None] + dictionary[1:], column.indices
+        else: pools[name], indices = [None] + dictionary, pc.add(column.indices, 1)
+        codes[name] = indices.fill_null(0).to_numpy(zero_copy_only=False).astype(np.int32, copy=False)
+    return ids, arrays, codes, pools
+
+def read(path, store): # fills the store from a catalog file (any written format)
+    if columnar(path): store.load_columns(*read_columns(path))
+    else:
+        store.clear()
+        for batch in read_batches(path): store.extend(batch)
+    return store
@@ -0,0 +1,135 @@
+import re
+import csv
+import json
+import codecs
+import calendar
+
+try: import orjson # optional fast JSON backend
+except ImportError: orjson = None
+
+from .store import feature_record
+
+json_backends = ('orjson', 'json') if orjson is not None else ('json',) # preferred first
+
+
+def parse_time(text): # ISO 8601 UTC time -> epoch milliseconds
+    seconds = calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]), int(text[11:13]), int(text[14:16]), int(text[17:19])))
+    fraction = text[20:].rstrip('Z')
+    return seconds * 1000 + (int((fraction + "00")[:3]) if fraction else 0)
+
+def decode_chunks(chunks): # utf-8 byte chunks -> text chunks (characters may straddle chunks)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks: yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+def stream_lines(chunks): # text chunks -> lines
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        yield from lines
+    if rest: yield rest
+
+# |----- GeoJSON -----|
+
+skip_separators = re.compile(r'[\s,]*')
+
+def stream_geojson(chunks, metadata=None): # incremental FeatureCollection parser: yields features as soon as they are complete
+    decoder = json.JSONDecoder()
+    buffer, pos, in_features = "", 0, False
+    for chunk in chunks:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        if not in_features:
+            if metadata is not None and not metadata and (key := buffer.find('"metadata":')) != -1:
+                try: metadata.update(decoder.raw_decode(buffer, skip_separators.match(buffer, key + 11).end())[0])
+                except json.JSONDecodeError: continue # metadata not complete yet
+            if (key := buffer.find('"features":')) == -1 or (pos := buffer.find('[', key)) == -1:
+                pos = 0
+                continue
+            pos += 1
+            in_features = True
+        while True:
+            pos = skip_separators.match(buffer, pos).end()
+            if pos >= len(buffer): break
+            if buffer[pos] == ']': return
+            try: feature, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError: break # feature not complete yet
+            pos = end
+            yield feature
+    if in_features: raise ValueError("Incomplete GeoJSON response")
+
+feature_separator = b',{"type":"Feature"'
+
+def stream_geojson_fast(chunks): # orjson backend on the raw bytes: compact FeatureCollections (USGS) are cut at the separators between features
+    buffer, start, search = b"", None, 0
+    for chunk in chunks:
+        buffer += chunk
+        if start is None:
+            if (key := buffer.find(b'"features":')) == -1 or (key := buffer.find(b'[', key)) == -1: continue
+            start = search = key + 1
+        while (end := buffer.find(feature_separator, search)) != -1:
+            search = end + 1
+            try: feature = orjson.loads(buffer[start:end])
+            except orjson.JSONDecodeError: continue # the separator was inside a string value
+            start = end + 1
+            yield feature
+        buffer, search, start = buffer[start:], search - start, 0
+    if start is None: return
+    yield from stream_geojson(['{"features":[', buffer.decode('utf-8')]) # last feature (or every feature of an indented document)
+
+# |----- delimited text -----|
+
+def magnitude_sig(mag): # magnitude part of the USGS significance (text formats have no sig)
+    return int(mag * 100 * mag / 6.5) if mag and mag > 0 else 0
+
+def text_records(lines, source): # FDSN text format (#EventID|Time|Latitude|Longitude|Depth/km|Author|Catalog|Contributor|ContributorID|MagType|Magnitude|MagAuthor|EventLocationName|EventType)
+    columns = None
+    for line in lines:
+        line = line.rstrip("\r")
+        if not line.strip(): continue
+        if line.startswith('#'):
+            columns = {name.strip().lower(): i for i, name in enumerate(line[1:].split('|'))}
+            continue
+        values = [value.strip() or None for value in line.split('|')]
+        value = lambda name: values[columns[name]] if columns.get(name, len(values)) < len(values) else None
+        t, mag, depth = parse_time(value('time')), value('magnitude'), value('depth/km')
+        mag = float(mag) if mag else None
+        place = value('eventlocationname')
+        yield (
+            value('eventid'), t, t, mag, float(depth) if depth else None,
+            float(value('longitude')), float(value('latitude')), magnitude_sig(mag), None, None, None,
+            None, None, None, None,
+            place.title() if place and place.isupper() else place, (value('contributor') or source).lower(), None, None, value('magtype'), (value('eventtype') or "earthquake").lower(), None, source
+        )
+
+csv_columns = ('id', 'time', 'updated', 'mag', 'depth', 'longitude', 'latitude', 'nst', 'dmin', 'rms', 'gap', 'place', 'net', 'status', 'magType', 'type')
+
+def csv_records(lines, source): # USGS CSV format (time,latitude,longitude,depth,mag,magType,nst,gap,dmin,rms,net,id,updated,place,type,...,status,...)
+    rows = csv.reader(lines)
+    columns = {name: i for i, name in enumerate(next(rows, ()))}
+    positions = [columns.get(name, -1) for name in csv_columns]
+    number = lambda value, cast: cast(value) if value else None
+    for values in rows:
+        if not values: continue
+        id, t, updated, mag, depth, lon, lat, nst, dmin, rms, gap, place, net, status, mag_type, type = ((values[i] or None) if 0 <= i < len(values) else None for i in positions)
+        t, mag = parse_time(t), number(mag, float)
+        yield (
+            id, t, parse_time(updated) if updated else t, mag, number(depth, float),
+            float(lon), float(lat), magnitude_sig(mag), None, None, None,
+            number(nst, int), number(dmin, float), number(rms, float), number(gap, float),
+            place, net, status, None, mag_type, type, None, source
+        )
+
+# |----- readers: byte chunks of a response -> event records -----|
+
+def read_geojson(chunks, source, backend=None):
+    backend = backend or json_backends[0]
+    features = stream_geojson_fast(chunks) if backend == 'orjson' else stream_geojson(decode_chunks(chunks))
+    return (feature_record(feature) for feature in features)
+
+def read_csv(chunks, source, backend=None): return csv_records(stream_lines(decode_chunks(chunks)), source)
+
+def read_text(chunks, source, backend=None): return text_records(stream_lines(decode_chunks(chunks)), source)
+
+readers = {'geojson': read_geojson, 'csv': read_csv, 'text': read_text}
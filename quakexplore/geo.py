@@ -0,0 +1,114 @@
+from math import radians, degrees, sin, cos, asin, sqrt
+
+import numpy as np
+
+
+earth_radius = 6371.0 # km
+
+def lon_ranges(a, b): # longitude interval (may exceed +-180) -> ranges within [-180, 180]
+    if b - a >= 360: return [(-180.0, 180.0)]
+    a, b = (a + 180) % 360 - 180, (a + 180) % 360 - 180 + (b - a)
+    return [(a, b)] if b <= 180 else [(a, 180.0), (-180.0, b - 360)]
+
+class Region: # spatial selection: box, radius or polygon; longitudes may cross the antimeridian
+    kinds = {'box': "min lat, max lat, min lon, max lon", 'radius': "lat, lon, radius km", 'polygon': "lat lon; lat lon; lat lon; ..."}
+
+    def __init__(self, kind, values):
+        self.kind = kind
+        self.values = values
+        if kind == 'polygon': # unwrap longitudes so that edges crossing the antimeridian stay continuous
+            lats, lons = np.array([lat for lat, lon in values], float), [values[0][1]]
+            for lat, lon in values[1:]: lons.append(lons[-1] + (lon - lons[-1] + 180) % 360 - 180)
+            self.lats, self.lons = lats, np.array(lons, float)
+
+    @classmethod
+    def parse(cls, kind, text): # raises ValueError on malformed input
+        if kind == 'polygon':
+            values = [tuple(float(value) for value in vertex.replace(',', ' ').split()) for vertex in text.split(';') if vertex.strip()]
+            if len(values) < 3 or any(len(vertex) != 2 for vertex in values): raise ValueError("a polygon needs at least 3 'lat lon' vertices")
+        else:
+            values = tuple(float(value) for value in text.replace(';', ',').split(','))
+            if len(values) != (4 if kind == 'box' else 3): raise ValueError(f"expected: {cls.kinds[kind]}")
+            if kind == 'box' and values[0] > values[1]: raise ValueError("min lat > max lat")
+        return cls(kind, values)
+
+    def __str__(self):
+        if self.kind == 'polygon': return f"polygon ({len(self.values)} vertices)"
+        return f"{self.kind} ({', '.join(f'{value:g}' for value in self.values)})"
+
+    def text(self): # values in the syntax of parse
+        if self.kind == 'polygon': return "; ".join(f"{lat:g} {lon:g}" for lat, lon in self.values)
+        return ", ".join(f"{value:g}" for value in self.values)
+
+    def bounds(self): # -> (min lat, max lat, longitude ranges)
+        if self.kind == 'box':
+            min_lat, max_lat, min_lon, max_lon = self.values
+            return min_lat, max_lat, lon_ranges(min_lon, max_lon if max_lon >= min_lon else max_lon + 360)
+        if self.kind == 'radius':
+            lat, lon, km = self.values
+            dlat = degrees(km / earth_radius)
+            if abs(lat) + dlat >= 90 or km >= earth_radius * np.pi / 2: return max(lat - dlat, -90), min(lat + dlat, 90), [(-180.0, 180.0)]
+            dlon = degrees(asin(sin(km / earth_radius) / cos(radians(lat))))
+            return lat - dlat, lat + dlat, lon_ranges(lon - dlon, lon + dlon)
+        return float(self.lats.min()), float(self.lats.max()), lon_ranges(float(self.lons.min()), float(self.lons.max()))
+
+    def params(self): # server-side FDSN parameters (polygons are queried by their bounding box)
+        if self.kind == 'radius': return {'latitude': self.values[0], 'longitude': self.values[1], 'maxradiuskm': self.values[2]}
+        min_lat, max_lat, ranges = self.bounds()
+        min_lon, max_lon = ranges[0][0], ranges[-1][1] + (360 if len(ranges) > 1 else 0) # USGS accepts longitudes up to 360
+        return {'minlatitude': min_lat, 'maxlatitude': max_lat, 'minlongitude': min_lon, 'maxlongitude': max_lon}
+
+    def contains(self, lat, lon): # vectorized exact test
+        if self.kind == 'box':
+            min_lat, max_lat, ranges = self.bounds()
+            inside = np.zeros(len(lat), bool)
+            for a, b in ranges: inside |= (lon >= a) & (lon <= b)
+            return inside & (lat >= min_lat) & (lat <= max_lat)
+        if self.kind == 'radius':
+            lat0, lon0, km = np.radians(self.values[0]), np.radians(self.values[1]), self.values[2]
+            lat, lon = np.radians(lat), np.radians(lon)
+            h = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2
+            return 2 * earth_radius * np.arcsin(np.sqrt(np.minimum(h, 1))) <= km
+        lon = (lon - self.lons.min()) % 360 + self.lons.min() # into the unwrapped frame of the polygon
+        inside = np.zeros(len(lat), bool)
+        for i in range(len(self.lats)): # ray casting, one edge at a time over all points
+            lat1, lon1, lat2, lon2 = self.lats[i - 1], self.lons[i - 1], self.lats[i], self.lons[i]
+            if lat1 == lat2: continue
+            crosses = (lat1 > lat) != (lat2 > lat)
+            inside ^= crosses & (lon < (lon2 - lon1) * (lat - lat1) / (lat2 - lat1) + lon1)
+        return inside
+
+def grid_cells(lat, lon): # 1 degree grid cell ids, row-major from the south pole (a latitude band is a contiguous id range)
+    return (np.clip(np.floor(lat), -90, 89).astype(np.int64) + 90) * 360 + np.clip(np.floor(lon), -180, 179).astype(np.int64) + 180
+
+class GeoIndex: # grid index over the store coordinates: rows sorted by cell, looked up by binary search
+    def __init__(self, store):
+        self.store = store
+        self.state = None
+        self.order = self.cells = np.empty(0, np.int64)
+
+    def update(self): # rebuilt lazily when the store changed
+        if self.state == (len(self.store), self.store.revision): return
+        cells = grid_cells(self.store['lat'], self.store['lon'])
+        self.order = np.argsort(cells, kind='stable')
+        self.cells = cells[self.order]
+        self.state = (len(self.store), self.store.revision)
+
+    def candidates(self, min_lat, max_lat, ranges): # rows in the grid cells overlapping the bounds
+        self.update()
+        bands = np.arange(int(np.clip(np.floor(min_lat), -90, 89)) + 90, int(np.clip(np.floor(max_lat), -90, 89)) + 91)
+        if not len(bands): return np.empty(0, np.int64)
+        if ranges == [(-180.0, 180.0)]: lows, highs = bands[:1] * 360, bands[-1:] * 360 + 359 # whole latitude band
+        else:
+            lows = np.concatenate([bands * 360 + int(np.clip(np.floor(a), -180, 179)) + 180 for a, b in ranges])
+            highs = np.concatenate([bands * 360 + int(np.clip(np.floor(b), -180, 179)) + 180 for a, b in ranges])
+        starts, ends = np.searchsorted(self.cells, lows, 'left'), np.searchsorted(self.cells, highs, 'right')
+        return np.concatenate([self.order[start:end] for start, end in zip(starts, ends)] + [np.empty(0, np.int64)])
+
+    def query(self, region): # store rows inside the region
+        rows = self.candidates(*region.bounds())
+        return rows[region.contains(self.store['lat'][rows], self.store['lon'][rows])]
+
+def distance_km(lat1, lon1, lat2, lon2): # great-circle distance (haversine)
+    lat1, lon1, lat2, lon2 = map(radians, (lat1, lon1, lat2, lon2))
+    return 12742.0 * asin(sqrt(sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2))
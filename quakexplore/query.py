@@ -0,0 +1,199 @@
+import sqlite3
+from queue import SimpleQueue
+from threading import Lock, Thread
+from time import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .fdsn import api_session, time_param, RateLimiter, QueryPlanner, providers, page_size
+from .catalog import EventCatalog
+from .associate import Associator
+from .timing import Timings
+
+
+class Query: # lists cached events, then plans the missing windows and streams every provider in parallel
+    def __init__(self, params, start, end, providers=('usgs',), region=None, catalog_path=None, cache=True, workers=4, batch_size=500, formats=None, backend=None, timings=None):
+        self.params = params
+        self.start, self.end = start, end
+        self.providers = providers
+        self.region = region
+        self.catalog_path = catalog_path
+        self.cache = cache
+        self.formats = formats or {} # provider -> response format (default: the provider's first)
+        self.backend = backend # JSON backend of GeoJSON responses (default: the fastest available)
+        self.catalog = None
+        self.writes = self.writer = None # batches queued for the cache writer thread
+        self.cache_error = None
+        self.associator = Associator() if len(providers) > 1 else None
+        self.workers = workers
+        self.batch_size = batch_size
+        self.cancelled = self.stopped = False
+        self.error = None
+        self.lock = Lock()
+        self.emitting = Lock() # merges and their callbacks, in order
+        self.responses = set()
+        self.received = self.parsed = self.expected = 0 # bytes on the wire, parsed events, expected events
+        self.timings = timings or Timings() # time per stage: cache read, plan, rate limit, request, download (and decompression), parse, cache write, merge
+
+    # |----- callbacks (called from the fetch pool, replaced by the caller) -----|
+
+    def on_batch(self, records): pass
+
+    def on_retract(self, ids): pass
+
+    def on_progress(self, received, parsed, expected): pass
+
+    def on_planned(self, windows, expected): pass
+
+    def on_cached(self, cached, gaps, synced): pass # events listed from the catalog, windows still missing, oldest sync time (or None)
+
+    def on_failed(self, message): pass
+
+    def on_done(self, cancelled): pass
+
+    # |----- fetching -----|
+
+    def cancel(self): # may be called from any thread
+        self.cancelled = True
+        self.stop()
+
+    def stop(self): # stops every window and closes their responses
+        self.stopped = True
+        with self.lock: responses = list(self.responses)
+        for response in responses:
+            try: response.close()
+            except Exception: pass
+
+    def chunks(self, response): # decompressed byte chunks, counting the (compressed) bytes read from the socket
+        read, content = 0, response.iter_content(chunk_size=65536)
+        while True:
+            with self.timings.span('download') as counted: # parse time excludes it: the parser pulls the chunks inside its own span
+                chunk = next(content, None)
+                if chunk is None or self.stopped: return
+                wire = response.raw.tell() or read + len(chunk)
+                counted[0] = wire - read
+            with self.lock: self.received += wire - read
+            read = wire
+            yield chunk
+
+    def fetch(self, session, limiter, provider, params): # one window of one provider, runs in the pool; without a count endpoint, pages are fetched until a short one
+        offset = 1
+        while not self.stopped:
+            count = self.fetch_page(session, limiter, provider, params if provider.counts else {**params, 'offset': offset})
+            if provider.counts or count < page_size: return
+            offset += count
+
+    def fetch_page(self, session, limiter, provider, params): # -> parsed events
+        count = 0
+        if self.stopped: return count
+        with self.timings.span('rate limit'): limiter.wait()
+        cache = provider.key == 'usgs' and self.writes is not None
+        format = self.formats.get(provider.key)
+        with self.timings.span('request', 1): response = session.get(provider.url + "query", params=provider.query_params(params, format), stream=True, timeout=30) # until the headers
+        with self.lock: self.responses.add(response)
+        try:
+            if response.status_code == 204: return count # FDSN: no events
+            response.raise_for_status()
+            records = provider.records(self.chunks(response), format, self.backend)
+            while not self.stopped:
+                with self.timings.span('parse') as counted:
+                    batch = list(islice(records, self.batch_size))
+                    counted[0] = len(batch)
+                if not batch or self.stopped: break
+                count += len(batch)
+                self.emit_batch(batch, cache)
+        finally:
+            with self.lock: self.responses.discard(response)
+            response.close()
+        return count
+
+    def emit_batch(self, records, cache=False): # listed first, cached by the writer thread
+        count, parsed = len(records), records
+        if self.associator is None: self.on_batch(records)
+        else:
+            with self.emitting: # merged and emitted in one step: a retraction never overtakes the batch listing its row
+                with self.timings.span('merge', len(records)): records, retracted = self.associator.merge(records)
+                if retracted: self.on_retract(retracted)
+                self.on_batch(records)
+        if cache and self.cache_error is None: self.writes.put(parsed)
+        with self.lock:
+            self.parsed += count
+            progress = (self.received, self.parsed, self.expected)
+        self.on_progress(*progress)
+
+    def read_cache(self, min_mag, max_mag): # lists the cached events -> (missing windows, oldest sync time)
+        self.catalog = EventCatalog(self.catalog_path)
+        loaded = self.catalog.load(self.start, self.end, min_mag, max_mag, self.region)
+        while not self.stopped:
+            with self.timings.span('cache read') as counted:
+                records = next(loaded, None)
+                counted[0] = len(records or ())
+            if records is None: break
+            self.emit_batch(records)
+        return self.catalog.missing(self.start, self.end, min_mag, max_mag) # held global windows also hold any region
+
+    def write_cache(self): # writer thread: queued batches are stored in one transaction, committed whenever the queue runs dry
+        try:
+            while (records := self.writes.get()) is not None:
+                with self.timings.span('cache write', len(records)): self.catalog.store(records, commit=self.writes.empty())
+            self.catalog.commit()
+        except sqlite3.Error as err:
+            self.cache_error = err
+            self.on_failed(f"Catalog: {err} - the fetched quakes are not cached")
+
+    def flush_cache(self): # waits for the writer thread to store the queued batches
+        if self.writer is None: return
+        self.writes.put(None)
+        self.writer.join()
+        self.writer = None
+
+    def run(self):
+        usgs, cached, gaps, synced = 'usgs' in self.providers, 0, [(self.start, self.end)], None
+        min_mag, max_mag = float(self.params['minmagnitude']), float(self.params['maxmagnitude'])
+        session, started = api_session(self.workers), int(time() * 1000)
+        limiters = {key: RateLimiter() for key in self.providers}
+        try:
+            if usgs and self.cache:
+                try:
+                    gaps, synced = self.read_cache(min_mag, max_mag)
+                    self.on_cached(self.parsed, len(gaps), synced)
+                except (sqlite3.Error, OSError) as err: # unreadable cache: the whole range is fetched without it
+                    if self.catalog is not None: self.catalog.close()
+                    self.catalog = None
+                    self.on_failed(f"Catalog: {err} - querying without the cache")
+                cached = self.parsed
+                if self.catalog is not None and (self.formats.get('usgs') or providers['usgs'].formats[0]) == 'geojson': # the text formats lack alerts, felt reports, intensities and status: listed, not cached
+                    self.writes = SimpleQueue()
+                    self.writer = Thread(target=self.write_cache, daemon=True)
+                    self.writer.start()
+            with ThreadPoolExecutor(self.workers) as pool:
+                window = {**self.params, 'starttime': time_param(self.start), 'endtime': time_param(self.end)}
+                futures = [pool.submit(self.fetch, session, limiters[key], providers[key], part) for key in self.providers if key != 'usgs' for part in providers[key].windows(window)]
+                windows = []
+                if usgs:
+                    with self.timings.span('plan') as counted:
+                        planner = QueryPlanner(session, limiters['usgs'], providers['usgs'].url)
+                        windows = [window for s, e in gaps for window in planner.plan(self.params, s, e, pool)]
+                        if synced is not None: # events of the held windows changed (or deleted) since the last sync
+                            windows += planner.plan({**self.params, 'updatedafter': time_param(synced), 'includedeleted': 'true'}, self.start, self.end, pool)
+                        counted[0] = len(windows)
+                self.expected = cached + sum(count for params, count in windows)
+                self.on_planned(len(windows) + len(futures), self.expected)
+                futures += [pool.submit(self.fetch, session, limiters['usgs'], providers['usgs'], params) for params, count in windows]
+                try:
+                    for future in as_completed(futures): future.result()
+                except Exception:
+                    self.stop() # one failed window stops the others
+                    raise
+            self.flush_cache()
+            if self.writes is not None and self.cache_error is None and self.region is None and not self.stopped: self.catalog.mark(self.start, self.end, min_mag, max_mag, started - 60000) # margin for late server-side updates
+        except Exception as err:
+            if not self.cancelled:
+                self.error = f"{err}{f' - offline, {cached} cached quakes listed' if cached else ''}"
+                self.on_failed(self.error)
+        finally:
+            session.close()
+            self.flush_cache()
+            if self.catalog is not None: self.catalog.close()
+        self.on_progress(self.received, self.parsed, self.expected)
+        self.on_done(self.cancelled)
@@ -0,0 +1,146 @@
+import numpy as np
+
+from .geo import lon_ranges
+
+# epicentre colours by depth (km), 0xAARRGGBB like a Qt ARGB32 image
+depth_edges = np.array([33, 70, 150, 300, 500])
+depth_colors = np.array([0xFFE8412C, 0xFFF29E2E, 0xFFF2E22E, 0xFF4CC25A, 0xFF3C8CE6, 0xFF8A4CC9], np.uint32)
+background = 0xFF1E2632
+outside = 0xFF151A22 # beyond the poles
+graticule = 0xFF36404E
+max_radius = 6
+point_limit = 20000 # visible events drawn one by one, above this they are aggregated into grid cells
+cell_size = 4 # minimum px of an aggregation cell
+level_base = 1 / 256 # degrees: aggregation cells are level_base * 2**level wide
+
+def disc(radius): # pixel offsets of a filled disc
+    d = np.arange(-radius, radius + 1)
+    dx, dy = np.meshgrid(d, d)
+    inside = dx * dx + dy * dy <= radius * radius + radius
+    return dx[inside], dy[inside]
+
+discs = {radius: disc(radius) for radius in range(max_radius + 1)}
+
+def mag_radius(mag): # px: magnitude 2 -> 1, magnitude 7 and above -> 6 (unknown magnitudes are the smallest)
+    return np.clip(np.nan_to_num(mag, nan=0) - 1, 0, max_radius).astype(np.int64)
+
+def splat(pixels, x, y, radius, colors): # draw discs into a (height, width) uint32 image: larger discs first, so that small events stay visible
+    height, width = pixels.shape
+    flat = pixels.reshape(-1)
+    for r in np.unique(radius)[::-1]:
+        group = radius == r
+        xs, ys, cs = x[group], y[group], colors[group]
+        for dx, dy in zip(*discs[int(r)]):
+            px, py = xs + dx, ys + dy
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            flat[py[inside] * width + px[inside]] = cs[inside]
+
+def aggregate(store, rows, step): # rows -> grid cells of step degrees: (mean lat, mean lon, disc radius, colour) per non-empty cell
+    lat, lon = store.arrays['lat'][rows], store.arrays['lon'][rows]
+    columns = int(np.ceil(360 / step))
+    cells = np.floor((90 - lat) / step).astype(np.int64) * columns + np.clip(np.floor((lon + 180) / step).astype(np.int64), 0, columns - 1)
+    cells, inverse, counts = np.unique(cells, return_inverse=True, return_counts=True)
+    mean = lambda values: np.bincount(inverse, values, len(cells)) / counts
+    sizes = np.bincount(inverse * (max_radius + 1) + mag_radius(store.arrays['mag'][rows]), minlength=len(cells) * (max_radius + 1)).reshape(-1, max_radius + 1)
+    radius = np.maximum(max_radius - np.argmax(sizes[:, ::-1] > 0, axis=1), 1)
+    return mean(lat), mean(lon), radius, depth_colors[np.digitize(mean(np.nan_to_num(store.arrays['depth'][rows])), depth_edges)]
+
+class MapView: # equirectangular viewport: centre and scale (degrees per pixel), longitudes wrap around
+    def __init__(self, width=450, height=450):
+        self.width, self.height = width, height
+        self.lat, self.lon = 0.0, 0.0
+        self.scale = self.min_scale() # degrees per pixel
+        self.levels, self.source = {}, None # aggregation level -> cells, for the (mask, store size, store revision) they were computed from
+
+    def min_scale(self): return 360 / self.width # whole world in the width (least zoomed in)
+
+    def resize(self, width, height):
+        self.width, self.height = max(width, 1), max(height, 1)
+        self.scale = min(self.scale, self.min_scale())
+        self.clamp()
+
+    def clamp(self):
+        half = self.height * self.scale / 2
+        self.lat = float(np.clip(self.lat, -90 + half, 90 - half)) if half < 90 else 0.0
+        self.lon = (self.lon + 180) % 360 - 180
+
+    def pan(self, dx, dy): # by pixels
+        self.lon -= dx * self.scale
+        self.lat += dy * self.scale
+        self.clamp()
+
+    def zoom(self, factor, x, y): # keeps the point under (x, y) in place
+        lat, lon = self.unproject(x, y)
+        self.scale = float(np.clip(self.scale / factor, 0.0005, self.min_scale()))
+        self.lat, self.lon = lat + (y - self.height / 2) * self.scale, lon - (x - self.width / 2) * self.scale
+        self.clamp()
+
+    def left(self): return self.lon - self.width / 2 * self.scale
+
+    def bounds(self): # (min lat, max lat, longitude ranges) of the viewport, for GeoIndex.candidates
+        half = self.height / 2 * self.scale
+        return max(self.lat - half, -90), min(self.lat + half, 90), lon_ranges(self.left(), self.left() + self.width * self.scale)
+
+    def project(self, lat, lon): # -> pixel x, y (float arrays)
+        return ((lon - self.left()) % 360) / self.scale, (self.lat - lat) / self.scale + self.height / 2
+
+    def unproject(self, x, y): return self.lat - (y - self.height / 2) * self.scale, (self.left() + x * self.scale + 180) % 360 - 180
+
+    def visible(self, store, index, mask): # store rows in the viewport passing the mask (grid index culling)
+        rows = index.candidates(*self.bounds())
+        return rows[mask[rows]] if len(rows) else rows
+
+    def level(self, store, mask): # aggregated cells of the current zoom: geographic cells at least cell_size px wide, cached per power of two
+        source = (mask, len(store), store.revision)
+        if self.source is None or self.source[0] is not mask or self.source[1:] != source[1:]: self.levels, self.source = {}, source
+        level = max(int(np.ceil(np.log2(cell_size * self.scale / level_base))), 0)
+        if level not in self.levels: self.levels[level] = aggregate(store, np.flatnonzero(mask[:len(store)]), level_base * 2 ** level)
+        return self.levels[level]
+
+    def render(self, store, index, mask): # -> (pixels, visible events, aggregated): numpy only, no per-event Python
+        pixels = np.full((self.height, self.width), background, np.uint32)
+        self.grid(pixels)
+        rows = self.visible(store, index, mask)
+        aggregated = len(rows) > point_limit
+        if aggregated: # one disc per cell: mean position and depth colour, sized by the largest magnitude
+            lat, lon, radius, colors = self.level(store, mask)
+            min_lat, max_lat, ranges = self.bounds()
+            reach = max_radius * self.scale
+            inside = (lat >= min_lat - reach) & (lat <= max_lat + reach)
+            x, y = self.project(lat[inside], lon[inside])
+            radius, colors = radius[inside], colors[inside]
+        elif len(rows):
+            mags = store.arrays['mag'][rows]
+            order = np.argsort(mags, kind='stable') # larger magnitudes drawn last within a size
+            rows = rows[order]
+            x, y = self.project(store.arrays['lat'][rows], store.arrays['lon'][rows])
+            radius, colors = mag_radius(mags[order]), depth_colors[np.digitize(np.nan_to_num(store.arrays['depth'][rows]), depth_edges)]
+        else: return pixels, 0, False
+        splat(pixels, x.astype(np.int64), y.astype(np.int64), radius, colors)
+        return pixels, len(rows), aggregated
+
+    def grid(self, pixels): # graticule every 30 degrees (10 or 1 when zoomed in)
+        north, south = int(np.clip((self.lat - 90) / self.scale + self.height / 2, 0, self.height)), int(np.clip((self.lat + 90) / self.scale + self.height / 2, 0, self.height))
+        pixels[:north], pixels[south:] = outside, outside
+        step = 30 if self.scale > 0.05 else 10 if self.scale > 0.01 else 1
+        min_lat, max_lat, ranges = self.bounds()
+        for lat in np.arange(np.ceil(min_lat / step) * step, max_lat + 1e-9, step):
+            y = int((self.lat - lat) / self.scale + self.height / 2)
+            if 0 <= y < self.height: pixels[y, :] = graticule
+        for a, b in ranges:
+            for lon in np.arange(np.ceil(a / step) * step, b + 1e-9, step):
+                x = int(((lon - self.left()) % 360) / self.scale)
+                if 0 <= x < self.width: pixels[:, x] = graticule
+
+    def pick(self, store, index, mask, x, y, tolerance=6): # store row of the event nearest to pixel (x, y), the largest magnitude among ties
+        lat, lon = self.unproject(x, y)
+        reach = (tolerance + max_radius) * self.scale
+        rows = index.candidates(max(lat - reach, -90), min(lat + reach, 90), lon_ranges(lon - reach, lon + reach))
+        rows = rows[mask[rows]] if len(rows) else rows
+        if not len(rows): return None
+        px, py = self.project(store.arrays['lat'][rows], store.arrays['lon'][rows])
+        distance = np.hypot(px - x, py - y) - mag_radius(store.arrays['mag'][rows]) # the edge of a disc counts
+        near = distance <= tolerance
+        if not near.any(): return None
+        rows, distance, mags = rows[near], distance[near], np.nan_to_num(store.arrays['mag'][rows][near], nan=-10)
+        return int(rows[np.lexsort((-mags, np.round(distance)))[0]])
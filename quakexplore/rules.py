@@ -0,0 +1,126 @@
+import os
+import json
+
+import numpy as np
+
+from .geo import Region
+from .store import field_position
+from .fdsn import time_param
+
+alert_levels = ('green', 'yellow', 'orange', 'red') # PAGER alert levels, lowest first
+alert_rank = {level: rank for rank, level in enumerate(alert_levels)}
+
+
+def config_dir():
+    path = os.path.join(os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser("~/.config"), "quakexplore")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def region_json(region): return None if region is None else {'kind': region.kind, 'values': [list(value) if isinstance(value, tuple) else value for value in region.values]}
+
+def json_region(data): return None if data is None else Region(data['kind'], [tuple(value) for value in data['values']] if data['kind'] == 'polygon' else tuple(data['values']))
+
+def describe(record): # one line for notifications
+    value = lambda name: record[field_position[name]]
+    severity = ", ".join(([f"{value('alert')} alert"] if value('alert') else []) + [f"sig {value('sig') or 0}"])
+    return f"M{value('mag') or 0:.1f} - {value('place') or 'unknown location'}, {time_param(value('time'))} UTC ({severity})"
+
+class SavedQuery: # query inputs of the main window under a name
+    fields = ('min_mag', 'max_mag', 'start', 'end', 'providers', 'format')
+
+    def __init__(self, name, min_mag=0.0, max_mag=10.0, start=None, end=None, region=None, providers=('usgs',), format=None):
+        self.name = name
+        self.min_mag, self.max_mag = min_mag, max_mag
+        self.start, self.end = start, end # 'YYYY-MM-DD'
+        self.region = region
+        self.providers = list(providers)
+        self.format = format
+
+    def to_json(self): return {'name': self.name, **{name: getattr(self, name) for name in self.fields}, 'region': region_json(self.region)}
+
+    @classmethod
+    def from_json(cls, data): return cls(data['name'], **{name: data[name] for name in cls.fields if name in data}, region=json_region(data.get('region')))
+
+class WatchRule: # matches events inside the region (anywhere if None), at or above min_mag, and at or above the alert level or min_sig (when either is set)
+    def __init__(self, name, region=None, min_mag=None, alert=None, min_sig=None):
+        if alert is not None and alert not in alert_rank: raise ValueError(f"unknown alert level '{alert}' (use {', '.join(alert_levels)})")
+        self.name = name
+        self.region = region
+        self.min_mag, self.alert, self.min_sig = min_mag, alert, min_sig
+
+    def __str__(self):
+        severity = " or ".join(([f"{self.alert} alert"] if self.alert else []) + ([f"sig \u2265 {self.min_sig}"] if self.min_sig is not None else []))
+        return f"{self.name}: M{self.min_mag or 0:g}+ {f'in {self.region}' if self.region else 'anywhere'}{f' with {severity}' if severity else ''}"
+
+    def to_json(self): return {'name': self.name, 'region': region_json(self.region), 'min_mag': self.min_mag, 'alert': self.alert, 'min_sig': self.min_sig}
+
+    @classmethod
+    def from_json(cls, data): return cls(data['name'], json_region(data.get('region')), data.get('min_mag'), data.get('alert'), data.get('min_sig'))
+
+class RuleBook: # saved queries and watch rules, one JSON file in the config directory
+    def __init__(self, path=None):
+        self.path = path or os.path.join(config_dir(), "rules.json")
+        self.queries, self.rules = {}, {} # name -> SavedQuery / WatchRule, in saved order
+
+    def load(self): # raises ValueError on a malformed file
+        self.queries, self.rules = {}, {}
+        if not os.path.exists(self.path): return self
+        try:
+            with open(self.path, encoding='utf-8') as file: data = json.load(file)
+            for query in data.get('queries', []): self.queries[query['name']] = SavedQuery.from_json(query)
+            for rule in data.get('rules', []): self.rules[rule['name']] = WatchRule.from_json(rule)
+        except (KeyError, TypeError, ValueError) as err: raise ValueError(f"{self.path}: {err}") from None
+        return self
+
+    def save(self): # written aside, then renamed: a crash never leaves half a file
+        data = {'queries': [query.to_json() for query in self.queries.values()], 'rules': [rule.to_json() for rule in self.rules.values()]}
+        with open(self.path + ".tmp", 'w', encoding='utf-8') as file: json.dump(data, file, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+class Watcher: # evaluates every rule against a batch of events at once: rule thresholds and bounds are arrays, predicates (rules x events) boolean matrices
+    def __init__(self, rules=()):
+        self.notified = set() # (rule name, event id) already reported, while the event is in the feed: updates of an event only match again for rules it newly satisfies
+        self.compile(rules)
+
+    def compile(self, rules):
+        self.rules = list(rules)
+        none = lambda value, default: default if value is None else value
+        self.min_mag = np.array([none(rule.min_mag, -np.inf) for rule in self.rules], np.float64)
+        self.alert = np.array([alert_rank[rule.alert] if rule.alert else len(alert_levels) for rule in self.rules], np.int64) # unset: never reached
+        self.min_sig = np.array([none(rule.min_sig, np.inf) for rule in self.rules], np.float64)
+        self.severity = np.array([rule.alert is not None or rule.min_sig is not None for rule in self.rules], bool)
+        bounds = [rule.region.bounds() if rule.region else (-90.0, 90.0, [(-180.0, 180.0)]) for rule in self.rules]
+        self.min_lat = np.array([bound[0] for bound in bounds], np.float64)
+        self.max_lat = np.array([bound[1] for bound in bounds], np.float64)
+        self.lon_ranges = np.array([(ranges + [(np.inf, -np.inf)])[:2] for min_lat, max_lat, ranges in bounds], np.float64).reshape(len(bounds), 2, 2) # second range empty unless crossing the antimeridian
+        self.exact = [i for i, rule in enumerate(self.rules) if rule.region and rule.region.kind != 'box'] # boxes are their bounds
+
+    def matches(self, records): # -> (rules x records) boolean matrix
+        if not self.rules or not records: return np.zeros((len(self.rules), len(records)), bool)
+        column = lambda name, dtype: np.array([np.nan if record[field_position[name]] is None else record[field_position[name]] for record in records], dtype)
+        lat, lon, mag, sig = column('lat', np.float64), column('lon', np.float64), column('mag', np.float64), column('sig', np.float64)
+        alert = np.array([alert_rank.get(record[field_position['alert']], -1) for record in records], np.int64)
+        severe = (alert[None, :] >= self.alert[:, None]) | (np.nan_to_num(sig, nan=-1)[None, :] >= self.min_sig[:, None]) | ~self.severity[:, None]
+        inside = (lat[None, :] >= self.min_lat[:, None]) & (lat[None, :] <= self.max_lat[:, None])
+        inside &= ((lon[None, :] >= self.lon_ranges[:, 0, :1]) & (lon[None, :] <= self.lon_ranges[:, 0, 1:])) | ((lon[None, :] >= self.lon_ranges[:, 1, :1]) & (lon[None, :] <= self.lon_ranges[:, 1, 1:]))
+        match = inside & severe & (mag[None, :] >= self.min_mag[:, None]) # nan magnitudes never match
+        for i in self.exact: # radius and polygon rules: exact test of the candidates only
+            candidates = np.flatnonzero(match[i])
+            if len(candidates): match[i, candidates] = self.rules[i].region.contains(lat[candidates], lon[candidates])
+        return match
+
+    def check(self, records, seed=False): # new or updated events -> [(rule, record)] not reported before; seed: the first feed snapshot, matches are recorded, not reported
+        found = []
+        for i, n in zip(*np.nonzero(self.matches(records))):
+            key = (self.rules[i].name, records[n][0])
+            if key in self.notified: continue
+            self.notified.add(key)
+            if not seed: found.append((self.rules[i], records[n]))
+        return found
+
+    def forget(self, ids): # events that left the feed
+        if not ids: return
+        ids = set(ids)
+        self.notified = {key for key in self.notified if key[1] not in ids}
+
+    def min_magnitude(self): return max(float(self.min_mag.min()), 0.0) if self.rules else 0.0 # smallest magnitude a rule can match (feed level)
@@ -0,0 +1,85 @@
+import numpy as np
+
+mag_step = 0.1 # magnitude bin width of the frequency-magnitude distribution
+mag_min, mag_bins = -2.0, 121 # bins centred on -2.0 ... 10.0
+depth_step, depth_bins = 10, 80 # km: 0-800 km, shallower events in the first bin, deeper ones in the last
+hour_ms = 3600000
+
+mag_centres = np.round(mag_min + mag_step * np.arange(mag_bins), 1)
+
+def moment(mag): return 10 ** (1.5 * np.asarray(mag, np.float64) + 9.1) # seismic moment in N m (Hanks & Kanamori), magnitudes taken as Mw
+
+def moment_magnitude(moment): return float((np.log10(moment) - 9.1) / 1.5) if moment > 0 else np.nan
+
+def max_curvature(counts, correction=0.2): # magnitude of completeness: most populated bin of the non-cumulative distribution, plus the usual correction (it underestimates Mc of gradual roll-offs)
+    return float(np.round(mag_centres[np.argmax(counts)] + correction, 1)) if counts.any() else np.nan
+
+def b_value(counts, mc): # Aki-Utsu maximum likelihood b-value of the events at or above mc (binned magnitudes), Shi & Bolt uncertainty, a-value
+    above = mag_centres >= mc - mag_step / 2
+    n = counts[above].sum()
+    if n < 2: return np.nan, np.nan, np.nan, int(n)
+    mags, weights = mag_centres[above], counts[above]
+    mean = (weights * mags).sum() / n
+    if mean <= mc - mag_step / 2: return np.nan, np.nan, np.nan, int(n)
+    b = np.log10(np.e) / (mean - (mc - mag_step / 2))
+    error = 2.3 * b * b * np.sqrt((weights * (mags - mean) ** 2).sum() / (n * (n - 1)))
+    return float(b), float(error), float(np.log10(n) + b * mc), int(n)
+
+class TimeBins: # event counts and moment per hour, the span grows in both directions as events arrive
+    def __init__(self):
+        self.origin = None # first hour (hours since the epoch)
+        self.counts = np.zeros(0, np.int64)
+        self.moments = np.zeros(0, np.float64)
+
+    def add(self, times, moments):
+        if not len(times): return
+        hours = times // hour_ms
+        low, high = int(hours.min()), int(hours.max())
+        if self.origin is None: self.origin = low
+        before, after = max(self.origin - low, 0), max(high - self.origin + 1 - len(self.counts), 0)
+        if before or after: # widen the span
+            self.counts = np.concatenate((np.zeros(before, np.int64), self.counts, np.zeros(after, np.int64)))
+            self.moments = np.concatenate((np.zeros(before), self.moments, np.zeros(after)))
+            self.origin -= before
+        span = slice(low - self.origin, high - self.origin + 1)
+        self.counts[span] += np.bincount(hours - low, minlength=high - low + 1)
+        self.moments[span] += np.bincount(hours - low, moments, minlength=high - low + 1)
+
+    def series(self, hours): # (start time, counts, moments) in bins of the given number of hours, aligned to UTC midnight for whole days
+        if self.origin is None: return None, np.zeros(0, np.int64), np.zeros(0)
+        start = self.origin - self.origin % 24 if hours % 24 == 0 else self.origin
+        pad = self.origin - start
+        size = -(-(pad + len(self.counts)) // hours) * hours
+        counts, moments = np.zeros(size, np.int64), np.zeros(size)
+        counts[pad:pad + len(self.counts)], moments[pad:pad + len(self.moments)] = self.counts, self.moments
+        return start * hour_ms, counts.reshape(-1, hours).sum(axis=1), moments.reshape(-1, hours).sum(axis=1)
+
+class EventStats: # seismicity statistics of a set of store rows, accumulated batch by batch in fixed bins
+    def __init__(self, store):
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mags = np.zeros(mag_bins, np.int64)
+        self.depths = np.zeros(depth_bins, np.int64)
+        self.time = TimeBins()
+
+    def add(self, rows): # store rows to include (only new rows: the bins are sums)
+        if not len(rows): return
+        arrays = self.store.arrays
+        mag, depth = arrays['mag'][rows], arrays['depth'][rows]
+        known = ~np.isnan(mag)
+        self.count += len(rows)
+        self.mags += np.bincount(np.clip(np.rint((mag[known] - mag_min) / mag_step).astype(np.int64), 0, mag_bins - 1), minlength=mag_bins)
+        depth = depth[~np.isnan(depth)]
+        self.depths += np.bincount(np.clip((depth // depth_step).astype(np.int64), 0, depth_bins - 1), minlength=depth_bins)
+        self.time.add(arrays['time'][rows], np.where(known, moment(np.where(known, mag, 0)), 0))
+
+    def summary(self): # derived values, cheap: computed from the bins only
+        mc = max_curvature(self.mags)
+        b, b_error, a, above = b_value(self.mags, mc) if not np.isnan(mc) else (np.nan, np.nan, np.nan, 0)
+        hours = len(self.time.counts)
+        total = float(self.time.moments.sum())
+        return {'count': self.count, 'mc': mc, 'b': b, 'b_error': b_error, 'a': a, 'above_mc': above,
+                'per_day': self.count / hours * 24 if hours else 0.0, 'moment': total, 'mw': moment_magnitude(total)}
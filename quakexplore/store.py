@@ -0,0 +1,201 @@
+from time import strftime, gmtime
+
+import numpy as np
+
+from .geo import GeoIndex
+
+
+# columns of an event record: numeric columns are typed arrays (None -> nan / -1), str columns are categorical codes into an interned pool
+event_fields = (
+    ('id', str), ('time', np.int64), ('updated', np.int64), ('mag', np.float32), ('depth', np.float32),
+    ('lon', np.float64), ('lat', np.float64), ('sig', np.int32), ('felt', np.int32), ('cdi', np.float32), ('mmi', np.float32),
+    ('nst', np.int32), ('dmin', np.float32), ('rms', np.float32), ('gap', np.float32),
+    ('place', str), ('net', str), ('status', str), ('alert', str), ('magType', str), ('type', str), ('ids', str), ('source', str)
+)
+numeric_fields = [(name, dtype) for name, dtype in event_fields if dtype is not str]
+category_fields = [name for name, dtype in event_fields[1:] if dtype is str]
+field_position = {name: i for i, (name, dtype) in enumerate(event_fields)}
+
+def feature_record(quake): # GeoJSON feature -> flat record tuple (event_fields order)
+    props, coords = quake['properties'], quake['geometry']['coordinates']
+    return (
+        quake['id'], props['time'], props.get('updated') or props['time'], props.get('mag'), coords[2],
+        coords[0], coords[1], props.get('sig') or 0, props.get('felt'), props.get('cdi'), props.get('mmi'),
+        props.get('nst'), props.get('dmin'), props.get('rms'), props.get('gap'),
+        props.get('place'), props.get('net'), props.get('status'), props.get('alert'), props.get('magType'), props.get('type'), props.get('ids'), props.get('source') or 'usgs' # source: files written by quakexplore
+    )
+
+class EventStore: # columnar event catalog, rows are addressed by a stable index
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.arrays = {name: np.empty(capacity, dtype) for name, dtype in numeric_fields}
+        self.codes = {name: np.empty(capacity, np.int32) for name in category_fields}
+        self.removed = np.zeros(capacity, bool) # tombstones: deleted events and events that left a live feed
+        self.pools = {name: [None] for name in category_fields}
+        self.lookup = {name: {None: 0} for name in category_fields}
+        self.clear()
+
+    def clear(self):
+        self.size = 0
+        self.revision = getattr(self, 'revision', 0) + 1 # bumped whenever existing rows change
+        self.ids = []
+        self.index = {}
+        self.min_sig = self.max_sig = 0
+
+    def __len__(self): return self.size
+
+    def __getitem__(self, name): # column view (categorical columns return their codes)
+        return (self.arrays[name] if name in self.arrays else self.codes[name])[:self.size]
+
+    def text(self, name, i): return self.pools[name][self.codes[name][i]]
+
+    def grow(self, size):
+        if size <= self.capacity: return
+        while self.capacity < size: self.capacity *= 2
+        for columns in (self.arrays, self.codes):
+            for name, column in columns.items():
+                columns[name] = np.resize(column, self.capacity)
+        self.removed = np.resize(self.removed, self.capacity)
+
+    def encode(self, name, values): # intern strings of a categorical column
+        pool, lookup = self.pools[name], self.lookup[name]
+        codes = np.empty(len(values), np.int32)
+        for i, value in enumerate(values):
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(pool)
+                pool.append(value)
+            codes[i] = code
+        return codes
+
+    def extend(self, records): # append new events, update known ids in place; returns (first new row, updated rows)
+        start, fresh, updated = self.size, [], []
+        for record in records:
+            i = self.index.get(record[0])
+            if i is None:
+                self.index[record[0]] = start + len(fresh)
+                fresh.append(record)
+            elif i >= start: # repeated within the batch (row not written yet): the latest version is kept
+                if record[2] >= fresh[i - start][2]: fresh[i - start] = record
+            elif record[2] >= self.arrays['updated'][i]: updated.append((i, record))
+        if fresh:
+            self.grow(start + len(fresh))
+            self.ids.extend(record[0] for record in fresh)
+            self.write(slice(start, start + len(fresh)), fresh)
+            self.size += len(fresh)
+        if updated:
+            self.write(np.array([i for i, record in updated]), [record for i, record in updated])
+            self.revision += 1
+        if updated or not start: self.rescale()
+        elif fresh: # the color scale only widens when events are appended
+            sig = self.arrays['sig'][start:self.size][~self.removed[start:self.size]]
+            if len(sig): self.min_sig, self.max_sig = min(self.min_sig, int(sig.min())), max(self.max_sig, int(sig.max()))
+        return start, [i for i, record in updated]
+
+    def remove(self, ids): # tombstone events by id; returns the removed rows
+        rows = np.array([i for i in (self.index.get(id) for id in ids) if i is not None], np.int64)
+        if len(rows):
+            self.removed[rows] = True
+            self.revision += 1
+            if np.isin(self.arrays['sig'][rows], (self.min_sig, self.max_sig)).any(): self.rescale()
+        return rows
+
+    def rescale(self): # significance range of the listed events (background color scale)
+        sig = self['sig'][~self.removed[:self.size]]
+        self.min_sig, self.max_sig = (int(sig.min()), int(sig.max())) if len(sig) else (0, 0)
+
+    def load_columns(self, ids, arrays, codes, pools): # replace the contents with whole columns, shared (e.g. memory-mapped) until the first write
+        self.clear()
+        if not len(ids): return
+        self.capacity = self.size = len(ids)
+        self.arrays, self.codes, self.pools = dict(arrays), dict(codes), dict(pools)
+        self.lookup = {name: {value: code for code, value in reversed(list(enumerate(pool)))} for name, pool in self.pools.items()}
+        self.removed = self.codes['status'] == self.lookup['status'].get('deleted', -1)
+        self.ids = list(ids)
+        self.index = dict(zip(self.ids, range(self.size)))
+        self.rescale()
+
+    def thaw(self): # copy the read-only columns (memory-mapped files) before writing into them
+        for columns in (self.arrays, self.codes):
+            for name, column in columns.items():
+                if not column.flags.writeable: columns[name] = column.copy()
+
+    def write(self, rows, records):
+        self.thaw()
+        columns = list(zip(*records))
+        for name, dtype in numeric_fields:
+            values = columns[field_position[name]]
+            missing = np.nan if np.issubdtype(dtype, np.floating) else -1
+            self.arrays[name][rows] = np.fromiter((missing if v is None else v for v in values), dtype, len(values))
+        for name in category_fields: self.codes[name][rows] = self.encode(name, columns[field_position[name]])
+        self.removed[rows] = self.codes['status'][rows] == self.lookup['status'].get('deleted', -1)
+
+    def value(self, name, i):
+        if name in self.codes: return self.text(name, i)
+        value = self.arrays[name][i]
+        if value != value or (value == -1 and name in ('felt', 'nst')): return None
+        return float(str(value)) if value.dtype == np.float32 else value.item() # shortest float32 repr: 3.8, not 3.799999952316284
+
+    def quake(self, i): # summary-feature shaped view of one event (built on demand)
+        props = {name: self.value(name, i) for name in field_position if name not in ('id', 'lon', 'lat', 'depth')}
+        props['source'] = props['source'] or 'usgs'
+        props['url'] = event_page(props['source'].split('+')[0], self.ids[i])
+        props['ids'] = props['ids'] or f",{self.ids[i]},"
+        datetime = strftime("%y-%m-%d %H:%M:%S", gmtime(int(props['time']/1000)))
+        depth = float(str(self.arrays['depth'][i])) # shortest float32 repr
+        return {
+            'id': self.ids[i],
+            'label': f"{datetime:<17}{props['mag'] or 0:^11.1f}{depth:^11.1f}{props['place']}",
+            'datetime': datetime,
+            'props': props,
+            'geometry': {'type': 'Point', 'coordinates': [float(self.arrays['lon'][i]), float(self.arrays['lat'][i]), depth]}
+        }
+
+class StoreSnapshot: # copies of some columns and the tombstones of an EventStore, read by a background thread while the store changes
+    def __init__(self, store, names):
+        self.size, self.revision = len(store), store.revision
+        self.removed = store.removed[:self.size].copy()
+        self.columns = {name: store[name].copy() for name in names}
+
+    def __len__(self): return self.size
+
+    def __getitem__(self, name): return self.columns[name]
+
+def event_page(provider, id):
+    from .fdsn import providers # fdsn builds on the record layout defined here
+    return providers[provider].event_page.format(id)
+
+class EventFilter: # row filters over an EventStore: mag/depth: (min, max), text: str, region: Region, categorical columns: str
+    def __init__(self, store):
+        self.store = store
+        self.filters = {}
+        self.lowered = [] # lowercase place pool for text search
+        self.geo_index = GeoIndex(store)
+
+    def set(self, name, value): # None or "" removes the filter
+        if value is None or value == "": self.filters.pop(name, None)
+        else: self.filters[name] = value
+
+    def reset(self): self.lowered = []
+
+    def mask(self, start=0, end=None): # boolean mask of the store rows [start, end) passing every filter
+        store = self.store
+        end = len(store) if end is None else end
+        mask = ~store.removed[start:end]
+        for name, value in self.filters.items():
+            if name in ('mag', 'depth'):
+                column = store[name][start:end]
+                mask &= (column >= value[0]) & (column <= value[1])
+            elif name == 'text':
+                pool = store.pools['place']
+                self.lowered.extend(place.lower() if place else "" for place in pool[len(self.lowered):])
+                needle = value.lower()
+                mask &= np.isin(store['place'][start:end], [code for code, place in enumerate(self.lowered) if needle in place])
+            elif name == 'region':
+                if start == 0 and end == len(store): # whole store: only the grid cells around the region are tested
+                    inside = np.zeros(end, bool)
+                    inside[self.geo_index.query(value)] = True
+                    mask &= inside
+                else: mask &= value.contains(store['lat'][start:end], store['lon'][start:end])
+            else: mask &= store[name][start:end] == store.lookup[name].get(value, -1)
+        return mask
@@ -0,0 +1,52 @@
+import json
+import logging
+from threading import Lock, local
+from time import time, perf_counter
+from contextlib import contextmanager
+
+log = logging.getLogger('quakexplore.timing') # one JSON object per finished run (structured logs)
+
+class Timings: # seconds, calls and items per pipeline stage, summed over every thread of a run
+    def __init__(self):
+        self.lock = Lock()
+        self.local = local() # per thread: stack of the open spans' child seconds
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stages = {} # stage -> [seconds, calls, items], in first-seen order
+            self.started = perf_counter()
+
+    def add(self, stage, seconds, items=0):
+        with self.lock:
+            total = self.stages.setdefault(stage, [0.0, 0, 0])
+            total[0] += seconds
+            total[1] += 1
+            total[2] += items
+
+    @contextmanager
+    def span(self, stage, items=0): # exclusive time: spans opened inside (on the same thread) are counted in their own stage only; yields [items], which may be updated
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        counted = [items]
+        started = perf_counter()
+        try: yield counted
+        finally:
+            elapsed = perf_counter() - started
+            self.add(stage, elapsed - stack.pop(), counted[0])
+            if stack: stack[-1] += elapsed
+
+    def wall(self): return perf_counter() - self.started
+
+    def summary(self): # short text for the status bar: stage totals (parallel workers add up beyond the wall time)
+        with self.lock: stages = [(stage, seconds) for stage, (seconds, calls, items) in self.stages.items()]
+        return ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages)
+
+    def record(self, run, **fields): # structured report of the run
+        with self.lock: stages = {stage: {'seconds': round(seconds, 6), 'calls': calls, 'items': items} for stage, (seconds, calls, items) in self.stages.items()}
+        return {'run': run, 'time': round(time(), 3), 'wall': round(self.wall(), 6), **fields, 'stages': stages}
+
+    def log(self, run, **fields):
+        record = self.record(run, **fields)
+        log.info(json.dumps(record))
+        return record
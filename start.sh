@@ -5,6 +5,7 @@ echo "> Python version: $(python --version)"
 echo "> PIP version: $(pip --version)"
 echo "  > pyside6: $(pip show pyside6)"
 echo "  > requests $(pip show requests)"
+echo "  > numpy $(pip show numpy)"
 echo "> Qt6 version: $(qmake6 --version)"
 
 echo "Setting up application..."
@@ -0,0 +1,37 @@
+from quakexplore import Associator
+from quakexplore.store import event_fields, field_position
+
+
+def record(id, time, lat, lon, mag, source, ids=None):
+    values = [None] * len(event_fields)
+    values[:8] = [id, time, time, mag, 10.0, lon, lat, 400]
+    values[field_position['ids']] = ids
+    values[-1] = source
+    return tuple(values)
+
+def test_merge_into_preferred():
+    associator = Associator()
+    listed, retracted = associator.merge([record('us1', 100000, 35.0, 140.0, 5.0, 'usgs', ",us1,jma1,")])
+    assert [r[0] for r in listed] == ['us1'] and retracted == []
+    listed, retracted = associator.merge([record('em1', 103000, 35.3, 140.2, 5.2, 'emsc'), record('gf1', 101000, 35.1, 139.9, 4.9, 'geofon')])
+    assert [(r[0], r[-1]) for r in listed] == [('us1', 'usgs+emsc'), ('us1', 'usgs+emsc+geofon')] and retracted == []
+    assert associator.resolve('jma1') == associator.resolve('em1') == 'us1'
+
+def test_preferred_solution_takes_over():
+    associator = Associator()
+    associator.merge([record('em1', 100000, -20.0, 179.9, 6.0, 'emsc')])
+    listed, retracted = associator.merge([record('us1', 104000, -20.2, -179.9, 6.1, 'usgs')]) # across the antimeridian
+    assert [(r[0], r[-1]) for r in listed] == [('us1', 'usgs+emsc')] and retracted == ['em1']
+    assert associator.resolve('em1') == 'us1'
+    listed, retracted = associator.merge([record('em1', 100000, -20.0, 179.9, 6.0, 'emsc')]) # an update of the merged solution
+    assert [(r[0], r[-1]) for r in listed] == [('us1', 'usgs+emsc')] and retracted == []
+
+def test_distinct_events_kept():
+    associator = Associator()
+    listed, retracted = associator.merge([
+        record('us1', 100000, 35.0, 140.0, 5.0, 'usgs'), record('us2', 101000, 35.1, 140.1, 4.0, 'usgs'), # one catalog: never merged
+        record('em1', 100000, 40.0, 140.0, 5.0, 'emsc'), # too far
+        record('em2', 200000, 35.0, 140.0, 5.0, 'emsc'), # too late
+        record('em3', 100000, 35.0, 140.0, 6.5, 'emsc'), # magnitude too different
+    ])
+    assert [r[0] for r in listed] == ['us1', 'us2', 'em1', 'em2', 'em3'] and retracted == []
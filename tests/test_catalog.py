@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+from usgs_stub import StubServer, catalog_start, catalog_days
+from quakexplore import Query, EventCatalog, Region, providers
+from quakexplore.store import event_fields, field_position
+
+end = catalog_start + (catalog_days + 1) * 86400000
+params = {'minmagnitude': "0.0", 'maxmagnitude': "10.0"}
+
+
+def record(id, time, mag, lat=35.0, lon=140.0, status='reviewed'):
+    values = [None] * len(event_fields)
+    values[:8] = [id, time, time, mag, 10.0, lon, lat, 400]
+    values[field_position['status']] = status
+    return tuple(values)
+
+def test_held_windows(tmp_path):
+    catalog = EventCatalog(str(tmp_path / "catalog.sqlite"))
+    assert catalog.missing(0, 100, 2.0, 5.0) == ([(0, 100)], None)
+    catalog.mark(10, 40, 0.0, 10.0, 7)
+    catalog.mark(60, 80, 2.0, 5.0, 9)
+    catalog.mark(70, 90, 3.0, 5.0, 1) # narrower magnitudes: doesn't hold [2, 5]
+    assert catalog.missing(0, 100, 2.0, 5.0) == ([(0, 10), (40, 60), (80, 100)], 7)
+    catalog.mark(0, 100, 2.0, 5.0, 11) # supersedes the windows inside it, not the wider magnitude range
+    assert catalog.db.execute("SELECT start, end FROM windows ORDER BY start").fetchall() == [(0, 100), (10, 40)]
+    assert catalog.missing(20, 50, 2.0, 5.0) == ([], 7)
+    catalog.close()
+
+def test_load_and_deleted(tmp_path):
+    catalog = EventCatalog(str(tmp_path / "catalog.sqlite"))
+    catalog.store([record('a', 10, 4.0), record('b', 20, 6.0), record('c', 30, 5.0, -20.0, -175.0), record('d', 40, 5.0, 35.5, 139.5)])
+    assert [r[0] for batch in catalog.load(0, 100, 4.5, 10.0) for r in batch] == ['d', 'c', 'b']
+    assert [r[0] for batch in catalog.load(0, 100, 0.0, 10.0, Region.parse('box', "-30, -10, 170, -170")) for r in batch] == ['c']
+    assert [r[0] for batch in catalog.load(0, 100, 0.0, 10.0, Region.parse('box', "35.2, 36, 139, 141")) for r in batch] == ['d'] # exact box, not the whole cells
+    catalog.store([record('b', 20, 6.0, status='deleted')])
+    assert [r[0] for batch in catalog.load(0, 100, 0.0, 10.0, batch_size=1) for r in batch] == ['d', 'c', 'a']
+    catalog.close()
+
+def test_sync_updated_after(tmp_path, monkeypatch):
+    stub = StubServer(500).start()
+    monkeypatch.setattr(providers['usgs'], 'url', stub.url)
+    path = str(tmp_path / "catalog.sqlite")
+    try:
+        cached = []
+        for run in range(2):
+            job = Query(params, catalog_start, end, catalog_path=path)
+            records = []
+            job.on_batch = records.extend
+            job.on_cached = lambda count, gaps, synced: cached.append((count, gaps, synced))
+            job.run()
+            assert job.error is None and len({record[0] for record in records}) == 500
+        assert cached[0] == (0, 1, None)
+        assert cached[1][:2] == (500, 0) and cached[1][2] is not None
+        synced = [dict(key[1]) for key in stub.bodies if 'updatedafter' in dict(key[1])]
+        assert synced and all(query['includedeleted'] == 'true' for query in synced) # held window only checked for changes
+        catalog = EventCatalog(path)
+        assert catalog.missing(catalog_start, end, 0.0, 10.0) == ([], catalog.db.execute("SELECT MAX(synced) FROM windows").fetchone()[0])
+        catalog.close()
+    finally: stub.stop()
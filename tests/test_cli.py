@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+from usgs_stub import StubServer
+from quakexplore import providers
+from quakexplore.cli import region_values, main
+from quakexplore.rules import RuleBook
+
+
+def test_region_values():
+    assert region_values(['query', '--box', '-60,-10,160,-170', '--minmag', '4']) == ['query', '--box=-60,-10,160,-170', '--minmag', '4']
+    assert region_values(['query', '--radius=-33.4,-70.6,300']) == ['query', '--radius=-33.4,-70.6,300']
+    assert region_values(['query', '--box']) == ['query', '--box']
+
+def test_negative_rule_region(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path))
+    assert main(['rules', 'add', 'south', '--box', '-60,-10,160,-170', '--minmag', '6']) == 0
+    rule = RuleBook().load().rules['south']
+    assert (rule.region.kind, rule.region.values, rule.min_mag) == ('box', (-60, -10, 160, -170), 6)
+
+def test_formats_failure_reported_per_format(monkeypatch, capsys):
+    stub = StubServer(300).start() # serves geojson and csv only
+    monkeypatch.setattr(providers['usgs'], 'url', stub.url)
+    try: assert main(['formats', '--start', '2024-01-01', '--end', '2024-02-01']) == 1
+    finally: stub.stop()
+    output = capsys.readouterr()
+    lines = {line.split()[0]: line for line in output.out.splitlines()[2:]}
+    assert lines['csv'].split()[1] == '300' and 'error' in lines['text']
+    assert "text failed" in output.err
@@ -0,0 +1,45 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+from usgs_stub import StubServer, catalog_start, catalog_days
+from quakexplore import QueryPlanner, RateLimiter, parse_time
+
+end = catalog_start + (catalog_days + 1) * 86400000
+params = {'minmagnitude': "0.0", 'maxmagnitude': "10.0"}
+
+
+class Counts: # count endpoint answering a fixed number of events for any window
+    def __init__(self, count, max_allowed):
+        self.body = {'count': count, 'maxAllowed': max_allowed}
+
+    def get(self, url, params, timeout): return self
+
+    def raise_for_status(self): pass
+
+    def json(self): return self.body
+
+def test_time_split_under_limit():
+    stub = StubServer(5000).start()
+    try:
+        with ThreadPoolExecutor(4) as pool: plan = QueryPlanner(requests.Session(), RateLimiter(1000.0), stub.url, limit=800).plan(params, catalog_start, end, pool)
+        assert len(plan) > 5000 // 800 and all(0 < n <= 800 for window, n in plan)
+        assert sum(n for window, n in plan) == 5000
+        bounds = sorted((parse_time(window['starttime']), parse_time(window['endtime'])) for window, n in plan)
+        assert all('offset' not in window for window, n in plan)
+        assert bounds[0][0] >= catalog_start and bounds[-1][1] <= end
+        assert all(a[1] <= b[0] for a, b in zip(bounds, bounds[1:])) # windows don't overlap
+    finally: stub.stop()
+
+def test_offset_paging_of_dense_window(): # a window of at most a second above the limit is paged
+    planner = QueryPlanner(Counts(2500, 1000), RateLimiter(1000.0), "http://localhost/")
+    with ThreadPoolExecutor(2) as pool: plan = planner.plan(params, catalog_start, catalog_start + 1000, pool)
+    assert planner.limit == 1000
+    assert [(window['offset'], window['limit'], n) for window, n in plan] == [(1, 1000, 1000), (1001, 1000, 1000), (2001, 1000, 500)]
+
+def test_empty_windows_dropped():
+    with ThreadPoolExecutor(2) as pool: assert QueryPlanner(Counts(0, 20000), RateLimiter(1000.0), "http://localhost/").plan(params, catalog_start, end, pool) == []
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from quakexplore import EventStore, write, read
+from quakexplore.store import event_fields, numeric_fields, category_fields, field_position
+
+
+def record(id, time, mag, lon, lat, felt=None, alert=None, place=None):
+    values = [None] * len(event_fields)
+    values[:8] = [id, time, time + 60000, mag, 10.5, lon, lat, 400]
+    values[field_position['felt']] = felt
+    values[field_position['alert']] = alert
+    values[field_position['place']] = place
+    values[field_position['status']] = 'reviewed'
+    values[field_position['source']] = 'usgs'
+    return tuple(values)
+
+records = [record('us1', 1700000000123, 3.8, 140.25, 35.5, 12, 'green', "Tokyo, Japan"), record('us2', 1700000100000, None, -175.125, -20.0),
+           record('us3', 1700000200000, 6.1, 179.9, -18.25, place="Suva, Fiji, \"quoted\"")]
+
+@pytest.mark.parametrize('extension', ['csv', 'geojson', 'parquet', 'arrow'])
+def test_round_trip(tmp_path, extension):
+    store = EventStore()
+    store.extend(records)
+    store.remove(['us2'])
+    path = str(tmp_path / f"events.{extension}")
+    write(store, np.flatnonzero(~store.removed[:len(store)]), path)
+    copy = read(path, EventStore())
+    assert copy.ids == ['us1', 'us3']
+    for name, dtype in numeric_fields:
+        assert np.array_equal(copy[name], store[name][[0, 2]], equal_nan=np.issubdtype(dtype, np.floating)), name
+    for name in category_fields:
+        if extension == 'geojson' and name in ('ids', 'source'): continue # filled in like the USGS summary
+        assert [copy.text(name, i) or None for i in range(2)] == [store.text(name, i) for i in (0, 2)], name
+
+def test_unknown_extension(tmp_path):
+    with pytest.raises(ValueError): write(EventStore(), [], str(tmp_path / "events.txt"))
@@ -0,0 +1,34 @@
+import numpy as np
+
+from quakexplore import Region, GeoIndex, EventStore, providers
+from quakexplore.store import event_fields
+
+
+def test_antimeridian_box():
+    region = Region.parse('box', "-60, -10, 160, -170")
+    params = region.params()
+    assert (params['minlongitude'], params['maxlongitude']) == (160, 190)
+    assert providers['usgs'].windows(params) == [params]
+    west, east = providers['emsc'].windows(params)
+    assert (west['minlongitude'], west['maxlongitude']) == (160, 180)
+    assert (east['minlongitude'], east['maxlongitude']) == (-180, -170)
+    assert all(-180 <= part[key] <= 180 for part in (west, east) for key in ('minlongitude', 'maxlongitude'))
+    assert region.contains(np.array([-30.0, -30.0, -30.0, 0.0]), np.array([170.0, -175.0, 0.0, 170.0])).tolist() == [True, True, False, False]
+
+def test_plain_box():
+    params = Region.parse('box', "10, 20, -30, 40").params()
+    assert providers['geofon'].windows(params) == [params]
+    assert (params['minlatitude'], params['maxlatitude'], params['minlongitude'], params['maxlongitude']) == (10, 20, -30, 40)
+
+def test_index_matches_full_scan():
+    rng = np.random.default_rng(1)
+    lat, lon = rng.uniform(-90, 90, 3000), rng.uniform(-180, 180, 3000)
+    store = EventStore()
+    store.extend([(f"e{i}", 1, 1, 5.0, 10.0, x, y, 0, *[None] * (len(event_fields) - 8)) for i, (x, y) in enumerate(zip(lon.tolist(), lat.tolist()))])
+    index = GeoIndex(store)
+    for kind, text in (('box', "-60, -10, 160, -170"), ('box', "-90, 90, -180, 180"), ('radius', "64, -170, 1500"), ('radius', "-89, 0, 300"), ('polygon', "0 170; 10 -170; -10 -175")):
+        region = Region.parse(kind, text)
+        assert sorted(index.query(region).tolist()) == np.flatnonzero(region.contains(lat, lon)).tolist(), text
+    store.remove(['e0'])
+    store.extend([('e1', 1, 2, 5.0, 10.0, 175.0, -30.0, 0, *[None] * (len(event_fields) - 8))]) # moved: the index is rebuilt
+    assert 1 in index.query(Region.parse('box', "-60, -10, 160, -170")).tolist()
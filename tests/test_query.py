@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+from usgs_stub import StubServer, catalog_start, catalog_days
+from quakexplore import Query, EventCatalog, providers
+
+end = catalog_start + (catalog_days + 1) * 86400000
+params = {'minmagnitude': "0.0", 'maxmagnitude': "10.0"}
+
+
+def run(path, format=None, **options):
+    job = Query(params, catalog_start, end, catalog_path=path, formats={'usgs': format} if format else None, **options)
+    records = []
+    job.on_batch = records.extend
+    job.run()
+    assert job.error is None
+    return job, records
+
+def test_text_formats_not_cached(tmp_path, monkeypatch):
+    stub = StubServer(500).start()
+    monkeypatch.setattr(providers['usgs'], 'url', stub.url)
+    path = str(tmp_path / "catalog.sqlite")
+    try:
+        job, records = run(path, 'csv')
+        assert len(records) == 500
+        catalog = EventCatalog(path)
+        assert catalog.missing(catalog_start, end, 0.0, 10.0)[0] == [(catalog_start, end)] # nothing held
+        assert catalog.db.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 0
+        catalog.close()
+        job, records = run(path)
+        catalog = EventCatalog(path)
+        assert catalog.missing(catalog_start, end, 0.0, 10.0)[0] == []
+        assert catalog.db.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 500
+        catalog.close()
+        job, records = run(path, 'csv') # held in geojson: listed from the cache
+        assert len({record[0] for record in records}) == 500 and job.received < 10000
+    finally: stub.stop()
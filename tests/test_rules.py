@@ -0,0 +1,48 @@
+import numpy as np
+
+from quakexplore import Region
+from quakexplore.store import event_fields, field_position
+from quakexplore.rules import WatchRule, Watcher, RuleBook, SavedQuery
+
+
+def record(id, lat, lon, mag, sig=0, alert=None, updated=1):
+    values = [None] * len(event_fields)
+    values[:8] = [id, 1700000000000, updated, mag, 10.0, lon, lat, sig]
+    values[field_position['alert']] = alert
+    return tuple(values)
+
+rules = [
+    WatchRule('japan', Region.parse('box', "30, 46, 128, 146"), 5.0),
+    WatchRule('pacific', Region.parse('box', "-60, -10, 160, -170"), 4.0, 'yellow', 800),
+    WatchRule('chile', Region.parse('radius', "-33.4, -70.6, 500"), 6.0),
+    WatchRule('big', None, 7.0),
+]
+records = [record('jp', 35, 140, 5.5), record('fiji', -18, 178, 6.5, 700, 'yellow'), record('tonga', -20, -175, 6.0, 600), record('ca', 37, -120, 3.0),
+           record('chile', -30, -72, 7.2, 900, 'orange'), record('far', -30, -60, 6.5), record('none', 0, 0, None)]
+
+def test_matches_every_rule_at_once():
+    match = Watcher(rules).matches(records)
+    assert [[rules[i].name for i in np.flatnonzero(match[:, n])] for n in range(len(records))] == [['japan'], ['pacific'], [], [], ['chile', 'big'], [], []]
+
+def test_first_snapshot_not_notified():
+    watcher = Watcher(rules)
+    assert watcher.check(records, seed=True) == []
+    assert watcher.check(records) == []
+    upgraded = record('tonga', -20, -175, 6.0, 600, 'orange', updated=2) # newly matches the pacific rule
+    assert [(rule.name, found[0]) for rule, found in watcher.check([upgraded, record('new', 40, 142, 6.1)])] == [('japan', 'new'), ('pacific', 'tonga')]
+
+def test_forget_events_leaving_the_feed():
+    watcher = Watcher(rules)
+    watcher.check(records)
+    watcher.forget(['jp', 'chile'])
+    assert {id for name, id in watcher.notified} == {'fiji'}
+    assert watcher.min_magnitude() == 4.0
+
+def test_rule_book_round_trip(tmp_path):
+    book = RuleBook(str(tmp_path / "rules.json"))
+    book.rules = {rule.name: rule for rule in rules}
+    book.queries['q'] = SavedQuery('q', 4.5, 9.0, "2024-01-01", "2024-02-01", Region.parse('polygon', "0 0; 0 10; 10 5"), ['usgs', 'emsc'], 'csv')
+    book.save()
+    loaded = RuleBook(book.path).load()
+    assert [str(rule) for rule in loaded.rules.values()] == [str(rule) for rule in rules]
+    assert loaded.queries['q'].to_json() == book.queries['q'].to_json()
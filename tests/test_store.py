@@ -0,0 +1,22 @@
+from quakexplore.store import event_fields, field_position, EventStore
+
+
+def record(id, updated, mag=5.0):
+    values = [None] * len(event_fields)
+    values[:8] = [id, 1700000000000, updated, mag, 10.0, 140.0, 35.0, 400]
+    values[field_position['status']] = 'reviewed'
+    return tuple(values)
+
+def test_duplicate_in_batch():
+    store = EventStore(capacity=2)
+    start, updated = store.extend([record('a', 1, 4.0), record('b', 1), record('a', 3, 6.0), record('a', 2, 5.0)])
+    assert (start, updated) == (0, [])
+    assert len(store) == 2 and store.ids == ['a', 'b']
+    assert store.value('updated', 0) == 3 and store.value('mag', 0) == 6.0
+
+def test_update_known_id():
+    store = EventStore()
+    store.extend([record('a', 2, 4.0)])
+    assert store.extend([record('a', 1, 3.0), record('b', 1)]) == (1, [])
+    assert store.extend([record('a', 3, 6.0)]) == (2, [0])
+    assert len(store) == 2 and store.value('mag', 0) == 6.0